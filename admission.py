@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+from config import VOICE_MAX_ACTIVE, VOICE_MAX_QUEUE, VOICE_QUEUE_TIMEOUT, VOICE_USER_RATE, VOICE_USER_BURST
+from metrics import registry
+
+# Настройка логирования для admission модуля
+logger = logging.getLogger(__name__)
+
+# Корзины пользователей проверяются на простой после каждых N обращений
+PRUNE_EVERY = 1000
+
+ADMISSION_WAIT = registry.histogram(
+    "voice_admission_wait_seconds", "Time voice answers waited in the admission queue",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+ADMISSION_REJECTIONS = registry.counter(
+    "voice_admission_rejections_total", "Voice answers rejected by admission control", ["reason"])
+
+
+class AdmissionRejected(Exception):
+    """Голосовой ответ не принят в обработку."""
+
+    # Превышен лимит сообщений пользователя
+    RATE_LIMITED = "rate_limited"
+    # Очередь заполнена
+    OVERLOADED = "overloaded"
+    # Место в обработке не освободилось за queue_timeout секунд
+    QUEUE_TIMEOUT = "queue_timeout"
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Ограничивает обработку голосовых ответов (скачивание, ffmpeg, распознавание):
+    не более max_active одновременно и не более max_queue ожидающих, а каждому
+    пользователю - не чаще user_rate сообщений в секунду с запасом user_burst
+    (token bucket). Лишние ответы отклоняются сразу, а не копятся в памяти.
+    """
+
+    def __init__(self, max_active: int = VOICE_MAX_ACTIVE, max_queue: int = VOICE_MAX_QUEUE,
+                 queue_timeout: float = VOICE_QUEUE_TIMEOUT, user_rate: float = VOICE_USER_RATE,
+                 user_burst: float = VOICE_USER_BURST):
+        """Инициализирует контроллер. user_rate=0 отключает ограничение по пользователю."""
+        self.max_active = max(1, max_active)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate
+        self.user_burst = max(1.0, user_burst)
+        self._semaphore = asyncio.Semaphore(self.max_active)
+        # user_id -> (токены, время последнего обновления)
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._calls = 0
+        self.waiting = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _take_token(self, user_id: int, now: float) -> bool:
+        """Списывает токен из корзины пользователя; False, если корзина пуста."""
+        if self.user_rate <= 0:
+            return True
+        tokens, updated = self._buckets.get(user_id, (self.user_burst, now))
+        tokens = min(self.user_burst, tokens + (now - updated) * self.user_rate)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, now)
+            return False
+        self._buckets[user_id] = (tokens - 1, now)
+
+        self._calls += 1
+        if self._calls >= PRUNE_EVERY:
+            self._calls = 0
+            self._prune(now)
+        return True
+
+    def _prune(self, now: float):
+        """Удаляет корзины, которые успели наполниться полностью: они не отличаются от новых."""
+        refill = self.user_burst / self.user_rate
+        self._buckets = {user_id: bucket for user_id, bucket in self._buckets.items()
+                         if now - bucket[1] < refill}
+
+    def _refund_token(self, user_id: int):
+        """Возвращает токен пользователю, ответ которого так и не был обработан."""
+        if self.user_rate <= 0 or user_id not in self._buckets:
+            return
+        tokens, updated = self._buckets[user_id]
+        self._buckets[user_id] = (min(self.user_burst, tokens + 1), updated)
+
+    def _reject(self, reason: str):
+        """Учитывает отказ и выбрасывает AdmissionRejected."""
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        ADMISSION_REJECTIONS.inc(reason=reason)
+        raise AdmissionRejected(reason)
+
+    async def acquire(self, user_id: int):
+        """
+        Занимает место в обработке, при необходимости дожидаясь очереди.
+        После обработки место освобождается методом release().
+        Raises:
+            AdmissionRejected: Если ответ не принят (причина - в атрибуте reason)
+        """
+        started = time.monotonic()
+        # Емкость проверяется до списания токена: отказ из-за перегрузки не расходует лимит пользователя
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject(AdmissionRejected.OVERLOADED)
+        if not self._take_token(user_id, started):
+            self._reject(AdmissionRejected.RATE_LIMITED)
+
+        acquired = False
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout) as deadline:
+                await self._semaphore.acquire()
+                acquired = True
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiting -= 1
+        if deadline.expired():
+            if acquired:
+                # Место освободилось одновременно с истечением таймаута - возвращаем его
+                self._semaphore.release()
+            self._refund_token(user_id)
+            self._reject(AdmissionRejected.QUEUE_TIMEOUT)
+
+        waited = time.monotonic() - started
+        self.active += 1
+        self.admitted += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        ADMISSION_WAIT.observe(waited)
+
+    def release(self):
+        """Освобождает место, занятое acquire()."""
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики контроллера."""
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'admitted': self.admitted,
+            'rejected': dict(self.rejected),
+            'wait_avg_ms': round(self.wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+            'wait_max_ms': round(self.wait_max * 1000, 2),
+        }
+
+
+# Глобальный контроллер обработки голосовых ответов
+voice_admission = AdmissionController()
+
+registry.gauge("voice_admission_waiting", "Voice answers waiting for a processing slot",
+               callback=lambda: voice_admission.waiting)
+registry.gauge("voice_admission_active", "Voice answers being processed",
+               callback=lambda: voice_admission.active)
@@ -0,0 +1,208 @@
+"""
+Сборка аудио фраз: перекодирует исходные WAV в компактные OGG/Opus для отправки голосовыми сообщениями.
+
+Файлы называются по хэшу содержимого исходника и параметров кодирования, поэтому
+повторная сборка пропускает неизменившиеся файлы, а одинаковые исходники кодируются
+один раз. После сборки таблица phrases указывает на закодированные файлы.
+
+Запуск:
+    python assets.py [--workers N] [--force]
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from config import BASE_DIR, FFMPEG_PATH, PHRASES_DATA, ASSETS_DIR, ASSETS_OPUS_BITRATE
+from database import db
+from logger import setup_logging, shutdown_logging
+from media_cache import file_content_hash
+
+# Настройка логирования для assets модуля
+logger = logging.getLogger(__name__)
+
+# Параметры кодирования входят в имя файла: при их изменении файлы пересобираются
+ENCODER_ARGS = ('-c:a', 'libopus', '-b:a', ASSETS_OPUS_BITRATE, '-ac', '1', '-application', 'voip')
+
+
+@dataclass
+class AssetJob:
+    """Задание на сборку аудио одной фразы."""
+    phrase_id: int
+    current_path: str
+    source_path: str
+    output_path: str = ""
+    error: Optional[str] = None
+
+
+def resolve_path(path: str) -> str:
+    """Преобразует путь из БД (относительно корня проекта) в абсолютный."""
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+def relative_path(path: str) -> str:
+    """Преобразует абсолютный путь в путь относительно корня проекта в формате БД."""
+    return os.path.relpath(path, BASE_DIR).replace(os.sep, '/')
+
+
+def is_encoded_asset(path: str) -> bool:
+    """Указывает ли путь на уже собранный файл."""
+    return os.path.dirname(os.path.abspath(resolve_path(path))) == os.path.abspath(ASSETS_DIR)
+
+
+def asset_name(source_path: str) -> str:
+    """Имя собранного файла: хэш содержимого исходника и параметров кодирования."""
+    digest = hashlib.sha256(file_content_hash(source_path).encode())
+    digest.update(' '.join(ENCODER_ARGS).encode())
+    return f"{digest.hexdigest()[:16]}.ogg"
+
+
+def plan_asset(job: AssetJob) -> AssetJob:
+    """Вычисляет путь собранного файла по содержимому исходника. Выполняется в пуле потоков."""
+    try:
+        job.output_path = relative_path(os.path.join(ASSETS_DIR, asset_name(job.source_path)))
+    except Exception as e:
+        job.error = str(e)
+    return job
+
+
+def group_jobs(jobs: List[AssetJob]) -> Dict[str, List[AssetJob]]:
+    """
+    Группирует задания по собранному файлу: фразы с одинаковым исходником дают один файл,
+    который кодируется один раз. Первой в группе идет фраза, уже указывающая на этот файл.
+    """
+    groups: Dict[str, List[AssetJob]] = {}
+    for job in jobs:
+        groups.setdefault(job.output_path, []).append(job)
+    for output_path, group in groups.items():
+        group.sort(key=lambda job: job.current_path != output_path)
+    return groups
+
+
+def encode_asset(source_path: str, output_path: str, force: bool = False) -> bool:
+    """
+    Кодирует исходник в OGG/Opus, если собранного файла еще нет. Выполняется в пуле потоков.
+    Returns:
+        bool: True, если файл был закодирован, False - если он уже собран
+    """
+    if os.path.exists(output_path) and not force:
+        return False
+
+    # Уникальный временный файл: одновременные сборки не пишут в один и тот же файл
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(output_path))
+    os.close(fd)
+    try:
+        result = subprocess.run(
+            [FFMPEG_PATH, '-loglevel', 'error', '-y', '-i', source_path, *ENCODER_ARGS, '-f', 'ogg', tmp_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            raise Exception(f"FFmpeg error: {result.stderr.decode(errors='replace')}")
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return True
+
+
+async def collect_jobs() -> List[AssetJob]:
+    """Собирает задания по таблице phrases; исходник собранной фразы ищется в PHRASES_DATA по тексту."""
+    sources_by_text = {phrase['text']: phrase['audio_path'] for phrase in PHRASES_DATA}
+    jobs = []
+    for row in await db.get_all_phrases():
+        source = row['audio_path']
+        if not source:
+            continue
+        if is_encoded_asset(source):
+            source = sources_by_text.get(row['text'])
+            if not source:
+                # Исходник неизвестен - оставляем собранный файл как есть
+                continue
+        source_path = resolve_path(source)
+        if not os.path.exists(source_path):
+            logger.warning(f"Audio source for phrase {row['id']} not found: {source}")
+            continue
+        jobs.append(AssetJob(phrase_id=row['id'], current_path=row['audio_path'], source_path=source_path))
+    return jobs
+
+
+async def build_assets(workers: int, force: bool = False) -> Dict[str, int]:
+    """
+    Собирает аудио всех фраз параллельно и обновляет пути в таблице phrases.
+    Фразы с одинаковым аудио не могут указывать на один файл (audio_path уникален):
+    путь получает одна из них, остальные сохраняют прежний и попадают в отчет как конфликты.
+    Returns:
+        Dict[str, int]: Счетчики сборки
+    """
+    counts = {'encoded': 0, 'up_to_date': 0, 'updated': 0, 'conflicts': 0, 'failed': 0}
+    try:
+        await db.init_db()
+        os.makedirs(ASSETS_DIR, exist_ok=True)
+
+        jobs = await collect_jobs()
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            jobs = await asyncio.gather(*(loop.run_in_executor(executor, plan_asset, job) for job in jobs))
+            for job in jobs:
+                if job.error:
+                    counts['failed'] += 1
+                    logger.error(f"Failed to read audio source of phrase {job.phrase_id}: {job.error}")
+            groups = group_jobs([job for job in jobs if not job.error])
+            results = await asyncio.gather(
+                *(loop.run_in_executor(executor, encode_asset, group[0].source_path, resolve_path(output_path), force)
+                  for output_path, group in groups.items()),
+                return_exceptions=True
+            )
+
+        for (output_path, group), result in zip(groups.items(), results):
+            if isinstance(result, Exception):
+                counts['failed'] += len(group)
+                logger.error(f"Failed to encode audio for phrases {[job.phrase_id for job in group]}: {result}")
+                continue
+            counts['encoded' if result else 'up_to_date'] += 1
+
+            owner, duplicates = group[0], group[1:]
+            for job in duplicates:
+                counts['conflicts'] += 1
+                logger.warning(f"Phrase {job.phrase_id} has the same audio as phrase {owner.phrase_id}, "
+                               f"keeping its path {job.current_path}")
+            if owner.current_path == output_path:
+                continue
+            try:
+                await db.update_phrase_audio_path(owner.phrase_id, output_path)
+                counts['updated'] += 1
+            except sqlite3.IntegrityError:
+                # Собранный файл уже назначен фразе, не попавшей в сборку
+                counts['conflicts'] += 1
+                logger.warning(f"{output_path} is already used by another phrase, "
+                               f"keeping path {owner.current_path} of phrase {owner.phrase_id}")
+    finally:
+        await db.close()
+
+    print(f"Encoded: {counts['encoded']}, up to date: {counts['up_to_date']}, paths updated: {counts['updated']}, "
+          f"conflicts: {counts['conflicts']}, failed: {counts['failed']}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка аудио фраз в OGG/Opus")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Количество параллельных ffmpeg")
+    parser.add_argument("--force", action="store_true", help="Пересобрать все файлы")
+    args = parser.parse_args()
+
+    setup_logging()
+    try:
+        asyncio.run(build_assets(args.workers, args.force))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
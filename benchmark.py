@@ -0,0 +1,344 @@
+"""
+Бенчмарки производительности бота.
+
+Запуск:
+    python benchmark.py pool [--queries N] [--concurrency C]
+    python benchmark.py recognition [--backend sphinx] [--jobs N] [--workers W]
+    python benchmark.py matcher [--transcripts N]
+    python benchmark.py faq [--entries N] [--queries Q]
+    python benchmark.py pragmas [--seconds S] [--readers R] [--writers W]
+"""
+import argparse
+import asyncio
+import glob
+import os
+import random
+import re
+import tempfile
+import time
+
+import aiosqlite
+
+from config import MEDIA_DIR, SQLITE_PROFILES, SPHINX_MODEL_LANGUAGE
+from database import Database, pragma_statements
+from evaluation import RecognitionPool, SphinxRecognizerBackend, init_recognizer_backend, normalize_text
+from faq_index import FAQSearchIndex
+from logger import setup_logging, shutdown_logging
+from models import Phrase
+
+
+def print_result(name: str, operations: int, elapsed: float):
+    """Выводит результат замера в едином формате."""
+    print(f"{name:<32} {operations:>8} ops  {elapsed:8.3f} s  {operations / elapsed:10.1f} ops/s")
+
+
+async def run_concurrently(operation, total: int, concurrency: int) -> float:
+    """Выполняет operation() total раз с заданной конкурентностью и возвращает время в секундах."""
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            await operation()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def bench_pool(queries: int, concurrency: int):
+    """
+    Сравнивает пул соединений с открытием соединения на каждый запрос.
+    Оба варианта применяют PRAGMA одного профиля, так что разница - только в переиспользовании соединений.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        db = Database(db_path)
+        await db.init_db()
+        query = 'SELECT * FROM phrases WHERE id = ?'
+        statements = pragma_statements(db.pool.pragmas)
+
+        async def connect() -> aiosqlite.Connection:
+            conn = await aiosqlite.connect(db_path)
+            conn.row_factory = aiosqlite.Row
+            for statement in statements:
+                await conn.execute(statement)
+            return conn
+
+        async def per_call():
+            conn = await connect()
+            try:
+                cursor = await conn.execute(query, (1,))
+                await cursor.fetchone()
+            finally:
+                await conn.close()
+
+        async def pooled():
+            await db.fetch_one(query, (1,))
+
+        print_result("per-call connection", queries, await run_concurrently(per_call, queries, concurrency))
+        print_result(f"pool ({db.pool.size} readers)", queries, await run_concurrently(pooled, queries, concurrency))
+
+        async def per_call_write():
+            conn = await connect()
+            try:
+                await conn.execute('UPDATE phrases SET required_count = required_count WHERE id = ?', (1,))
+                await conn.commit()
+            finally:
+                await conn.close()
+
+        async def pooled_write():
+            await db.execute_query('UPDATE phrases SET required_count = required_count WHERE id = ?', (1,))
+
+        writes = max(1, queries // 10)
+        print_result("per-call connection (write)", writes, await run_concurrently(per_call_write, writes, concurrency))
+        print_result("pool writer (write)", writes, await run_concurrently(pooled_write, writes, concurrency))
+        await db.close()
+
+
+async def bench_recognition(backend: str, jobs: int, workers: int):
+    """Пропускает фразы из media/ через пул распознавания (офлайн-движок не требует сети)."""
+    files = sorted(glob.glob(os.path.join(MEDIA_DIR, '*.wav')))
+    if not files:
+        print(f"No WAV files in {MEDIA_DIR}")
+        return
+
+    started = time.perf_counter()
+    # Фразы в media/ записаны на языке встроенной модели pocketsphinx
+    options = ({'decoders': workers, 'language': SPHINX_MODEL_LANGUAGE}
+               if backend == SphinxRecognizerBackend.name else {})
+    init_recognizer_backend(backend, **options)
+    print(f"model load: {time.perf_counter() - started:.3f} s")
+
+    pool = RecognitionPool(workers=workers, max_concurrent=workers)
+    results = await asyncio.gather(*(pool.recognize(files[i % len(files)]) for i in range(workers)))
+    print(f"warm-up transcripts: {results}")
+
+    async def job(index: int):
+        await pool.recognize(files[index % len(files)])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(job(i) for i in range(jobs)))
+    print_result(f"{backend} x{workers} workers", jobs, time.perf_counter() - started)
+    print(pool.stats())
+    await pool.shutdown()
+
+
+def legacy_check_answer(phrase_row, user_answer: str):
+    """Проверка ответа в прежнем виде: разбор строк ключевых слов и поиск по списку на каждый вызов."""
+    phrase = {
+        'positive_keywords': phrase_row['positive_keywords'].split(','),
+        'negative_keywords': phrase_row['negative_keywords'].split(',') if phrase_row['negative_keywords'] else [],
+    }
+    words = re.sub(r"[^\w\sа-яА-ЯёЁ]", " ", user_answer.lower()).split()
+    for neg_word in phrase['negative_keywords']:
+        if neg_word and neg_word in words:
+            return False
+    positive_count = sum(1 for pos_word in phrase['positive_keywords'] if pos_word in words)
+    return positive_count >= phrase_row['required_count']
+
+
+def compiled_check_answer(phrase: Phrase, user_answer: str):
+    """Проверка ответа скомпилированным KeywordMatcher."""
+    words = normalize_text(user_answer)
+    if phrase.negative_matcher.find(words):
+        return False
+    return len(phrase.positive_matcher.find(words)) >= phrase.required_count
+
+
+def bench_matcher(transcripts: int, seed: int = 42):
+    """Сравнивает прежнюю проверку ответа с KeywordMatcher на синтетическом корпусе ответов."""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)] + ["thank", "you", "i", "like", "music", "my", "name"]
+    rows = []
+    for phrase_id in range(1, 51):
+        positive = rng.sample(vocabulary, 12) + ["thank you"]
+        negative = rng.sample(vocabulary, 4)
+        rows.append({
+            'id': phrase_id, 'text': f"phrase {phrase_id}", 'audio_path': '',
+            'positive_keywords': ','.join(positive), 'negative_keywords': ','.join(negative),
+            'required_count': 2,
+        })
+    corpus = [
+        (rng.randrange(len(rows)), ' '.join(rng.choices(vocabulary, k=rng.randint(5, 60))))
+        for _ in range(transcripts)
+    ]
+
+    started = time.perf_counter()
+    for index, answer in corpus:
+        legacy_check_answer(rows[index], answer)
+    print_result("legacy (split + list scan)", transcripts, time.perf_counter() - started)
+
+    phrases = [Phrase.from_db_row(row) for row in rows]
+    started = time.perf_counter()
+    for index, answer in corpus:
+        compiled_check_answer(phrases[index], answer)
+    print_result("KeywordMatcher", transcripts, time.perf_counter() - started)
+
+    # Только сопоставление, без общей для обоих вариантов нормализации текста
+    tokenized = [(index, normalize_text(answer)) for index, answer in corpus]
+    started = time.perf_counter()
+    for index, words in tokenized:
+        row = rows[index]
+        negative = row['negative_keywords'].split(',')
+        if not any(neg_word in words for neg_word in negative):
+            sum(1 for pos_word in row['positive_keywords'].split(',') if pos_word in words)
+    print_result("legacy, matching only", transcripts, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for index, words in tokenized:
+        phrase = phrases[index]
+        if not phrase.negative_matcher.find(words):
+            phrase.positive_matcher.find(words)
+    print_result("KeywordMatcher, matching only", transcripts, time.perf_counter() - started)
+
+
+def percentile(values, fraction: float) -> float:
+    """Возвращает перцентиль отсортированного списка."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def print_latency(name: str, latencies):
+    """Выводит p50/p95/p99 задержки в микросекундах."""
+    latencies = sorted(latencies)
+    print(f"{name:<32} p50 {percentile(latencies, 0.5) * 1e6:9.1f} us"
+          f"  p95 {percentile(latencies, 0.95) * 1e6:9.1f} us"
+          f"  p99 {percentile(latencies, 0.99) * 1e6:9.1f} us")
+
+
+def legacy_faq_answer(faq_items, user_question: str):
+    """Поиск по FAQ в прежнем виде: разбор ключевых слов и поиск подстроки по всем записям."""
+    user_question_lower = user_question.lower()
+    best_match = None
+    max_keyword_matches = 0
+    for _, question, answer, keywords in faq_items:
+        keyword_list = [k.strip().lower() for k in keywords.split(',')]
+        match_count = sum(1 for keyword in keyword_list if keyword in user_question_lower)
+        if match_count > max_keyword_matches:
+            max_keyword_matches = match_count
+            best_match = answer
+    return best_match
+
+
+def bench_faq(entries: int, queries: int, seed: int = 42):
+    """Сравнивает задержку поиска по FAQ: полный перебор против инвертированного индекса."""
+    rng = random.Random(seed)
+    vocabulary = [f"слово{i}" for i in range(20000)]
+    faq_items = [
+        (i, f"Вопрос {i}", f"Ответ {i}",
+         ','.join(' '.join(rng.sample(vocabulary, rng.randint(1, 2))) for _ in range(rng.randint(3, 8))))
+        for i in range(entries)
+    ]
+    questions = [' '.join(rng.choices(vocabulary, k=rng.randint(3, 15))) for _ in range(queries)]
+
+    index = FAQSearchIndex(db=None)
+    started = time.perf_counter()
+    index.build(faq_items)
+    print(f"index build: {time.perf_counter() - started:.3f} s for {entries} entries")
+
+    latencies = []
+    for question in questions:
+        started = time.perf_counter()
+        legacy_faq_answer(faq_items, question)
+        latencies.append(time.perf_counter() - started)
+    print_latency("legacy substring scan", latencies)
+
+    latencies = []
+    for question in questions:
+        started = time.perf_counter()
+        index.search(question)
+        latencies.append(time.perf_counter() - started)
+    print_latency("inverted index (BM25)", latencies)
+
+
+async def bench_pragmas(seconds: float, readers: int, writers: int):
+    """Сравнивает пропускную способность чтения и записи при одновременной нагрузке для профилей SQLite."""
+    for profile, pragmas in SQLITE_PROFILES.items():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = Database(os.path.join(tmp_dir, 'bench.db'), pragmas=pragmas)
+            await db.init_db()
+            for user_id in range(1, 101):
+                await db.add_user(user_id, f"user{user_id}", "Bench", None)
+            counts = {'reads': 0, 'writes': 0, 'errors': 0}
+            deadline = time.perf_counter() + seconds
+
+            async def reader():
+                while time.perf_counter() < deadline:
+                    try:
+                        await db.fetch_all(
+                            'SELECT * FROM dialog_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT 20',
+                            (random.randint(1, 100),))
+                        counts['reads'] += 1
+                    except aiosqlite.Error:
+                        counts['errors'] += 1
+
+            async def writer():
+                # Запись в обход буфера: каждая вставка - отдельная транзакция, как в пути логирования
+                while time.perf_counter() < deadline:
+                    try:
+                        await db.execute_query(
+                            'INSERT INTO dialog_history (user_id, message_type, content) VALUES (?, ?, ?)',
+                            (random.randint(1, 100), 'user', 'benchmark message'))
+                        counts['writes'] += 1
+                    except aiosqlite.Error:
+                        counts['errors'] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(reader() for _ in range(readers)), *(writer() for _ in range(writers)))
+            elapsed = time.perf_counter() - started
+            print(f"[{profile}] {', '.join(f'{k}={v}' for k, v in pragmas.items())}")
+            print_result(f"{profile}: reads", counts['reads'], elapsed)
+            print_result(f"{profile}: writes", counts['writes'], elapsed)
+            print(f"{profile}: errors {counts['errors']}, WAL size {db.pool.wal_size()} bytes")
+            await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки производительности бота")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    pool_parser = subparsers.add_parser("pool", help="Пул соединений против соединения на запрос")
+    pool_parser.add_argument("--queries", type=int, default=5000)
+    pool_parser.add_argument("--concurrency", type=int, default=16)
+
+    recognition_parser = subparsers.add_parser("recognition", help="Пропускная способность пула распознавания")
+    recognition_parser.add_argument("--backend", default="sphinx")
+    recognition_parser.add_argument("--jobs", type=int, default=50)
+    recognition_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    matcher_parser = subparsers.add_parser("matcher", help="Проверка ответа: прежняя против KeywordMatcher")
+    matcher_parser.add_argument("--transcripts", type=int, default=200000)
+
+    faq_parser = subparsers.add_parser("faq", help="Поиск по FAQ: перебор против инвертированного индекса")
+    faq_parser.add_argument("--entries", type=int, default=10000)
+    faq_parser.add_argument("--queries", type=int, default=500)
+
+    pragmas_parser = subparsers.add_parser("pragmas", help="Чтение и запись под нагрузкой для профилей SQLite")
+    pragmas_parser.add_argument("--seconds", type=float, default=5.0)
+    pragmas_parser.add_argument("--readers", type=int, default=8)
+    pragmas_parser.add_argument("--writers", type=int, default=4)
+
+    args = parser.parse_args()
+    # Журнал только в консоль: бенчмарки работают с временными БД
+    setup_logging(log_file="")
+    try:
+        run_benchmark(args)
+    finally:
+        shutdown_logging()
+
+
+def run_benchmark(args: argparse.Namespace):
+    """Запускает выбранный бенчмарк."""
+    if args.benchmark == "pool":
+        asyncio.run(bench_pool(args.queries, args.concurrency))
+    elif args.benchmark == "recognition":
+        asyncio.run(bench_recognition(args.backend, args.jobs, args.workers))
+    elif args.benchmark == "matcher":
+        bench_matcher(args.transcripts)
+    elif args.benchmark == "faq":
+        bench_faq(args.entries, args.queries)
+    elif args.benchmark == "pragmas":
+        asyncio.run(bench_pragmas(args.seconds, args.readers, args.writers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+from config import PHRASE_CATALOG_TTL, PHRASE_CATALOG_CHECK_INTERVAL
+from models import Phrase
+
+# Настройка логирования для catalog модуля
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    Базовый класс для кэшей справочных таблиц в памяти процесса.
+    Данные перезагружаются при изменении версии таблицы в content_versions
+    (ее увеличивают триггеры БД) или по истечении TTL.
+    """
+    table = ""
+
+    def __init__(self, db, ttl: float, check_interval: float):
+        """Инициализирует кэш. Данные загружаются при первом обращении."""
+        self.db = db
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._version: Optional[int] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def invalidate(self):
+        """Помечает кэш устаревшим: при следующем обращении он будет перезагружен."""
+        self._loaded_at = 0.0
+
+    async def _is_fresh(self) -> bool:
+        """Проверяет актуальность кэша, не чаще раза в check_interval секунд обращаясь к версии в БД."""
+        now = time.monotonic()
+        if not self._loaded_at or now - self._loaded_at >= self.ttl:
+            return False
+        if now - self._checked_at < self.check_interval:
+            return True
+        self._checked_at = now
+        return await self.db.get_content_version(self.table) == self._version
+
+    async def _ensure_fresh(self):
+        """Перезагружает кэш, если он устарел."""
+        if await self._is_fresh():
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not await self._is_fresh():
+                await self.reload()
+
+    async def reload(self):
+        """Загружает данные таблицы из БД."""
+        version = await self.db.get_content_version(self.table)
+        await self._load()
+        self._version = version
+        self._loaded_at = self._checked_at = time.monotonic()
+
+    async def _load(self):
+        """Загружает данные в память. Переопределяется в наследниках."""
+        raise NotImplementedError
+
+
+class PhraseCatalog(VersionedCache):
+    """
+    Каталог фраз в памяти процесса: фразы загружаются один раз и хранятся
+    в виде готовых объектов Phrase с индексом по id.
+    """
+    table = "phrases"
+
+    def __init__(self, db, ttl: float = PHRASE_CATALOG_TTL,
+                 check_interval: float = PHRASE_CATALOG_CHECK_INTERVAL):
+        super().__init__(db, ttl, check_interval)
+        self._by_id: Dict[int, Phrase] = {}
+        self._phrases: List[Phrase] = []
+
+    async def _load(self):
+        phrases = [Phrase.from_db_row(row) for row in await self.db.get_all_phrases()]
+        self._by_id = {phrase.id: phrase for phrase in phrases}
+        self._phrases = phrases
+        logger.info(f"Phrase catalog loaded: {len(phrases)} phrases")
+
+    async def get(self, phrase_id: int) -> Optional[Phrase]:
+        """Возвращает фразу по id."""
+        await self._ensure_fresh()
+        return self._by_id.get(phrase_id)
+
+    async def random(self) -> Optional[Phrase]:
+        """Возвращает случайную фразу или None, если каталог пуст."""
+        await self._ensure_fresh()
+        return random.choice(self._phrases) if self._phrases else None
+
+    async def all(self) -> List[Phrase]:
+        """Возвращает все фразы каталога."""
+        await self._ensure_fresh()
+        return list(self._phrases)
@@ -1,16 +1,161 @@
 import os
 
-TELEGRAM_BOT_TOKEN=""
-TELEGRAM_OPERATOR_ID=""
+TELEGRAM_BOT_TOKEN=os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_OPERATOR_ID=os.getenv("TELEGRAM_OPERATOR_ID", "")
+
+# Режим получения обновлений: polling (long polling) или webhook (HTTP-сервер aiohttp)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")  # Адрес, на котором слушает сервер
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # Публичный URL (https://...); пусто - вебхук не регистрируется
+
+# Несколько процессов-воркеров: обновления распределяются по ним по user_id
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))  # 1 - все обновления обрабатывает один процесс
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))  # Обновлений в очереди одного воркера
+WORKER_START_TIMEOUT = float(os.getenv("WORKER_START_TIMEOUT", "60"))  # Ожидание готовности воркеров, секунды
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", "30"))  # Ожидание завершения воркеров, секунды
 
 
 # Конфигурация путей
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'speech_trainer.db')
+DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DIR, 'speech_trainer.db'))
 MEDIA_DIR = os.path.join(BASE_DIR, 'media')
 os.makedirs(MEDIA_DIR, exist_ok=True)
 
 FFMPEG_PATH = os.getenv("FFMPEG_PATH", r"C:\ffmpeg\bin\ffmpeg.exe")
+AUDIO_PIPELINE = os.getenv("AUDIO_PIPELINE", "stream")  # stream - через stdin/stdout ffmpeg, file - через временные файлы
+AUDIO_SAMPLE_RATE = 16000  # Частота дискретизации PCM для распознавания
+
+# Определение речи (VAD): обрезка тишины перед распознаванием
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))  # Длительность кадра анализа, мс
+VAD_ENERGY_RATIO = float(os.getenv("VAD_ENERGY_RATIO", "3"))  # Порог энергии относительно шумового фона
+VAD_MIN_ENERGY = float(os.getenv("VAD_MIN_ENERGY", "300"))  # Минимальная RMS-энергия речи (отсчеты 16 бит)
+VAD_LOUD_FRACTION = float(os.getenv("VAD_LOUD_FRACTION", "0.9"))  # Доля кадров громче VAD_MIN_ENERGY, при которой запись не обрезается
+VAD_ZCR_THRESHOLD = float(os.getenv("VAD_ZCR_THRESHOLD", "0.25"))  # Доля пересечений нуля для глухих согласных
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "200"))  # Меньше речи - запись отклоняется
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))  # Запас тишины вокруг речи, мс
+VAD_MAX_SPEECH_SECONDS = float(os.getenv("VAD_MAX_SPEECH_SECONDS", "30"))  # Длиннее - обрезается
+
+# Сборка аудио фраз в OGG/Opus (python assets.py)
+ASSETS_DIR = os.path.join(MEDIA_DIR, 'encoded')
+ASSETS_OPUS_BITRATE = os.getenv("ASSETS_OPUS_BITRATE", "32k")
+
+# Настройки пула соединений с БД
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))  # Количество соединений для чтения
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))  # Секунды простоя до проверки соединения
+
+# Профили настроек SQLite: PRAGMA применяются к каждому соединению пула
+SQLITE_PROFILES = {
+    # Настройки SQLite по умолчанию (журнал отката, полная синхронизация)
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    # WAL: читатели не блокируются записью, fsync только при контрольной точке
+    "performance": {
+        # Действует для новых БД; существующую переводит python maintenance.py --enable-incremental-vacuum
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -20000,  # Отрицательное значение - размер в КиБ
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,  # мс
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+SQLITE_CHECKPOINT_INTERVAL = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "60"))  # Секунды между контрольными точками WAL
+SQLITE_WAL_SIZE_LIMIT = int(os.getenv("SQLITE_WAL_SIZE_LIMIT", str(64 * 1024 * 1024)))  # Порог для TRUNCATE, байт
+
+# Настройки буфера отложенной записи (история диалогов и журнал ошибок)
+WRITE_BUFFER_BATCH_SIZE = int(os.getenv("WRITE_BUFFER_BATCH_SIZE", "100"))  # Сброс при накоплении N строк
+WRITE_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL_MS", "500"))  # ...или через T мс
+WRITE_BUFFER_MAX_PENDING = int(os.getenv("WRITE_BUFFER_MAX_PENDING", "10000"))  # Предельный размер буфера
+WRITE_BUFFER_POLICY = os.getenv("WRITE_BUFFER_POLICY", "block")  # block, drop_new или drop_old
+WRITE_BUFFER_MAX_RETRIES = int(os.getenv("WRITE_BUFFER_MAX_RETRIES", "3"))  # Повторы пачки при блокировке БД
+WRITE_BUFFER_RETRY_DELAY_MS = int(os.getenv("WRITE_BUFFER_RETRY_DELAY_MS", "100"))  # Первая пауза, далее удваивается
+
+# Настройки кэша пользователей в мидлвари активности
+USER_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("USER_ACTIVITY_FLUSH_INTERVAL", "30"))  # Точность last_activity, секунды
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "100000"))  # Максимум профилей в кэше
+
+# Хранилище состояний FSM: sqlite (в общей БД, переживает перезапуск) или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "86400"))  # Срок жизни неизменяемого состояния, секунды (0 - бессрочно)
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))  # Состояний в кэше процесса (0 - читать из БД всегда)
+FSM_PURGE_INTERVAL = float(os.getenv("FSM_PURGE_INTERVAL", "600"))  # Удаление просроченных состояний, секунды
+
+# Кэш результатов распознавания (ключ - file_unique_id голосового сообщения или хэш PCM)
+TRANSCRIPT_CACHE_SIZE = int(os.getenv("TRANSCRIPT_CACHE_SIZE", "10000"))  # Записей в памяти процесса
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", "86400"))  # Срок жизни записи, секунды
+TRANSCRIPT_CACHE_PERSIST = os.getenv("TRANSCRIPT_CACHE_PERSIST", "1") == "1"  # Сохранять в таблицу transcript_cache
+
+# Обслуживание истории диалогов: сводки по дням, архив старых строк, удаление и VACUUM
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "1") == "1"
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "21600"))  # Период запуска, секунды
+DIALOG_RETENTION_DAYS = int(os.getenv("DIALOG_RETENTION_DAYS", "90"))  # Сколько дней хранить строки dialog_history
+MAINTENANCE_CHUNK_SIZE = int(os.getenv("MAINTENANCE_CHUNK_SIZE", "1000"))  # Строк в одной транзакции удаления
+MAINTENANCE_CHUNK_PAUSE = float(os.getenv("MAINTENANCE_CHUNK_PAUSE", "0.05"))  # Пауза между транзакциями, секунды
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "2000"))  # Страниц за один incremental_vacuum
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(BASE_DIR, 'archive'))  # Архивы dialog_history (*.jsonl.gz)
+
+# Логирование: запись в файл и консоль выполняет отдельный поток (QueueListener)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(BASE_DIR, 'logs', 'bot.log'))  # Пусто - только консоль
+LOG_ROTATION = os.getenv("LOG_ROTATION", "time")  # time - новый файл в полночь, size - по размеру
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # Размер файла для LOG_ROTATION=size
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "14"))  # Сколько старых файлов хранить
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text или json (одна JSON-запись на строку)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # При переполнении записи отбрасываются
+
+# Метрики (текстовый формат Prometheus по адресу http://METRICS_HOST:METRICS_PORT/metrics)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8000"))  # 0 - не запускать HTTP-сервер
+
+# Настройки каталога фраз в памяти
+PHRASE_CATALOG_TTL = float(os.getenv("PHRASE_CATALOG_TTL", "300"))  # Принудительная перезагрузка, секунды
+PHRASE_CATALOG_CHECK_INTERVAL = float(os.getenv("PHRASE_CATALOG_CHECK_INTERVAL", "5"))  # Проверка версии, секунды
+
+# Настройки поискового индекса FAQ
+FAQ_INDEX_TTL = float(os.getenv("FAQ_INDEX_TTL", "300"))  # Принудительная перестройка, секунды
+FAQ_INDEX_CHECK_INTERVAL = float(os.getenv("FAQ_INDEX_CHECK_INTERVAL", "5"))  # Проверка версии, секунды
+FAQ_INDEX_STEMMING = os.getenv("FAQ_INDEX_STEMMING", "1") == "1"  # Стемминг через nltk
+FAQ_INDEX_MIN_SCORE = float(os.getenv("FAQ_INDEX_MIN_SCORE", "0"))  # Минимальная оценка BM25 для ответа
+
+# Настройки пула распознавания речи
+RECOGNITION_EXECUTOR = os.getenv("RECOGNITION_EXECUTOR", "thread")  # thread или process
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", "4"))  # Количество воркеров пула
+RECOGNITION_MAX_CONCURRENT = int(os.getenv("RECOGNITION_MAX_CONCURRENT", str(RECOGNITION_WORKERS)))  # Одновременных задач
+RECOGNITION_TIMEOUT = float(os.getenv("RECOGNITION_TIMEOUT", "15"))  # Таймаут одной задачи, секунды
+
+# Ограничение обработки голосовых ответов (скачивание, ffmpeg, распознавание)
+VOICE_MAX_ACTIVE = int(os.getenv("VOICE_MAX_ACTIVE", "8"))  # Одновременно обрабатываемых ответов
+VOICE_MAX_QUEUE = int(os.getenv("VOICE_MAX_QUEUE", "32"))  # Ожидающих ответов, сверх - отказ
+VOICE_QUEUE_TIMEOUT = float(os.getenv("VOICE_QUEUE_TIMEOUT", "10"))  # Максимальное ожидание в очереди, секунды
+VOICE_USER_RATE = float(os.getenv("VOICE_USER_RATE", "0.5"))  # Ответов пользователя в секунду, 0 - без ограничения
+VOICE_USER_BURST = float(os.getenv("VOICE_USER_BURST", "5"))  # Ответов пользователя подряд
+
+# Движок распознавания речи: google (онлайн), sphinx или vosk (офлайн)
+RECOGNITION_BACKEND = os.getenv("RECOGNITION_BACKEND", "google")
+RECOGNITION_LANGUAGE = os.getenv("RECOGNITION_LANGUAGE", "ru-RU")  # Язык для Google Speech API
+SPHINX_HMM_PATH = os.getenv("SPHINX_HMM_PATH", "")  # Пусто - встроенная модель en-us из pocketsphinx
+SPHINX_LM_PATH = os.getenv("SPHINX_LM_PATH", "")
+SPHINX_DICT_PATH = os.getenv("SPHINX_DICT_PATH", "")
+SPHINX_MODEL_LANGUAGE = os.getenv("SPHINX_MODEL_LANGUAGE", "en-US")  # Язык модели pocketsphinx (встроенная - en-US)
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", os.path.join(BASE_DIR, 'models', 'vosk'))
+
+# Предварительная загрузка аудио фраз в Telegram при старте (для получения file_id)
+PHRASE_AUDIO_WARMUP = os.getenv("PHRASE_AUDIO_WARMUP", "0") == "1"
+PHRASE_AUDIO_WARMUP_CHAT_ID = os.getenv("PHRASE_AUDIO_WARMUP_CHAT_ID", TELEGRAM_OPERATOR_ID)  # Чат оператора
+
+# Импорт контента (content.py)
+CONTENT_CHUNK_SIZE = int(os.getenv("CONTENT_CHUNK_SIZE", "500"))  # Записей в одной транзакции импорта (не больше 999)
 
 # Данные для инициализации таблицы FAQ
 FAQ_DATA = [
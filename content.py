@@ -0,0 +1,396 @@
+"""
+Импорт и экспорт фраз и FAQ в файлы CSV и JSONL.
+
+Импорт читает файл построчно, проверяет записи и сохраняет их порциями по
+CONTENT_CHUNK_SIZE: каждая порция сравнивается с таблицей (по тексту фразы или
+вопросу FAQ) и записывается одним executemany в отдельной транзакции. Новые
+записи добавляются, измененные обновляются, совпадающие не трогаются; строки
+таблицы, которых нет в файле, не удаляются. Экспорт читает таблицу курсором,
+не загружая ее в память.
+
+Ключевые слова в CSV - строка через запятую, в JSONL - строка или список строк.
+
+Запуск:
+    python content.py import phrases phrases.csv [--dry-run] [--verbose] [--no-audio-check]
+    python content.py import faq faq.jsonl
+    python content.py export phrases phrases.jsonl   # "-" - вывод в stdout
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+from config import BASE_DIR, CONTENT_CHUNK_SIZE
+from logger import setup_logging, shutdown_logging
+from matcher import tokenize
+
+# Настройка логирования для content модуля
+logger = logging.getLogger(__name__)
+
+# Сколько ошибок и изменений выводить подробно
+REPORT_LIMIT = 50
+
+# Ключи порции передаются параметрами IN (...): старые сборки SQLite
+# принимают не больше 999 параметров в одном запросе
+MAX_SQL_VARIABLES = 999
+
+
+class ContentError(ValueError):
+    """Запись файла не прошла проверку."""
+
+
+@dataclass(frozen=True, slots=True)
+class ContentTable:
+    """Описание таблицы контента: ключ, поля в порядке записи и проверка записи."""
+    name: str
+    key: str
+    fields: Tuple[str, ...]
+    keyword_fields: Tuple[str, ...]
+    validate: Callable[[Dict[str, Any], "ImportOptions"], Tuple]
+
+    @property
+    def upsert_sql(self) -> str:
+        """INSERT с обновлением существующей записи по ключу."""
+        columns = ', '.join(self.fields)
+        placeholders = ', '.join('?' for _ in self.fields)
+        updates = ', '.join(f'{name} = excluded.{name}' for name in self.fields if name != self.key)
+        return (f'INSERT INTO {self.name} ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT({self.key}) DO UPDATE SET {updates}')
+
+
+@dataclass(slots=True)
+class ImportOptions:
+    """Параметры импорта."""
+    dry_run: bool = False
+    check_audio: bool = True
+    verbose: bool = False
+    chunk_size: int = CONTENT_CHUNK_SIZE
+
+
+@dataclass(slots=True)
+class ImportReport:
+    """Итоги импорта."""
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+    not_in_file: int = 0
+    errors: List[str] = field(default_factory=list)
+    changes: List[str] = field(default_factory=list)
+
+    def error(self, line: int, message: str):
+        self.invalid += 1
+        self.errors.append(f"line {line}: {message}")
+
+
+def _text(record: Dict[str, Any], name: str, required: bool = True) -> Optional[str]:
+    """Строковое поле без пробелов по краям."""
+    value = record.get(name)
+    if value is None or value == '':
+        if required:
+            raise ContentError(f"{name} is required")
+        return None
+    if not isinstance(value, str):
+        raise ContentError(f"{name} must be a string")
+    value = value.strip()
+    if required and not value:
+        raise ContentError(f"{name} is required")
+    return value or None
+
+
+def _keywords(record: Dict[str, Any], name: str, required: bool = True) -> Optional[str]:
+    """
+    Ключевые слова в формате таблицы (через запятую): без пустых и повторяющихся.
+    Ключевое слово без букв и цифр никогда не совпадет с ответом и считается ошибкой.
+    """
+    value = record.get(name)
+    if value is None:
+        items = []
+    elif isinstance(value, str):
+        items = value.split(',')
+    elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+        if any(',' in item for item in value):
+            raise ContentError(f"{name}: keywords must not contain commas")
+        items = value
+    else:
+        raise ContentError(f"{name} must be a string or a list of strings")
+
+    keywords = []
+    seen = set()
+    for keyword in items:
+        keyword = keyword.strip()
+        if not keyword:
+            continue
+        tokens = tuple(tokenize(keyword))
+        if not tokens:
+            raise ContentError(f"{name}: keyword {keyword!r} has no letters or digits")
+        if tokens not in seen:
+            seen.add(tokens)
+            keywords.append(keyword)
+    if required and not keywords:
+        raise ContentError(f"{name}: at least one keyword is required")
+    return ','.join(keywords) or None
+
+
+def validate_phrase(record: Dict[str, Any], options: ImportOptions) -> Tuple:
+    """Проверяет фразу и возвращает значения полей таблицы phrases."""
+    text = _text(record, 'text')
+    audio_path = _text(record, 'audio_path')
+    if options.check_audio and not os.path.isfile(os.path.join(BASE_DIR, audio_path)):
+        raise ContentError(f"audio file not found: {audio_path}")
+    positive = _keywords(record, 'positive_keywords')
+    negative = _keywords(record, 'negative_keywords', required=False)
+
+    required_count = record.get('required_count')
+    if required_count in (None, ''):
+        required_count = 2
+    try:
+        required_count = int(required_count)
+    except (TypeError, ValueError):
+        raise ContentError("required_count must be an integer")
+    keyword_count = len(positive.split(','))
+    if not 1 <= required_count <= keyword_count:
+        raise ContentError(f"required_count must be between 1 and the number of positive keywords ({keyword_count})")
+    return text, audio_path, positive, negative, required_count
+
+
+def validate_faq(record: Dict[str, Any], options: ImportOptions) -> Tuple:
+    """Проверяет запись FAQ и возвращает значения полей таблицы faq."""
+    return _text(record, 'question'), _text(record, 'answer'), _keywords(record, 'keywords')
+
+
+TABLES: Dict[str, ContentTable] = {
+    'phrases': ContentTable(
+        'phrases', 'text', ('text', 'audio_path', 'positive_keywords', 'negative_keywords', 'required_count'),
+        ('positive_keywords', 'negative_keywords'), validate_phrase),
+    'faq': ContentTable('faq', 'question', ('question', 'answer', 'keywords'), ('keywords',), validate_faq),
+}
+
+
+def detect_format(path: str, file_format: Optional[str]) -> str:
+    """Формат файла: явно заданный или по расширению (по умолчанию jsonl)."""
+    if file_format:
+        return file_format
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(source: TextIO, file_format: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Построчно читает записи файла: (номер строки, запись или None, ошибка разбора)."""
+    if file_format == 'csv':
+        reader = csv.DictReader(source)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for line_number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, None, f"invalid JSON: {e.msg}"
+            continue
+        if isinstance(record, dict):
+            yield line_number, record, None
+        else:
+            yield line_number, None, "expected a JSON object"
+
+
+def _describe_change(table: ContentTable, values: Tuple, existing: Optional[Dict]) -> str:
+    """Строка отчета об изменении записи."""
+    key = values[table.fields.index(table.key)]
+    if existing is None:
+        return f"+ {key}"
+    changed = [name for name, value in zip(table.fields, values) if existing[name] != value]
+    return f"~ {key}: {', '.join(changed)}"
+
+
+async def _apply_chunk(conn, table: ContentTable, chunk: List[Tuple[int, Tuple]], report: ImportReport,
+                       options: ImportOptions):
+    """Сравнивает порцию записей с таблицей и записывает новые и измененные."""
+    keys = [values[table.fields.index(table.key)] for _, values in chunk]
+    placeholders = ', '.join('?' for _ in keys)
+    cursor = await conn.execute(
+        f"SELECT {', '.join(table.fields)} FROM {table.name} WHERE {table.key} IN ({placeholders})", keys)
+    existing = {row[table.key]: dict(row) for row in await cursor.fetchall()}
+
+    audio_owners = {}
+    if table.name == 'phrases':
+        paths = [values[1] for _, values in chunk]
+        cursor = await conn.execute(
+            f"SELECT text, audio_path FROM phrases WHERE audio_path IN ({', '.join('?' for _ in paths)})", paths)
+        audio_owners = {row['audio_path']: row['text'] for row in await cursor.fetchall()}
+
+    rows = []
+    for line_number, values in chunk:
+        key = values[table.fields.index(table.key)]
+        current = existing.get(key)
+        if table.name == 'phrases' and audio_owners.get(values[1], key) != key:
+            report.error(line_number, f"audio_path {values[1]} is already used by phrase {audio_owners[values[1]]!r}")
+            continue
+        if current is not None and tuple(current[name] for name in table.fields) == values:
+            report.unchanged += 1
+            continue
+        if current is None:
+            report.added += 1
+        else:
+            report.updated += 1
+        if options.verbose and len(report.changes) < REPORT_LIMIT:
+            report.changes.append(_describe_change(table, values, current))
+        rows.append(values)
+
+    if rows and not options.dry_run:
+        await conn.executemany(table.upsert_sql, rows)
+        await conn.commit()
+
+
+async def import_content(db, table: ContentTable, source: TextIO, file_format: str,
+                         options: ImportOptions) -> ImportReport:
+    """
+    Импортирует записи из открытого файла в таблицу порциями.
+    Returns:
+        ImportReport: Количество добавленных, измененных, совпавших и ошибочных записей
+    """
+    report = ImportReport()
+    seen_keys: Set[str] = set()
+    seen_audio: Set[str] = set()
+
+    def valid_records() -> Iterator[Tuple[int, Tuple]]:
+        for line_number, record, error in read_records(source, file_format):
+            if error is None:
+                try:
+                    values = table.validate(record, options)
+                except ContentError as e:
+                    error = str(e)
+            if error is None:
+                key = values[table.fields.index(table.key)]
+                if key in seen_keys:
+                    error = f"duplicate {table.key} {key!r}"
+                elif table.name == 'phrases' and values[1] in seen_audio:
+                    error = f"duplicate audio_path {values[1]}"
+            if error is not None:
+                report.error(line_number, error)
+                continue
+            seen_keys.add(key)
+            if table.name == 'phrases':
+                seen_audio.add(values[1])
+            yield line_number, values
+
+    records = valid_records()
+    chunk_size = max(1, min(options.chunk_size, MAX_SQL_VARIABLES))
+    while chunk := list(islice(records, chunk_size)):
+        # Каждая порция - отдельная транзакция: запись бота не ждет весь импорт
+        connection = db.get_connection() if options.dry_run else db.get_write_connection()
+        async with connection as conn:
+            await _apply_chunk(conn, table, chunk, report, options)
+
+    async with db.get_connection() as conn:
+        async with conn.execute(f"SELECT {table.key} FROM {table.name}") as cursor:
+            async for row in cursor:
+                if row[0] not in seen_keys:
+                    report.not_in_file += 1
+    return report
+
+
+def _export_value(table: ContentTable, name: str, value: Any, file_format: str) -> Any:
+    """Значение поля для файла: ключевые слова в JSONL - списком."""
+    if name in table.keyword_fields and file_format == 'jsonl':
+        return value.split(',') if value else []
+    return '' if value is None else value
+
+
+async def export_content(db, table: ContentTable, target: TextIO, file_format: str) -> int:
+    """
+    Выгружает таблицу в открытый файл, читая строки курсором.
+    Returns:
+        int: Количество выгруженных записей
+    """
+    writer = csv.writer(target) if file_format == 'csv' else None
+    if writer is not None:
+        writer.writerow(table.fields)
+    count = 0
+    async with db.get_connection() as conn:
+        async with conn.execute(f"SELECT {', '.join(table.fields)} FROM {table.name} ORDER BY id") as cursor:
+            async for row in cursor:
+                values = [_export_value(table, name, row[name], file_format) for name in table.fields]
+                if writer is not None:
+                    writer.writerow(values)
+                else:
+                    target.write(json.dumps(dict(zip(table.fields, values)), ensure_ascii=False) + '\n')
+                count += 1
+    return count
+
+
+def print_report(table: ContentTable, report: ImportReport, dry_run: bool):
+    """Выводит итоги импорта."""
+    for line in report.changes:
+        print(line)
+    for line in report.errors[:REPORT_LIMIT]:
+        print(line, file=sys.stderr)
+    if len(report.errors) > REPORT_LIMIT:
+        print(f"... and {len(report.errors) - REPORT_LIMIT} more errors", file=sys.stderr)
+    prefix = "Dry run, nothing written. " if dry_run else ""
+    print(f"{prefix}{table.name}: {report.added} added, {report.updated} updated, {report.unchanged} unchanged, "
+          f"{report.invalid} invalid; {report.not_in_file} rows in the table are not in the file (kept)")
+
+
+async def run(args: argparse.Namespace) -> int:
+    """Выполняет команду импорта или экспорта."""
+    from database import db
+
+    table = TABLES[args.table]
+    file_format = detect_format(args.path, args.format)
+    # Импорт в пустую БД не смешивается с начальными данными из config.py
+    await db.init_db(seed=False)
+    try:
+        if args.command == 'import':
+            options = ImportOptions(dry_run=args.dry_run, check_audio=not args.no_audio_check,
+                                    verbose=args.verbose or args.dry_run)
+            with open(args.path, newline='', encoding='utf-8-sig') as source:
+                report = await import_content(db, table, source, file_format, options)
+            print_report(table, report, args.dry_run)
+            return 1 if report.invalid else 0
+
+        if args.path == '-':
+            count = await export_content(db, table, sys.stdout, file_format)
+        else:
+            with open(args.path, 'w', newline='', encoding='utf-8') as target:
+                count = await export_content(db, table, target, file_format)
+        print(f"Exported {count} {table.name} rows", file=sys.stderr)
+        return 0
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт и экспорт фраз и FAQ (CSV, JSONL)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Загрузить записи из файла")
+    import_parser.add_argument("table", choices=sorted(TABLES))
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=("csv", "jsonl"), help="По умолчанию - по расширению файла")
+    import_parser.add_argument("--dry-run", action="store_true", help="Только проверить и показать изменения")
+    import_parser.add_argument("--verbose", action="store_true", help="Показать добавленные и измененные записи")
+    import_parser.add_argument("--no-audio-check", action="store_true",
+                               help="Не проверять наличие аудиофайлов фраз")
+
+    export_parser = subparsers.add_parser("export", help="Выгрузить таблицу в файл")
+    export_parser.add_argument("table", choices=sorted(TABLES))
+    export_parser.add_argument("path", help='Файл или "-" для вывода в stdout')
+    export_parser.add_argument("--format", choices=("csv", "jsonl"), help="По умолчанию - по расширению файла")
+
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        sys.exit(asyncio.run(run(args)))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
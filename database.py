@@ -1,33 +1,277 @@
+import asyncio
+import os
+import time
 import aiosqlite
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import List, Optional, Tuple, Dict, Any, AsyncGenerator
-from config import DB_PATH, FAQ_DATA, PHRASES_DATA
+from config import (DB_PATH, FAQ_DATA, PHRASES_DATA, DB_POOL_SIZE, DB_POOL_HEALTH_CHECK_INTERVAL,
+                    SQLITE_PROFILES, SQLITE_PROFILE, SQLITE_CHECKPOINT_INTERVAL, SQLITE_WAL_SIZE_LIMIT)
+from write_buffer import WriteBehindBuffer
+from user_tracker import UserActivityTracker
+from catalog import PhraseCatalog
+from faq_index import FAQSearchIndex
+from migrations import apply_migrations, REBUILD_USER_STATS
+from metrics import registry, instrument_methods, DB_METHOD_DURATION, DB_METHOD_ERRORS
 import logging
 
 # Настройка логирования для database модуля
 logger = logging.getLogger(__name__)
 
 
+# PRAGMA, которые можно задать в профиле SQLite: допустимые слова или int для числовых значений.
+# Имена и значения подставляются в текст запроса, поэтому другие не принимаются
+PRAGMA_VALUES: Dict[str, Any] = {
+    'auto_vacuum': ('NONE', 'FULL', 'INCREMENTAL'),
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+    'locking_mode': ('NORMAL', 'EXCLUSIVE'),
+    'cache_size': int,
+    'mmap_size': int,
+    'busy_timeout': int,
+    'journal_size_limit': int,
+    'wal_autocheckpoint': int,
+}
+
+# Режимы PRAGMA wal_checkpoint
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def pragma_statements(pragmas: Dict[str, Any]) -> List[str]:
+    """
+    Проверяет PRAGMA профиля по списку PRAGMA_VALUES и возвращает запросы для соединения.
+    Raises:
+        ValueError: Неизвестная PRAGMA или недопустимое значение
+    """
+    statements = []
+    for name, value in pragmas.items():
+        allowed = PRAGMA_VALUES.get(name)
+        if allowed is None:
+            raise ValueError(f"Unsupported SQLite pragma: {name!r}")
+        if allowed is int:
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"PRAGMA {name} expects an integer, got {value!r}")
+        elif not isinstance(value, str) or value.upper() not in allowed:
+            raise ValueError(f"PRAGMA {name} expects one of {', '.join(allowed)}, got {value!r}")
+        else:
+            value = value.upper()
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def utc_timestamp() -> str:
+    """Текущее время UTC в формате CURRENT_TIMESTAMP SQLite."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений aiosqlite с отдельным соединением для записи."""
+
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE,
+                 health_check_interval: float = DB_POOL_HEALTH_CHECK_INTERVAL,
+                 pragmas: Optional[Dict[str, Any]] = None,
+                 checkpoint_interval: float = SQLITE_CHECKPOINT_INTERVAL,
+                 wal_size_limit: int = SQLITE_WAL_SIZE_LIMIT):
+        """Инициализирует пул. Соединения открываются в методе open()."""
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.health_check_interval = health_check_interval
+        self.pragmas = SQLITE_PROFILES[SQLITE_PROFILE] if pragmas is None else pragmas
+        self._pragma_statements = pragma_statements(self.pragmas)
+        self.checkpoint_interval = checkpoint_interval
+        self.wal_size_limit = wal_size_limit
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._last_used: Dict[int, float] = {}
+        self._all_readers: List[aiosqlite.Connection] = []
+
+    @property
+    def is_open(self) -> bool:
+        """Открыт ли пул."""
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открывает новое соединение и применяет к нему PRAGMA профиля."""
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for statement in self._pragma_statements:
+            await conn.execute(statement)
+        self._last_used[id(conn)] = time.monotonic()
+        return conn
+
+    async def open(self):
+        """Открывает соединения для чтения и соединение для записи."""
+        if self.is_open:
+            return
+        self._readers = asyncio.Queue()
+        self._write_lock = asyncio.Lock()
+        self._writer = await self._connect()
+        for _ in range(self.size):
+            conn = await self._connect()
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        if self.is_wal and self.checkpoint_interval > 0:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+        logger.info(f"Connection pool opened: {self.size} readers + 1 writer")
+
+    async def close(self):
+        """Закрывает все соединения пула."""
+        if not self.is_open:
+            return
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+        writer, self._writer = self._writer, None
+        async with self._write_lock:
+            await self._close_quietly(writer)
+        for conn in self._all_readers:
+            await self._close_quietly(conn)
+        self._all_readers.clear()
+        self._last_used.clear()
+        self._readers = None
+        logger.info("Connection pool closed")
+
+    @property
+    def is_wal(self) -> bool:
+        """Используется ли журнал WAL."""
+        return str(self.pragmas.get('journal_mode', '')).upper() == 'WAL'
+
+    def wal_size(self) -> int:
+        """Текущий размер файла WAL в байтах."""
+        try:
+            return os.path.getsize(f"{self.db_path}-wal")
+        except OSError:
+            return 0
+
+    async def checkpoint(self, mode: str = 'PASSIVE') -> Tuple[int, int, int]:
+        """
+        Переносит страницы из WAL в основной файл БД.
+        Returns:
+            Tuple[int, int, int]: (занято, страниц в WAL, перенесено страниц)
+        """
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Unknown WAL checkpoint mode: {mode!r}")
+        async with self.writer() as conn:
+            cursor = await conn.execute(f'PRAGMA wal_checkpoint({mode})')
+            return tuple(await cursor.fetchone())
+
+    async def _checkpoint_loop(self):
+        """
+        Периодически выполняет контрольную точку WAL. PASSIVE не ждет читателей;
+        если файл WAL все равно превысил лимит, TRUNCATE обрезает его до нуля.
+        """
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                busy, frames, done = await self.checkpoint('PASSIVE')
+                size = self.wal_size()
+                if size > self.wal_size_limit:
+                    busy, frames, done = await self.checkpoint('TRUNCATE')
+                    logger.info(f"WAL truncated: {size} bytes, busy={busy}, checkpointed {done}/{frames} pages")
+            except Exception as e:
+                logger.warning(f"WAL checkpoint failed: {e}")
+
+    async def _close_quietly(self, conn: aiosqlite.Connection):
+        """Закрывает соединение, игнорируя ошибки."""
+        try:
+            await conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing connection: {e}")
+
+    async def _ensure_healthy(self, conn: aiosqlite.Connection) -> aiosqlite.Connection:
+        """Проверяет простаивавшее соединение и переоткрывает его при ошибке."""
+        now = time.monotonic()
+        if now - self._last_used.get(id(conn), now) >= self.health_check_interval:
+            try:
+                await conn.execute('SELECT 1')
+            except Exception as e:
+                logger.warning(f"Unhealthy connection replaced: {e}")
+                self._last_used.pop(id(conn), None)
+                await self._close_quietly(conn)
+                conn = await self._connect()
+        self._last_used[id(conn)] = now
+        return conn
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncGenerator[aiosqlite.Connection, None]:
+        """Выдает соединение для чтения и возвращает его в пул после использования."""
+        conn = await self._readers.get()
+        try:
+            fresh = await self._ensure_healthy(conn)
+            if fresh is not conn:
+                self._all_readers[self._all_readers.index(conn)] = fresh
+                conn = fresh
+            yield conn
+        finally:
+            if self._readers is not None:
+                self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncGenerator[aiosqlite.Connection, None]:
+        """Выдает единственное соединение для записи; при ошибке откатывает транзакцию."""
+        async with self._write_lock:
+            self._writer = await self._ensure_healthy(self._writer)
+            try:
+                yield self._writer
+            except Exception:
+                await self._writer.rollback()
+                raise
+
+
+@instrument_methods(DB_METHOD_DURATION, DB_METHOD_ERRORS, exclude=('open', 'close'))
 class Database:
     """Класс для управления базой данных с использованием контекстных менеджеров."""
 
-    def __init__(self, db_path: str = DB_PATH):
-        """Инициализирует экземпляр базы данных."""
+    def __init__(self, db_path: str = DB_PATH, pool_size: int = DB_POOL_SIZE,
+                 pragmas: Optional[Dict[str, Any]] = None):
+        """Инициализирует экземпляр базы данных. pragmas по умолчанию берутся из профиля SQLITE_PROFILE."""
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size, pragmas=pragmas)
+        self.write_buffer = WriteBehindBuffer(self)
+        self.users = UserActivityTracker(self)
+        self.phrases = PhraseCatalog(self)
+        self.faq_index = FAQSearchIndex(self)
+        self._open_lock = asyncio.Lock()
+
+    async def open(self):
+        """Открывает пул соединений и запускает фоновые задачи записи."""
+        if self.pool.is_open:
+            return
+        async with self._open_lock:
+            await self.pool.open()
+            self.write_buffer.start()
+            self.users.start()
+
+    async def close(self):
+        """Сбрасывает отложенные записи и закрывает пул соединений."""
+        await self.users.stop()
+        await self.write_buffer.stop()
+        await self.pool.close()
 
     @asynccontextmanager
     async def get_connection(self) -> AsyncGenerator[aiosqlite.Connection, None]:
-        """Асинхронный контекстный менеджер для получения соединения с БД."""
-        conn = await aiosqlite.connect(self.db_path)
-        conn.row_factory = aiosqlite.Row
-        try:
+        """Асинхронный контекстный менеджер для получения соединения с БД из пула (для чтения)."""
+        await self.open()
+        async with self.pool.reader() as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def get_write_connection(self) -> AsyncGenerator[aiosqlite.Connection, None]:
+        """Асинхронный контекстный менеджер для получения единственного соединения записи."""
+        await self.open()
+        async with self.pool.writer() as conn:
             yield conn
-        finally:
-            await conn.close()
 
     async def execute_query(self, query: str, params: Tuple = None) -> Optional[Any]:
         """Выполняет запрос к базе данных и возвращает результат."""
-        async with self.get_connection() as conn:
+        async with self.get_write_connection() as conn:
             cursor = await conn.execute(query, params or ())
             await conn.commit()
             return cursor
@@ -44,120 +288,57 @@ class Database:
             cursor = await conn.execute(query, params or ())
             return await cursor.fetchall()
 
-    async def init_db(self):
-        """Инициализирует базу данных и создает таблицы при необходимости."""
-        async with self.get_connection() as conn:
-            # Создание таблицы phrases
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS phrases (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    text TEXT NOT NULL UNIQUE,
-                    audio_path TEXT UNIQUE,
-                    positive_keywords TEXT NOT NULL,
-                    negative_keywords TEXT,
-                    required_count INTEGER DEFAULT 2
-                )
-            ''')
-
-            # Создание таблицы faq
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS faq (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question TEXT NOT NULL UNIQUE,
-                    answer TEXT NOT NULL,
-                    keywords TEXT NOT NULL
-                )
-            ''')
-
-            # Таблица пользователей
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    last_activity DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Таблица сессий практики
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS practice_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    end_time DATETIME,
-                    phrases_practiced INTEGER DEFAULT 0,
-                    correct_answers INTEGER DEFAULT 0,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-
-            # Таблица истории диалогов
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS dialog_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    session_id INTEGER,
-                    message_type TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (session_id) REFERENCES practice_sessions (id)
-                )
-            ''')
-
-            # Таблица ошибок
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS error_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    error_type TEXT NOT NULL,
-                    error_message TEXT NOT NULL,
-                    traceback TEXT,
-                    user_id INTEGER,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-
-            # Проверяем, есть ли данные в таблицах
-            cursor = await conn.execute('SELECT COUNT(*) as count FROM phrases')
-            phrases_count = (await cursor.fetchone())['count']
-
-            cursor = await conn.execute('SELECT COUNT(*) as count FROM faq')
-            faq_count = (await cursor.fetchone())['count']
-
-            # Добавляем начальные данные, если таблицы пустые
-            if phrases_count == 0:
-                for phrase in PHRASES_DATA:
-                    await conn.execute(
-                        '''INSERT INTO phrases 
+    async def init_db(self, seed: bool = True):
+        """
+        Инициализирует базу данных: применяет миграции схемы и заполняет пустые таблицы.
+        Args:
+            seed (bool): Заполнять пустые таблицы phrases и faq данными из config.py
+        """
+        async with self.get_write_connection() as conn:
+            # Создание и обновление схемы
+            await apply_migrations(conn)
+
+            if seed:
+                # Проверка и заполнение - одна транзакция BEGIN IMMEDIATE: при одновременном запуске
+                # нескольких процессов (BOT_WORKERS) таблицы заполняет только первый
+                await conn.execute('BEGIN IMMEDIATE')
+                # Проверяем, есть ли данные в таблицах
+                cursor = await conn.execute('SELECT COUNT(*) as count FROM phrases')
+                phrases_count = (await cursor.fetchone())['count']
+
+                cursor = await conn.execute('SELECT COUNT(*) as count FROM faq')
+                faq_count = (await cursor.fetchone())['count']
+
+                # Добавляем начальные данные, если таблицы пустые
+                if phrases_count == 0:
+                    await conn.executemany(
+                        '''INSERT INTO phrases
                         (text, audio_path, positive_keywords, negative_keywords, required_count)
                         VALUES (?, ?, ?, ?, ?)''',
-                        (phrase['text'], phrase['audio_path'],
-                         #','.join(phrase['positive_keywords']),
-                         #','.join(phrase['negative_keywords']) if phrase['negative_keywords'] else None,
-                         phrase['positive_keywords'],
-                         phrase['negative_keywords'] if phrase['negative_keywords'] else None,
-                         phrase['required_count'])
+                        [(phrase['text'], phrase['audio_path'], phrase['positive_keywords'],
+                          phrase['negative_keywords'] or None, phrase['required_count'])
+                         for phrase in PHRASES_DATA]
                     )
 
-            if faq_count == 0:
-                for faq in FAQ_DATA:
-                    await conn.execute(
+                if faq_count == 0:
+                    await conn.executemany(
                         'INSERT INTO faq (question, answer, keywords) VALUES (?, ?, ?)',
-                        (faq['question'], faq['answer'], faq['keywords'])
+                        [(faq['question'], faq['answer'], faq['keywords']) for faq in FAQ_DATA]
                     )
 
             await conn.commit()
             logger.info("Database initialized successfully")
 
     async def add_user(self, user_id: int, username: str, first_name: str, last_name: str):
-        """Добавление/обновление пользователя"""
+        """Добавление/обновление пользователя (created_at сохраняется)"""
         await self.execute_query(
-            '''INSERT OR REPLACE INTO users (id, username, first_name, last_name, last_activity)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+            '''INSERT INTO users (id, username, first_name, last_name, last_activity)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                last_activity = excluded.last_activity''',
             (user_id, username, first_name, last_name)
         )
 
@@ -168,6 +349,15 @@ class Database:
             (user_id,)
         )
 
+    async def update_users_activity(self, activity: List[Tuple[float, int]]):
+        """Пакетное обновление last_activity: список пар (unix-время, id пользователя)"""
+        async with self.get_write_connection() as conn:
+            await conn.executemany(
+                "UPDATE users SET last_activity = datetime(?, 'unixepoch') WHERE id = ?",
+                activity
+            )
+            await conn.commit()
+
     async def start_practice_session(self, user_id: int) -> int:
         """Начало новой сессии практики"""
         cursor = await self.execute_query(
@@ -177,53 +367,78 @@ class Database:
         return cursor.lastrowid if cursor else None
 
     async def end_practice_session(self, session_id: int, phrases_practiced: int, correct_answers: int):
-        """Завершение сессии практики"""
-        await self.execute_query(
-            '''UPDATE practice_sessions
-            SET end_time = CURRENT_TIMESTAMP,
-                phrases_practiced = ?,
-                correct_answers = ?
-            WHERE id = ?''',
-            (phrases_practiced, correct_answers, session_id)
-        )
+        """Завершение сессии практики с обновлением агрегатов user_stats в той же транзакции"""
+        async with self.get_write_connection() as conn:
+            cursor = await conn.execute(
+                '''UPDATE practice_sessions
+                SET end_time = CURRENT_TIMESTAMP,
+                    phrases_practiced = ?,
+                    correct_answers = ?
+                WHERE id = ? AND end_time IS NULL''',
+                (phrases_practiced, correct_answers, session_id)
+            )
+            # Повторное завершение уже закрытой сессии не учитывается в статистике дважды
+            if cursor.rowcount:
+                accuracy = correct_answers / phrases_practiced if phrases_practiced else None
+                await conn.execute(
+                    '''INSERT INTO user_stats (user_id, total_sessions, total_phrases, total_correct,
+                                            accuracy_sum, accuracy_sessions)
+                    SELECT user_id, 1, ?, ?, COALESCE(?, 0), ? FROM practice_sessions WHERE id = ?
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        total_sessions = total_sessions + 1,
+                        total_phrases = total_phrases + excluded.total_phrases,
+                        total_correct = total_correct + excluded.total_correct,
+                        accuracy_sum = accuracy_sum + excluded.accuracy_sum,
+                        accuracy_sessions = accuracy_sessions + excluded.accuracy_sessions,
+                        updated_at = CURRENT_TIMESTAMP''',
+                    (phrases_practiced, correct_answers, accuracy, int(accuracy is not None), session_id)
+                )
+            await conn.commit()
 
     async def add_dialog_message(self, user_id: int, session_id: Optional[int],
                                  message_type: str, content: str):
-        """Добавление сообщения в историю диалогов"""
-        await self.execute_query(
-            '''INSERT INTO dialog_history (user_id, session_id, message_type, content)
-            VALUES (?, ?, ?, ?)''',
-            (user_id, session_id, message_type, content)
+        """Добавление сообщения в историю диалогов (через буфер отложенной записи)"""
+        await self.write_buffer.put(
+            '''INSERT INTO dialog_history (user_id, session_id, message_type, content, timestamp)
+            VALUES (?, ?, ?, ?, ?)''',
+            (user_id, session_id, message_type, content, utc_timestamp())
         )
 
     async def log_error(self, error_type: str, error_message: str,
                         traceback: Optional[str] = None, user_id: Optional[int] = None):
-        """Логирование ошибки"""
-        await self.execute_query(
-            '''INSERT INTO error_logs (error_type, error_message, traceback, user_id)
-            VALUES (?, ?, ?, ?)''',
-            (error_type, error_message, traceback, user_id)
+        """Логирование ошибки (через буфер отложенной записи)"""
+        await self.write_buffer.put(
+            '''INSERT INTO error_logs (error_type, error_message, traceback, user_id, timestamp)
+            VALUES (?, ?, ?, ?, ?)''',
+            (error_type, error_message, traceback, user_id, utc_timestamp())
         )
 
     async def get_user_stats(self, user_id: int) -> dict:
-        """Получение статистики пользователя"""
+        """Получение статистики пользователя из агрегатов user_stats"""
         result = await self.fetch_one(
-            '''SELECT COUNT(*) as total_sessions,
-               SUM(phrases_practiced) as total_phrases,
-               SUM(correct_answers) as total_correct,
-               AVG(correct_answers * 1.0 / phrases_practiced) as accuracy
-            FROM practice_sessions
-            WHERE user_id = ? AND end_time IS NOT NULL''',
+            '''SELECT total_sessions, total_phrases, total_correct, accuracy_sum, accuracy_sessions
+            FROM user_stats
+            WHERE user_id = ?''',
             (user_id,)
         )
+        if not result:
+            return {'total_sessions': 0, 'total_phrases': 0, 'total_correct': 0, 'accuracy': 0}
 
+        accuracy = result['accuracy_sum'] / result['accuracy_sessions'] if result['accuracy_sessions'] else 0
         return {
-            'total_sessions': result['total_sessions'] or 0,
-            'total_phrases': result['total_phrases'] or 0,
-            'total_correct': result['total_correct'] or 0,
-            'accuracy': round(result['accuracy'] * 100, 2) if result['accuracy'] else 0
+            'total_sessions': result['total_sessions'],
+            'total_phrases': result['total_phrases'],
+            'total_correct': result['total_correct'],
+            'accuracy': round(accuracy * 100, 2) if accuracy else 0
         }
 
+    async def rebuild_user_stats(self):
+        """Пересчитывает таблицу user_stats по завершенным сессиям practice_sessions"""
+        async with self.get_write_connection() as conn:
+            for query in REBUILD_USER_STATS:
+                await conn.execute(query)
+            await conn.commit()
+
     async def get_all_phrases(self):
         """Получает все фразы из базы данных."""
         rows = await self.fetch_all('SELECT * FROM phrases')
@@ -239,6 +454,58 @@ class Database:
         row = await self.fetch_one('SELECT * FROM phrases ORDER BY RANDOM() LIMIT 1')
         return row
 
+    async def update_phrase_audio_path(self, phrase_id: int, audio_path: str):
+        """Обновляет путь к аудиофайлу фразы."""
+        await self.execute_query('UPDATE phrases SET audio_path = ? WHERE id = ?', (audio_path, phrase_id))
+
+    async def get_content_version(self, name: str) -> int:
+        """Получает версию справочной таблицы (phrases, faq)."""
+        row = await self.fetch_one('SELECT version FROM content_versions WHERE name = ?', (name,))
+        return row['version'] if row else 0
+
+    async def get_phrase_audio_file_ids(self) -> List[Dict]:
+        """Получает сохраненные Telegram file_id аудио фраз."""
+        return await self.fetch_all('SELECT phrase_id, content_hash, file_id FROM phrase_audio_cache')
+
+    async def save_phrase_audio_file_id(self, phrase_id: int, content_hash: str, file_id: str):
+        """Сохраняет Telegram file_id аудио фразы вместе с хэшем содержимого файла."""
+        await self.execute_query(
+            '''INSERT INTO phrase_audio_cache (phrase_id, content_hash, file_id, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(phrase_id) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                file_id = excluded.file_id,
+                updated_at = excluded.updated_at''',
+            (phrase_id, content_hash, file_id)
+        )
+
+    async def delete_phrase_audio_file_id(self, phrase_id: int):
+        """Удаляет сохраненный file_id аудио фразы."""
+        await self.execute_query('DELETE FROM phrase_audio_cache WHERE phrase_id = ?', (phrase_id,))
+
+    async def get_transcript(self, key: str, not_before: float) -> Optional[Tuple[str, float]]:
+        """
+        Получает сохраненный результат распознавания, записанный не раньше not_before (unix-время).
+        Returns:
+            Optional[Tuple[str, float]]: (текст, время записи) или None
+        """
+        row = await self.fetch_one(
+            'SELECT transcript, created_at FROM transcript_cache WHERE key = ? AND created_at >= ?', (key, not_before)
+        )
+        return (row['transcript'], row['created_at']) if row else None
+
+    async def save_transcript(self, key: str, transcript: str, created_at: float):
+        """Сохраняет результат распознавания (через буфер отложенной записи)."""
+        await self.write_buffer.put(
+            'INSERT OR REPLACE INTO transcript_cache (key, transcript, created_at) VALUES (?, ?, ?)',
+            (key, transcript, created_at)
+        )
+
+    async def purge_transcripts(self, before: float) -> int:
+        """Удаляет результаты распознавания, записанные раньше before (unix-время)."""
+        cursor = await self.execute_query('DELETE FROM transcript_cache WHERE created_at < ?', (before,))
+        return cursor.rowcount
+
     async def get_all_faq(self):
         """Получает все записи FAQ из базы данных."""
         rows = await self.fetch_all('SELECT * FROM faq')
@@ -246,4 +513,34 @@ class Database:
 
 
 # Глобальный экземпляр базы данных
-db = Database()
\ No newline at end of file
+db = Database()
+
+registry.gauge("write_buffer_pending", "Rows waiting in the write-behind buffer",
+               callback=lambda: db.write_buffer.stats()['pending'])
+registry.gauge("db_wal_size_bytes", "Size of the SQLite WAL file", callback=db.pool.wal_size)
+
+
+async def main():
+    """Инициализация БД из командной строки"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Инициализация и обслуживание БД")
+    parser.add_argument("--rebuild-stats", action="store_true",
+                        help="Пересчитать user_stats по таблице practice_sessions")
+    args = parser.parse_args()
+
+    await db.init_db()
+    if args.rebuild_stats:
+        await db.rebuild_user_stats()
+        print("user_stats rebuilt")
+    await db.close()
+
+
+if __name__ == "__main__":
+    from logger import setup_logging, shutdown_logging
+
+    setup_logging()
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_logging()
\ No newline at end of file
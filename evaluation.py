@@ -1,11 +1,17 @@
 import asyncio
+import json
 import os
-import re
+import queue
 import speech_recognition as sr
-from typing import Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Optional, Tuple
 import logging
-from models import Phrase
-from config import FFMPEG_PATH
+from matcher import tokenize
+from metrics import registry
+from config import (FFMPEG_PATH, AUDIO_SAMPLE_RATE, RECOGNITION_EXECUTOR, RECOGNITION_WORKERS,
+                    RECOGNITION_MAX_CONCURRENT, RECOGNITION_TIMEOUT, RECOGNITION_BACKEND,
+                    RECOGNITION_LANGUAGE, SPHINX_HMM_PATH, SPHINX_LM_PATH, SPHINX_DICT_PATH,
+                    SPHINX_MODEL_LANGUAGE, VOSK_MODEL_PATH)
 
 # Настройка логирования для evaluation модуля
 logger = logging.getLogger(__name__)
@@ -28,7 +34,7 @@ async def convert_ogg_to_wav(ogg_path: str) -> str:
         FFMPEG_PATH,
         '-i', ogg_path,
         '-acodec', 'pcm_s16le',
-        '-ar', '16000',
+        '-ar', str(AUDIO_SAMPLE_RATE),
         '-ac', '1',
         '-y',
         wav_path,
@@ -49,12 +55,240 @@ async def convert_ogg_to_wav(ogg_path: str) -> str:
     return wav_path
 
 
-def recognize_speech_from_file(audio_path: str, language: str = "ru-RU") -> str:
+async def convert_ogg_stream_to_pcm(chunks: AsyncIterator[bytes], sample_rate: int = AUDIO_SAMPLE_RATE) -> bytes:
     """
-    Распознает речь из аудиофайла с помощью Google Web Speech API.
+    Конвертирует поток OGG в сырой PCM (16 бит, моно) без временных файлов:
+    данные подаются в stdin ffmpeg по мере скачивания, результат читается из stdout.
+    Args:
+        chunks: Асинхронный итератор с частями OGG файла
+        sample_rate (int): Частота дискретизации результата
+    Returns:
+        bytes: PCM s16le
+    Raises:
+        Exception: Если конвертация не удалась
+    """
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG_PATH,
+        '-loglevel', 'error',
+        '-i', 'pipe:0',
+        '-f', 's16le',
+        '-acodec', 'pcm_s16le',
+        '-ar', str(sample_rate),
+        '-ac', '1',
+        'pipe:1',
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg завершился раньше времени - причина будет в stderr
+            pass
+        finally:
+            process.stdin.close()
+
+    feeder = asyncio.create_task(feed())
+    try:
+        pcm, stderr = await asyncio.gather(process.stdout.read(), process.stderr.read())
+        await feeder
+        await process.wait()
+    except BaseException:
+        feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    if process.returncode != 0:
+        error_msg = stderr.decode(errors='replace') if stderr else "Unknown error"
+        raise Exception(f"FFmpeg error: {error_msg}")
+    if not pcm:
+        raise Exception("FFmpeg produced no audio")
+
+    return pcm
+
+
+class RecognizerBackend:
+    """
+    Базовый класс движка распознавания речи.
+    Метод recognize() вызывается из воркеров пула и должен быть потокобезопасным.
+    """
+    name = ""
+    # Параметры движка в процессе пула: процесс выполняет одну задачу за раз
+    process_options: Dict[str, object] = {}
+
+    def load(self):
+        """Загружает модель. Вызывается один раз при старте."""
+
+    def recognize(self, audio_data: sr.AudioData, language: Optional[str] = None) -> str:
+        """
+        Распознает речь.
+        Raises:
+            sr.UnknownValueError: Если речь не распознана
+            sr.RequestError: Если движок недоступен
+        """
+        raise NotImplementedError
+
+
+class GoogleRecognizerBackend(RecognizerBackend):
+    """Онлайн-распознавание через Google Web Speech API."""
+    name = "google"
+
+    def __init__(self, language: str = RECOGNITION_LANGUAGE):
+        self.language = language
+
+    def recognize(self, audio_data: sr.AudioData, language: Optional[str] = None) -> str:
+        return sr.Recognizer().recognize_google(audio_data, language=language or self.language)
+
+
+class SphinxRecognizerBackend(RecognizerBackend):
+    """
+    Офлайн-распознавание через pocketsphinx.
+    Декодеры создаются один раз при загрузке (по одному на воркер) и переиспользуются.
+    Модель распознает один язык (SPHINX_MODEL_LANGUAGE): если он не совпадает с языком
+    распознавания, загрузка завершается ошибкой, а не выдает текст на чужом языке.
+    """
+    name = "sphinx"
+    process_options = {'decoders': 1}
+
+    def __init__(self, language: str = RECOGNITION_LANGUAGE, decoders: int = RECOGNITION_WORKERS,
+                 hmm: str = SPHINX_HMM_PATH, lm: str = SPHINX_LM_PATH, dictionary: str = SPHINX_DICT_PATH,
+                 model_language: str = SPHINX_MODEL_LANGUAGE):
+        self.language = language
+        self.model_language = model_language
+        self.decoders = max(1, decoders)
+        self.model_kwargs = {key: value for key, value in
+                             (('hmm', hmm), ('lm', lm), ('dict', dictionary)) if value}
+        self._pool: Optional[queue.Queue] = None
+
+    def supports(self, language: str) -> bool:
+        """Распознает ли модель указанный язык."""
+        return language.replace('_', '-').lower() == self.model_language.replace('_', '-').lower()
+
+    def load(self):
+        if not self.supports(self.language):
+            raise ValueError(
+                f"Pocketsphinx model is for {self.model_language}, but recognition language is {self.language}: "
+                f"set SPHINX_HMM_PATH, SPHINX_LM_PATH, SPHINX_DICT_PATH and SPHINX_MODEL_LANGUAGE "
+                f"for a {self.language} model")
+        from pocketsphinx import Decoder
+
+        pool = queue.Queue()
+        for _ in range(self.decoders):
+            pool.put(Decoder(loglevel="ERROR", **self.model_kwargs))
+        self._pool = pool
+        logger.info(f"Pocketsphinx {self.model_language} model loaded ({self.decoders} decoders)")
+
+    def recognize(self, audio_data: sr.AudioData, language: Optional[str] = None) -> str:
+        if language and not self.supports(language):
+            raise sr.RequestError(f"No pocketsphinx model for {language}")
+        if self._pool is None:
+            self.load()
+        raw = audio_data.get_raw_data(convert_rate=16000, convert_width=2)
+        decoder = self._pool.get()
+        try:
+            decoder.start_utt()
+            decoder.process_raw(raw, full_utt=True)
+            decoder.end_utt()
+            hypothesis = decoder.hyp()
+        finally:
+            self._pool.put(decoder)
+        if hypothesis is None or not hypothesis.hypstr:
+            raise sr.UnknownValueError()
+        return hypothesis.hypstr
+
+
+class VoskRecognizerBackend(RecognizerBackend):
+    """Офлайн-распознавание через Vosk (пакет vosk устанавливается отдельно)."""
+    name = "vosk"
+
+    def __init__(self, model_path: str = VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+
+    def load(self):
+        try:
+            from vosk import Model, SetLogLevel
+        except ImportError as e:
+            raise sr.RequestError("Для движка vosk установите пакет vosk: pip install vosk") from e
+        SetLogLevel(-1)
+        self._model = Model(self.model_path)
+        logger.info(f"Vosk model loaded from {self.model_path}")
+
+    def recognize(self, audio_data: sr.AudioData, language: Optional[str] = None) -> str:
+        from vosk import KaldiRecognizer
+
+        if self._model is None:
+            self.load()
+        recognizer = KaldiRecognizer(self._model, 16000)
+        recognizer.AcceptWaveform(audio_data.get_raw_data(convert_rate=16000, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get('text', '')
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+# Доступные движки распознавания (ключ - значение RECOGNITION_BACKEND)
+RECOGNIZER_BACKENDS = {
+    backend.name: backend
+    for backend in (GoogleRecognizerBackend, SphinxRecognizerBackend, VoskRecognizerBackend)
+}
+
+_recognizer_backend: Optional[RecognizerBackend] = None
+
+
+def init_recognizer_backend(name: str = RECOGNITION_BACKEND, **options) -> RecognizerBackend:
+    """Создает движок распознавания и загружает его модель. Вызывается при старте (и в каждом процессе пула)."""
+    global _recognizer_backend
+    if name not in RECOGNIZER_BACKENDS:
+        raise ValueError(f"Unknown recognition backend: {name}")
+    backend = RECOGNIZER_BACKENDS[name](**options)
+    backend.load()
+    _recognizer_backend = backend
+    return backend
+
+
+def init_recognizer_process(name: str = RECOGNITION_BACKEND) -> RecognizerBackend:
+    """Инициализатор процесса пула: загружает модель с параметрами движка для одного процесса."""
+    if name not in RECOGNIZER_BACKENDS:
+        raise ValueError(f"Unknown recognition backend: {name}")
+    return init_recognizer_backend(name, **RECOGNIZER_BACKENDS[name].process_options)
+
+
+def get_recognizer_backend() -> RecognizerBackend:
+    """Возвращает текущий движок распознавания, при необходимости инициализируя его."""
+    if _recognizer_backend is None:
+        return init_recognizer_backend()
+    return _recognizer_backend
+
+
+def recognize_audio_data(audio_data: sr.AudioData, language: Optional[str] = None) -> str:
+    """
+    Распознает речь из AudioData с помощью выбранного движка распознавания.
+    Returns:
+        str: Распознанный текст или пустая строка в случае ошибки
+    """
+    try:
+        return get_recognizer_backend().recognize(audio_data, language)
+    except sr.UnknownValueError:
+        logger.warning("Speech not recognized")
+        return ""
+    except sr.RequestError as e:
+        logger.error(f"API request error: {e}")
+        return ""
+
+
+def recognize_speech_from_file(audio_path: str, language: Optional[str] = None) -> str:
+    """
+    Распознает речь из аудиофайла с помощью выбранного движка распознавания.
     Args:
         audio_path (str): Путь к аудиофайлу
-        language (str): Язык для распознавания (по умолчанию "ru-RU")
+        language (str): Язык для распознавания (по умолчанию RECOGNITION_LANGUAGE)
     Returns:
         str: Распознанный текст или пустая строка в случае ошибки
     """
@@ -64,15 +298,7 @@ def recognize_speech_from_file(audio_path: str, language: str = "ru-RU") -> str:
         with sr.AudioFile(audio_path) as source:
             audio_data = recognizer.record(source)
 
-        try:
-            text = recognizer.recognize_google(audio_data, language=language)
-            return text
-        except sr.UnknownValueError:
-            logger.warning("Speech not recognized")
-            return ""
-        except sr.RequestError as e:
-            logger.error(f"API request error: {e}")
-            return ""
+        return recognize_audio_data(audio_data, language)
 
     except FileNotFoundError:
         logger.error(f"File not found: {audio_path}")
@@ -82,39 +308,164 @@ def recognize_speech_from_file(audio_path: str, language: str = "ru-RU") -> str:
         return ""
 
 
+def recognize_speech_from_pcm(pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE,
+                              language: Optional[str] = None) -> str:
+    """
+    Распознает речь из сырого PCM (16 бит, моно), не обращаясь к файловой системе.
+    Returns:
+        str: Распознанный текст или пустая строка в случае ошибки
+    """
+    try:
+        return recognize_audio_data(sr.AudioData(pcm, sample_rate, 2), language)
+    except Exception as e:
+        logger.error(f"Error processing audio data: {e}")
+        return ""
+
+
+class RecognitionPool:
+    """
+    Пул воркеров для синхронного распознавания речи вне event loop.
+    Ограничивает число одновременных задач, прерывает ожидание по таймауту
+    и ведет счетчики глубины очереди.
+    """
+
+    def __init__(self, executor_type: str = RECOGNITION_EXECUTOR, workers: int = RECOGNITION_WORKERS,
+                 max_concurrent: int = RECOGNITION_MAX_CONCURRENT, timeout: float = RECOGNITION_TIMEOUT):
+        """Инициализирует пул. Воркеры создаются при первом запуске."""
+        if executor_type not in ("thread", "process"):
+            raise ValueError(f"Unknown recognition executor: {executor_type}")
+        self.executor_type = executor_type
+        self.workers = max(1, workers)
+        self.max_concurrent = max(1, max_concurrent)
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failed = 0
+
+    def start(self):
+        """Создает пул потоков или процессов."""
+        if self._executor is not None:
+            return
+        if self.executor_type == "process":
+            # Каждый процесс загружает модель движка один раз при старте
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_recognizer_process)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recognition")
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        logger.info(f"Recognition pool started: {self.workers} {self.executor_type} workers")
+
+    async def shutdown(self):
+        """Останавливает пул, отменяя задачи, которые еще не начали выполняться."""
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func, *args):
+        """
+        Выполняет func(*args) в пуле.
+        Место в пуле занято, пока задача выполняется в воркере, даже если обработчик
+        перестал ее ждать: иначе после таймаутов число работающих задач превысило бы max_concurrent.
+        Raises:
+            asyncio.TimeoutError: Если задача не завершилась за timeout секунд
+        """
+        self.start()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        except BaseException:
+            self._finished(None)
+            raise
+        future.add_done_callback(self._finished)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            # Воркер продолжит работу в фоне, но обработчик больше его не ждет
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+    def _finished(self, future: Optional[asyncio.Future]):
+        """Освобождает место в пуле, когда задача завершилась в воркере."""
+        self.active -= 1
+        self._semaphore.release()
+
+    async def recognize(self, audio_path: str, language: Optional[str] = None) -> str:
+        """Асинхронно распознает речь из файла; при таймауте возвращает пустую строку."""
+        try:
+            return await self.run(recognize_speech_from_file, audio_path, language)
+        except asyncio.TimeoutError:
+            logger.error(f"Speech recognition timed out after {self.timeout} s")
+            return ""
+
+    async def recognize_pcm(self, pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE,
+                            language: Optional[str] = None) -> str:
+        """Асинхронно распознает речь из PCM в памяти; при таймауте возвращает пустую строку."""
+        try:
+            return await self.run(recognize_speech_from_pcm, pcm, sample_rate, language)
+        except asyncio.TimeoutError:
+            logger.error(f"Speech recognition timed out after {self.timeout} s")
+            return ""
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает счетчики пула."""
+        return {
+            'queued': self.queued,
+            'active': self.active,
+            'completed': self.completed,
+            'timeouts': self.timeouts,
+            'failed': self.failed,
+        }
+
+
+# Глобальный пул распознавания речи
+recognition_pool = RecognitionPool()
+
+registry.gauge("recognition_queue_depth", "Recognition jobs waiting for a worker",
+               callback=lambda: recognition_pool.queued)
+registry.gauge("recognition_active", "Recognition jobs running in workers",
+               callback=lambda: recognition_pool.active)
+
+
 def normalize_text(text: str) -> list:
     """Приводит текст к нижнему регистру и разбивает на слова, удаляя лишние символы."""
-    # Поддержка кириллицы и латиницы
-    text = re.sub(r"[^\w\sа-яА-ЯёЁ]", " ", text.lower())
-    return text.split()
+    return tokenize(text)
 
 
 async def check_answer(db, phrase_id: int, user_answer: str) -> Tuple[bool, str]:
     """
-    Асинхронно проверяет ответ пользователя по ключевым словам из БД.
+    Асинхронно проверяет ответ пользователя по ключевым словам фразы.
+    Ключевые слова скомпилированы в KeywordMatcher при загрузке каталога фраз,
+    поэтому проверка выполняется за один проход по словам ответа.
     Возвращает кортеж (успех, пояснение).
     """
-    phrase_row = await db.get_phrase_by_id(phrase_id)
-    if not phrase_row:
+    phrase = await db.phrases.get(phrase_id)
+    if not phrase:
         return False, "Фраза не найдена"
 
-    phrase = Phrase.from_db_row(phrase_row)
-
     words = normalize_text(user_answer)
 
     # Проверяем на наличие негативных ключевых слов
-    for neg_word in phrase.negative_keywords:
-        if neg_word and neg_word in words:
-            return False, f"Обнаружено негативное слово: '{neg_word}'"
+    negative_found = phrase.negative_matcher.find(words)
+    if negative_found:
+        return False, f"Обнаружено негативное слово: '{negative_found[0]}'"
 
-    # Считаем количество совпадений позитивных ключевых слов
-    positive_count = 0
-    found_keywords = []
-
-    for pos_word in phrase.positive_keywords:
-        if pos_word in words:
-            positive_count += 1
-            found_keywords.append(pos_word)
+    # Считаем количество совпадений позитивных ключевых слов (каждое слово - один раз)
+    found_keywords = phrase.positive_matcher.find(words)
+    positive_count = len(found_keywords)
 
     # Проверяем, достаточно ли ключевых слов найдено
     if positive_count >= phrase.required_count:
@@ -126,26 +477,15 @@ async def check_answer(db, phrase_id: int, user_answer: str) -> Tuple[bool, str]
 async def get_faq_answer(db, user_question: str) -> str:
     """
     Ищет ответ в базе данных FAQ на основе вопроса пользователя.
+    Поиск выполняется по инвертированному индексу ключевых слов (BM25), который
+    строится при старте и перестраивается при изменении таблицы faq.
     Args:
         db: Экземпляр базы данных
         user_question (str): Вопрос от пользователя.
     Returns:
         str: Найденный ответ или сообщение об отсутствии ответа.
     """
-    user_question_lower = user_question.lower()
-    faq_items = await db.get_all_faq()
-
-    best_match = None
-    max_keyword_matches = 0
-
-    for _, question, answer, keywords in faq_items:
-        keyword_list = [k.strip().lower() for k in keywords.split(',')]
-        match_count = sum(1 for keyword in keyword_list if keyword in user_question_lower)
-
-        if match_count > max_keyword_matches:
-            max_keyword_matches = match_count
-            best_match = answer
-
+    best_match = await db.faq_index.answer(user_question)
     return best_match if best_match else "Извините, я не нашел ответа в справке."
 
 
@@ -0,0 +1,140 @@
+import logging
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from catalog import VersionedCache
+from config import FAQ_INDEX_TTL, FAQ_INDEX_CHECK_INTERVAL, FAQ_INDEX_STEMMING, FAQ_INDEX_MIN_SCORE
+from matcher import tokenize
+from metrics import FAQ_LOOKUP_DURATION, FAQ_LOOKUPS
+
+# Настройка логирования для faq_index модуля
+logger = logging.getLogger(__name__)
+
+# Минимальная длина префикса слова вопроса, по которому ищется ключевое слово
+# (ключ "голос" находится по слову "голосовой", как при прежнем поиске подстроки)
+PREFIX_MIN_LENGTH = 4
+PREFIX_WEIGHT = 0.5
+
+
+class TextAnalyzer:
+    """Разбивает текст на термы: слова (со стеммингом, если доступен nltk) и биграммы соседних слов."""
+
+    def __init__(self, stemming: bool = FAQ_INDEX_STEMMING):
+        self._stemmer = None
+        if stemming:
+            try:
+                from nltk.stem.snowball import SnowballStemmer
+                self._stemmer = SnowballStemmer("russian")
+            except ImportError:
+                logger.warning("nltk is not installed, FAQ search works without stemming")
+        self._stems: Dict[str, str] = {}
+
+    def stem(self, word: str) -> str:
+        """Возвращает основу слова (с кэшированием)."""
+        if self._stemmer is None:
+            return word
+        stem = self._stems.get(word)
+        if stem is None:
+            stem = self._stems[word] = self._stemmer.stem(word)
+        return stem
+
+    def words(self, text: str) -> List[str]:
+        """Возвращает основы слов текста."""
+        return [self.stem(word) for word in tokenize(text)]
+
+    @staticmethod
+    def bigrams(words: List[str]) -> List[str]:
+        """Возвращает биграммы соседних слов."""
+        return [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class FAQSearchIndex(VersionedCache):
+    """
+    Инвертированный индекс ключевых слов FAQ с ранжированием BM25.
+    Строится при старте и перестраивается при изменении таблицы faq; поиск
+    затрагивает только списки записей, содержащих термы вопроса.
+    """
+    table = "faq"
+
+    def __init__(self, db, ttl: float = FAQ_INDEX_TTL, check_interval: float = FAQ_INDEX_CHECK_INTERVAL,
+                 analyzer: Optional[TextAnalyzer] = None, min_score: float = FAQ_INDEX_MIN_SCORE,
+                 k1: float = 1.2, b: float = 0.75):
+        super().__init__(db, ttl, check_interval)
+        self.analyzer = analyzer or TextAnalyzer()
+        self.min_score = min_score
+        self.k1 = k1
+        self.b = b
+        self._answers: List[str] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._idf: Dict[str, float] = {}
+        self._length_norms: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def build(self, faq_items: Iterable[Tuple]):
+        """Строит индекс по записям FAQ вида (id, question, answer, keywords)."""
+        answers = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for doc, (_, question, answer, keywords) in enumerate(faq_items):
+            terms = Counter()
+            for keyword in keywords.split(','):
+                words = self.analyzer.words(keyword)
+                terms.update(words)
+                terms.update(self.analyzer.bigrams(words))
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).append((doc, frequency))
+            answers.append(answer)
+            lengths.append(sum(terms.values()))
+
+        total = len(answers)
+        average_length = (sum(lengths) / total) if total else 0.0
+        self._idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+        self._length_norms = [
+            self.k1 * (1 - self.b + self.b * length / average_length) if average_length else self.k1
+            for length in lengths
+        ]
+        self._postings = postings
+        self._answers = answers
+
+    def _query_terms(self, question: str) -> Dict[str, float]:
+        """Термы вопроса с весами: слова, биграммы и префиксы слов, совпадающие с ключами."""
+        words = self.analyzer.words(question)
+        terms = {term: 1.0 for term in words + self.analyzer.bigrams(words)}
+        for word in words:
+            for length in range(PREFIX_MIN_LENGTH, len(word)):
+                prefix = word[:length]
+                if prefix in self._postings and prefix not in terms:
+                    terms[prefix] = PREFIX_WEIGHT
+        return terms
+
+    def search(self, question: str, limit: int = 1) -> List[Tuple[float, int]]:
+        """Возвращает до limit пар (оценка, номер записи) по убыванию оценки."""
+        scores: Dict[int, float] = {}
+        for term, weight in self._query_terms(question).items():
+            docs = self._postings.get(term)
+            if not docs:
+                continue
+            idf = self._idf[term] * weight
+            for doc, frequency in docs:
+                scores[doc] = scores.get(doc, 0.0) + idf * frequency * (self.k1 + 1) / (
+                    frequency + self._length_norms[doc])
+        ranked = sorted(((score, doc) for doc, score in scores.items() if score > self.min_score),
+                        key=lambda item: (-item[0], item[1]))
+        return ranked[:limit]
+
+    async def answer(self, question: str) -> Optional[str]:
+        """Возвращает ответ наиболее подходящей записи FAQ или None."""
+        await self._ensure_fresh()
+        with FAQ_LOOKUP_DURATION.time():
+            ranked = self.search(question)
+        FAQ_LOOKUPS.inc(result="hit" if ranked else "miss")
+        return self._answers[ranked[0][1]] if ranked else None
+
+    async def _load(self):
+        self.build(await self.db.get_all_faq())
+        logger.info(f"FAQ index built: {len(self._answers)} entries, {len(self._postings)} terms")
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from config import FSM_STATE_TTL, FSM_CACHE_SIZE, FSM_PURGE_INTERVAL
+
+# Настройка логирования для fsm_storage модуля
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class FSMRecord:
+    """Состояние и данные FSM одного пользователя."""
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+    @property
+    def is_empty(self) -> bool:
+        """Нет ни состояния, ни данных."""
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в таблице fsm_states общей БД: состояния практики и поддержки
+    переживают перезапуск и доступны нескольким процессам.
+    Записи проходят в БД сразу (write-through), а чтения обслуживаются LRU-кэшем
+    процесса. Состояние, не изменявшееся дольше ttl секунд, считается пустым.
+    """
+
+    def __init__(self, db, ttl: float = FSM_STATE_TTL, cache_size: int = FSM_CACHE_SIZE,
+                 purge_interval: float = FSM_PURGE_INTERVAL, key_builder: Optional[KeyBuilder] = None):
+        """
+        Инициализирует хранилище. Удаление просроченных записей запускается методом start().
+        cache_size=0 отключает кэш - нужно, если запросы одного пользователя
+        могут обрабатываться разными процессами.
+        """
+        self.db = db
+        self.ttl = ttl
+        self.cache_size = max(0, cache_size)
+        self.purge_interval = purge_interval
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self._cache: "OrderedDict[StorageKey, FSMRecord]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Запущено ли периодическое удаление просроченных записей."""
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запускает фоновую задачу удаления просроченных записей."""
+        if self.ttl > 0 and not self.is_running:
+            self._task = asyncio.create_task(self._run(), name="fsm-storage-purger")
+
+    async def close(self):
+        """Останавливает фоновую задачу и очищает кэш."""
+        if self.is_running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._cache.clear()
+
+    def _is_expired(self, record: FSMRecord, now: float) -> bool:
+        """Истек ли срок жизни записи."""
+        return self.ttl > 0 and not record.is_empty and now - record.updated_at > self.ttl
+
+    def _remember(self, key: StorageKey, record: FSMRecord):
+        """Кладет запись в LRU-кэш, вытесняя самые старые."""
+        if not self.cache_size:
+            return
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _get_record(self, key: StorageKey) -> FSMRecord:
+        """Возвращает запись из кэша или из БД (отсутствующая запись тоже кэшируется)."""
+        now = time.time()
+        record = self._cache.get(key)
+        if record is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        else:
+            self.misses += 1
+            row = await self.db.fetch_one(
+                'SELECT state, data, updated_at FROM fsm_states WHERE key = ?',
+                (self.key_builder.build(key),)
+            )
+            record = FSMRecord(row['state'], json.loads(row['data']), row['updated_at']) if row else FSMRecord()
+            self._remember(key, record)
+        if self._is_expired(record, now):
+            record = FSMRecord()
+            self._remember(key, record)
+        return record
+
+    async def _save(self, key: StorageKey, record: FSMRecord):
+        """Записывает запись в БД целиком и обновляет кэш; пустая запись удаляется."""
+        db_key = self.key_builder.build(key)
+        record.updated_at = time.time()
+        if record.is_empty:
+            await self.db.execute_query('DELETE FROM fsm_states WHERE key = ?', (db_key,))
+        else:
+            await self.db.execute_query(
+                '''INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state,
+                    data = excluded.data,
+                    updated_at = excluded.updated_at''',
+                (db_key, record.state, json.dumps(record.data, ensure_ascii=False), record.updated_at)
+            )
+        self._remember(key, record)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get_record(key)
+        state = state.state if isinstance(state, State) else state
+        await self._save(key, FSMRecord(state, dict(record.data)))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get_record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = await self._get_record(key)
+        await self._save(key, FSMRecord(record.state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get_record(key)).data.copy()
+
+    async def purge_expired(self) -> int:
+        """
+        Удаляет из БД и кэша записи, не изменявшиеся дольше ttl секунд.
+        Returns:
+            int: Количество удаленных из БД записей
+        """
+        if self.ttl <= 0:
+            return 0
+        now = time.time()
+        cursor = await self.db.execute_query(
+            'DELETE FROM fsm_states WHERE updated_at < ?', (now - self.ttl,)
+        )
+        for key in [key for key, record in self._cache.items() if self._is_expired(record, now)]:
+            del self._cache[key]
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики кэша состояний."""
+        return {'cached': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+    async def _run(self):
+        """Фоновый цикл удаления просроченных записей."""
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                purged = await self.purge_expired()
+                if purged:
+                    logger.info(f"Purged {purged} expired FSM states")
+            except Exception as e:
+                logger.error(f"Failed to purge expired FSM states: {e}")
@@ -0,0 +1,299 @@
+"""
+Нагрузочный тест обработчиков бота без обращения к Telegram.
+
+Синтетические пользователи проходят сценарий /start -> практика -> голосовые
+ответы -> статистика -> вопрос в поддержку; обновления подаются в dp.feed_update.
+Запросы к Bot API перехватывает FakeSession, ffmpeg и распознавание речи
+заменены заглушками. Используется копия БД во временном каталоге.
+
+Запуск:
+    python loadtest.py [--users N] [--concurrency C] [--answers A] [--recognition-ms MS] [--replay R]
+    python loadtest.py --users N --workers 1 2 4    # масштабирование по числу процессов
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import AsyncGenerator, Dict, List, Optional
+
+# Токен и путь к БД должны быть заданы до импорта модулей бота
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:LOADTEST")
+
+import config  # noqa: E402
+
+# Процессы воркеров (--workers) наследуют окружение и работают с той же копией БД
+_tmp_dir = os.environ.get("LOADTEST_DIR")
+if not _tmp_dir:
+    _tmp_dir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["LOADTEST_DIR"] = _tmp_dir
+    os.environ["LOADTEST_SOURCE_DB"] = config.DB_PATH
+    os.environ["DB_PATH"] = os.path.join(_tmp_dir, "loadtest.db")
+    if os.path.exists(config.DB_PATH):
+        shutil.copy(config.DB_PATH, os.environ["DB_PATH"])
+config.DB_PATH = os.path.join(_tmp_dir, "loadtest.db")
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import GetFile, SendMessage, SendVoice, TelegramMethod  # noqa: E402
+from aiogram.types import Chat, File, Message, Update, User, Voice  # noqa: E402
+
+import main as bot_app  # noqa: E402
+from benchmark import percentile  # noqa: E402
+from database import db  # noqa: E402
+from logger import setup_logging  # noqa: E402
+from transcript_cache import transcript_cache  # noqa: E402
+from admission import voice_admission  # noqa: E402
+from workers import WorkerSupervisor  # noqa: E402
+
+# Действия сценария: текст сообщения или None для голосового ответа
+START = ["/start"]
+PRACTICE = ["🎯 Практика"]
+VOICE = [None]
+FINISH = ["⏹️ Завершить", "📊 Статистика", "❓ Поддержка", "Как начать практику?", "🔙 Назад"]
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API, которая записывает вызовы вместо отправки их в Telegram."""
+
+    def __init__(self, api_latency: float = 0.0):
+        super().__init__()
+        self.api_latency = api_latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def close(self):
+        pass
+
+    def _message(self, chat_id, **fields) -> Message:
+        """Создает ответное сообщение бота."""
+        return Message(
+            message_id=next(self._message_ids),
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=int(chat_id), type="private"),
+            **fields,
+        )
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        if isinstance(method, SendMessage):
+            return self._message(method.chat_id, text=method.text)
+        if isinstance(method, SendVoice):
+            voice = Voice(file_id=f"voice-{next(self._message_ids)}", file_unique_id="voice", duration=3)
+            return self._message(method.chat_id, voice=voice)
+        if isinstance(method, GetFile):
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=f"voice/{method.file_id}.oga")
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[Dict] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        self.calls["stream_content"] += 1
+        # Содержимое зависит от файла: одинаковые голосовые дают одинаковый PCM.
+        # Для VAD это 1 с "речи" (шум при 16 кГц) между секундами тишины
+        silence = bytes(32000)
+        yield silence + random.Random(url).randbytes(32000) + silence
+
+
+class HandlerTimer:
+    """Внутренняя мидлварь сообщений: время работы каждого обработчика."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            name = data["handler"].callback.__name__
+            self.latencies[name].append(time.perf_counter() - started)
+
+
+def install_stubs(answers: List[str], recognition_delay: float):
+    """Подменяет ffmpeg и распознавание речи в модуле бота."""
+
+    async def fake_convert(chunks) -> bytes:
+        return b"".join([chunk async for chunk in chunks])
+
+    async def fake_recognize_pcm(pcm: bytes) -> str:
+        if recognition_delay:
+            await asyncio.sleep(recognition_delay)
+        return random.choice(answers)
+
+    bot_app.convert_ogg_stream_to_pcm = fake_convert
+    bot_app.recognition_pool.recognize_pcm = fake_recognize_pcm
+
+
+async def install_fakes(recognition_ms: float, api_ms: float, app: bot_app.BotApp) -> FakeSession:
+    """Подключает FakeSession и заглушки распознавания, отвечающие ключевыми словами фраз каталога."""
+    session = FakeSession(api_latency=api_ms / 1000)
+    app.bot.session = session
+    keywords = [k for phrase in await db.phrases.all() for k in phrase.positive_keywords if k]
+    transcripts = [' '.join(random.sample(keywords, min(3, len(keywords)))) for _ in range(50)] or ["hello"]
+    install_stubs(transcripts, recognition_ms / 1000)
+    return session
+
+
+def scenario(answers: int) -> List[Optional[str]]:
+    """Сообщения одного пользователя: текст или None для голосового ответа."""
+    return START + PRACTICE + VOICE * answers + ["🔁 Новая фраза"] + VOICE + FINISH
+
+
+def make_update(update_id: int, user_id: int, text: Optional[str], voice_id: Optional[str] = None) -> Update:
+    """Создает обновление с текстовым или голосовым сообщением пользователя."""
+    voice_id = voice_id or f"answer-{update_id}"
+    content = {"text": text} if text is not None else {
+        "voice": Voice(file_id=voice_id, file_unique_id=voice_id, duration=3)
+    }
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="Load", username=f"load{user_id}"),
+            **content,
+        ),
+    )
+
+
+async def run(users: int, concurrency: int, answers: int, recognition_ms: float, api_ms: float,
+              replay: float = 0.0):
+    """Прогоняет сценарий для users пользователей и выводит задержки обработчиков."""
+    app = bot_app.create_app()
+    timer = HandlerTimer()
+    app.dp.message.middleware(timer)
+
+    await db.init_db()
+    await db.phrases.reload()
+    await db.faq_index.reload()
+    session = await install_fakes(recognition_ms, api_ms, app)
+
+    steps = scenario(answers)
+    update_ids = itertools.count(1)
+    update_latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    sent_voices: List[str] = []
+
+    async def simulate(user_id: int):
+        async with semaphore:
+            for text in steps:
+                update_id = next(update_ids)
+                voice_id = None
+                if text is None:
+                    # Доля replay голосовых ответов - повторная отправка уже присланного голосового
+                    if sent_voices and random.random() < replay:
+                        voice_id = random.choice(sent_voices)
+                    else:
+                        voice_id = f"answer-{update_id}"
+                        sent_voices.append(voice_id)
+                started = time.perf_counter()
+                await app.dp.feed_update(app.bot, make_update(update_id, user_id, text, voice_id))
+                update_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate(1_000_000 + i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+
+    total = len(update_latencies)
+    print(f"{users} users, {total} updates in {elapsed:.3f} s: {total / elapsed:.1f} updates/s")
+    print(f"{'handler':<28} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = sorted(timer.latencies.items()) + [("(whole update)", update_latencies)]
+    for name, latencies in rows:
+        latencies = sorted(latencies)
+        print(f"{name:<28} {len(latencies):>7} {percentile(latencies, 0.5) * 1e3:9.2f}"
+              f" {percentile(latencies, 0.95) * 1e3:9.2f} {percentile(latencies, 0.99) * 1e3:9.2f}")
+    print(f"Bot API calls: {dict(session.calls)}")
+    print(f"write buffer: {db.write_buffer.stats()}")
+    print(f"transcript cache: {transcript_cache.stats()}")
+    print(f"voice admission: {voice_admission.stats()}")
+
+    await app.fsm_storage.close()
+    await db.close()
+
+
+async def run_workers(users: int, workers: int, answers: int, recognition_ms: float, api_ms: float) -> float:
+    """
+    Прогоняет сценарий через WorkerSupervisor с workers процессами.
+    Обновления всех пользователей подаются сразу; время - до завершения обработки во всех воркерах.
+    Returns:
+        float: Обработано обновлений в секунду
+    """
+    # Каждый прогон начинается с исходной копии БД
+    if os.path.exists(os.environ["LOADTEST_SOURCE_DB"]):
+        shutil.copy(os.environ["LOADTEST_SOURCE_DB"], config.DB_PATH)
+    supervisor = WorkerSupervisor(bot_app.create_app, workers,
+                                  prepare=functools.partial(install_fakes, recognition_ms, api_ms),
+                                  log_options={"level": logging.getLevelName(logging.getLogger().level),
+                                               "log_file": ""})
+    updates = []
+    update_ids = itertools.count(1)
+    # Порядок сообщений пользователя сохраняется: воркер обрабатывает их по очереди
+    for text in scenario(answers):
+        for i in range(users):
+            update = make_update(next(update_ids), 1_000_000 + i, text)
+            updates.append(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+
+    supervisor.start()
+    try:
+        await supervisor.wait_ready()
+        started = time.perf_counter()
+        for update in updates:
+            await supervisor.dispatch(update)
+        # Остановка дожидается, пока воркеры обработают свои очереди
+        await supervisor.stop()
+        elapsed = time.perf_counter() - started
+    finally:
+        await supervisor.stop()
+    print(f"{workers} workers: {len(updates)} updates in {elapsed:.3f} s: {len(updates) / elapsed:.1f} updates/s")
+    return len(updates) / elapsed
+
+
+async def run_scaling(users: int, worker_counts: List[int], answers: int, recognition_ms: float, api_ms: float):
+    """Сравнивает пропускную способность при разном числе процессов-воркеров."""
+    results = {}
+    for workers in worker_counts:
+        results[workers] = await run_workers(users, workers, answers, recognition_ms, api_ms)
+    baseline = results[worker_counts[0]]
+    print(f"{'workers':>8} {'updates/s':>10} {'speedup':>8}")
+    for workers, rate in results.items():
+        print(f"{workers:>8} {rate:10.1f} {rate / baseline:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="Одновременно активных пользователей")
+    parser.add_argument("--answers", type=int, default=3, help="Голосовых ответов на первую фразу")
+    parser.add_argument("--recognition-ms", type=float, default=0.0, help="Имитация задержки распознавания")
+    parser.add_argument("--api-ms", type=float, default=0.0, help="Имитация задержки Bot API")
+    parser.add_argument("--replay", type=float, default=0.0, help="Доля повторно присланных голосовых (0..1)")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="Прогнать через супервизор с указанным числом процессов (например: 1 2 4)")
+    parser.add_argument("--verbose", action="store_true", help="Не отключать INFO-логи бота")
+    args = parser.parse_args()
+    # Логи только в консоль, чтобы не засорять файл журнала бота
+    setup_logging(level="INFO" if args.verbose else "WARNING", log_file="")
+    # Пути к аудио фраз в БД заданы относительно каталога проекта
+    os.chdir(config.BASE_DIR)
+    try:
+        if args.workers:
+            asyncio.run(run_scaling(args.users, args.workers, args.answers, args.recognition_ms, args.api_ms))
+        else:
+            asyncio.run(run(args.users, max(1, args.concurrency), args.answers, args.recognition_ms,
+                            args.api_ms, args.replay))
+    finally:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,129 @@
+import atexit
+import copy
+import json
 import logging
-from datetime import datetime
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f"bot_{datetime.now().strftime('%Y%m%d')}.log"),
-        logging.StreamHandler()
-    ]
-)
+import logging.handlers
+import os
+import queue
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+from config import (LOG_LEVEL, LOG_FILE, LOG_ROTATION, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_FORMAT,
+                    LOG_QUEUE_SIZE)
+from metrics import registry
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
 logger = logging.getLogger(__name__)
 
+_exception_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну строку JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler для ограниченной очереди: при переполнении запись отбрасывается, а не блокирует поток."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Подставляет аргументы в сообщение и сохраняет текст исключения отдельно (для JSON)."""
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+registry.gauge("log_records_dropped", "Log records dropped because the logging queue was full",
+               callback=lambda: _queue_handler.dropped if _queue_handler else 0)
+
+
+def create_handlers(log_file: str = LOG_FILE, rotation: str = LOG_ROTATION,
+                    log_format: str = LOG_FORMAT) -> List[logging.Handler]:
+    """Создает обработчики, выполняющие запись: консоль и файл с ротацией по времени или размеру."""
+    formatter = JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        if rotation == "size":
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'))
+        else:
+            handlers.append(logging.handlers.TimedRotatingFileHandler(
+                log_file, when='midnight', backupCount=LOG_BACKUP_COUNT, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging(level: str = LOG_LEVEL, **options) -> DroppingQueueHandler:
+    """
+    Настраивает логирование процесса: корневой логгер только ставит записи в очередь,
+    а запись в консоль и файл выполняет поток QueueListener. Повторный вызов перенастраивает логирование.
+    Returns:
+        DroppingQueueHandler: Обработчик очереди (счетчик отброшенных записей - dropped)
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+    queue_handler = _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(
+        queue_handler.queue, *create_handlers(**options), respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    return queue_handler
+
+
+def shutdown_logging():
+    """Останавливает поток записи, дописав оставшиеся в очереди записи."""
+    global _listener
+    if _listener is None:
+        return
+    while True:
+        try:
+            _listener.stop()
+            break
+        except queue.Full:
+            # Маркер остановки не помещается в заполненную очередь - ждем, пока поток ее разберет
+            time.sleep(0.01)
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(shutdown_logging)
+
 # Функции логирования будут принимать экземпляр db как параметр
 async def log_message(db, user_id: int, session_id: int, message_type: str, content: str):
     """Логирование сообщения в БД"""
@@ -1,30 +1,42 @@
 import os
 import asyncio
+import wave
 from tempfile import NamedTemporaryFile
-from aiogram import Bot, Dispatcher, F
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher, F, Router
 from aiogram.filters import Command
-from aiogram.types import FSInputFile
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from database import db
-from evaluation import check_answer, recognize_speech_from_file, handle_user_query, convert_ogg_to_wav
-from logger import log_message, log_error, log_practice_session, logger
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_OPERATOR_ID
-from models import Phrase
+from evaluation import (check_answer, recognition_pool, handle_user_query, convert_ogg_to_wav,
+                        convert_ogg_stream_to_pcm, init_recognizer_backend)
+from logger import log_message, log_error, log_practice_session, logger, setup_logging
+from config import (TELEGRAM_BOT_TOKEN, TELEGRAM_OPERATOR_ID, AUDIO_PIPELINE, PHRASE_AUDIO_WARMUP,
+                    PHRASE_AUDIO_WARMUP_CHAT_ID, BOT_MODE, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH,
+                    WEBHOOK_SECRET, WEBHOOK_BASE_URL, FSM_STORAGE, MAINTENANCE_ENABLED, METRICS_PORT,
+                    BOT_WORKERS, VAD_ENABLED)
+from media_cache import phrase_audio_cache
+from fsm_storage import SQLiteStorage
+from transcript_cache import transcript_cache, file_key, content_key
+from maintenance import DialogHistoryMaintenance
+from admission import voice_admission, AdmissionRejected
+from vad import trim_silence
+from metrics import (registry, handler_timing_middleware, start_metrics_server, VOICE_STAGE_DURATION,
+                     VOICE_ANSWERS)
 
 # Получение токена из переменных окружения
 BOT_TOKEN = TELEGRAM_BOT_TOKEN
 OPERATOR_ID = TELEGRAM_OPERATOR_ID
 
-if not BOT_TOKEN:
-    raise ValueError("Не задан TELEGRAM_BOT_TOKEN")
-
-# Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher()
+# Обработчики регистрируются в роутере; Bot и Dispatcher создает create_app()
+router = Router()
 
 
 # Состояния FSM
@@ -37,6 +49,13 @@ class SupportState(StatesGroup):
     waiting_question = State()
 
 
+# Ответы при отказе в обработке голосового сообщения
+BUSY_REPLIES = {
+    AdmissionRejected.RATE_LIMITED: "⏳ Слишком много голосовых сообщений подряд. "
+                                    "Подождите несколько секунд и отправьте ответ еще раз.",
+    AdmissionRejected.OVERLOADED: "⏳ Сейчас бот перегружен. Попробуйте отправить ответ еще раз через минуту.",
+}
+
 # Клавиатуры
 main_keyboard = ReplyKeyboardMarkup(
     keyboard=[
@@ -62,13 +81,11 @@ support_keyboard = ReplyKeyboardMarkup(
 )
 
 # Мидлварь для логирования пользовательской активности
-@dp.update.middleware()
 async def user_activity_middleware(handler, event, data):
     try:
         if event.message:
             user = event.message.from_user
-            await db.add_user(user.id, user.username, user.first_name, user.last_name)
-            await db.update_user_activity(user.id)
+            await db.users.touch(user.id, user.username, user.first_name, user.last_name)
         return await handler(event, data)
     except Exception as e:
         await log_error(db, "MiddlewareError", f"Error in user activity middleware: {e}")
@@ -76,7 +93,7 @@ async def user_activity_middleware(handler, event, data):
 
 
 # Обработчики команд
-@dp.message(Command("start"))
+@router.message(Command("start"))
 async def cmd_start(message: Message):
     """Обработчик команды /start - приветственное сообщение"""
     try:
@@ -93,7 +110,7 @@ async def cmd_start(message: Message):
         await log_error(db, "StartError", f"Error in start command: {e}", user_id=message.from_user.id)
 
 
-@dp.message(Command("help"))
+@router.message(Command("help"))
 async def cmd_help(message: Message):
     """Обработчик команды /help - справка по командам"""
     try:
@@ -111,14 +128,14 @@ async def cmd_help(message: Message):
         await log_error(db, "HelpError", f"Error in help command: {e}", user_id=message.from_user.id)
 
 
-@dp.message(F.text == "ℹ️ Помощь")
+@router.message(F.text == "ℹ️ Помощь")
 async def help_button(message: Message):
     """Обработчик кнопки помощи"""
     await cmd_help(message)
 
 
-@dp.message(Command("practice"))
-@dp.message(F.text == "🎯 Практика")
+@router.message(Command("practice"))
+@router.message(F.text == "🎯 Практика")
 async def cmd_practice(message: Message, state: FSMContext):
     """Обработчик начала практики"""
     try:
@@ -136,28 +153,35 @@ async def cmd_practice(message: Message, state: FSMContext):
 async def send_random_phrase(message: Message, state: FSMContext):
     """Отправляет случайную фразу для практики"""
     try:
-        phrases = await db.get_all_phrases()
-        if not phrases:
+        phrase = await db.phrases.random()
+        if not phrase:
             await message.answer("Извините, фразы для практики временно недоступны")
             await state.clear()
             return
 
-        import random
-        phrase_row = random.choice(phrases)
-        phrase = Phrase.from_db_row(phrase_row)
-
         await state.update_data(current_phrase_id=phrase.id, current_phrase_text=phrase.text)
 
-        audio_file = FSInputFile(
-            path=phrase.audio_path,
-            filename="audio.wav"
-        )
-
-        await message.answer_voice(
-            voice=audio_file,
-            caption=f"🎧 Прослушайте фразу и дайте голосовой ответ", #\n\n<code>{phrase.text}</code>",
-            reply_markup=practice_keyboard
-        )
+        voice = await phrase_audio_cache.get_voice(phrase)
+        try:
+            sent = await message.answer_voice(
+                voice=voice,
+                caption=f"🎧 Прослушайте фразу и дайте голосовой ответ", #\n\n<code>{phrase.text}</code>",
+                reply_markup=practice_keyboard
+            )
+        except TelegramBadRequest:
+            if not isinstance(voice, str):
+                raise
+            # Сохраненный file_id больше не действителен - загружаем файл заново
+            await phrase_audio_cache.forget(phrase.id)
+            voice = await phrase_audio_cache.get_voice(phrase)
+            sent = await message.answer_voice(
+                voice=voice,
+                caption=f"🎧 Прослушайте фразу и дайте голосовой ответ",
+                reply_markup=practice_keyboard
+            )
+
+        if not isinstance(voice, str):
+            await phrase_audio_cache.remember(phrase, sent)
 
         await state.set_state(PracticeState.waiting_for_response)
         await log_message(db, message.from_user.id, (await state.get_data()).get('session_id'),
@@ -167,13 +191,13 @@ async def send_random_phrase(message: Message, state: FSMContext):
         await message.answer("Произошла ошибка при отправке фразы")
 
 
-@dp.message(F.text == "🔁 Новая фраза")
+@router.message(F.text == "🔁 Новая фраза")
 async def new_phrase(message: Message, state: FSMContext):
     """Обработчик кнопки запроса новой фразы"""
     await send_random_phrase(message, state)
 
 
-@dp.message(F.text == "⏹️ Завершить")
+@router.message(F.text == "⏹️ Завершить")
 async def stop_practice(message: Message, state: FSMContext):
     """Обработчик завершения практики"""
     try:
@@ -200,18 +224,105 @@ async def stop_practice(message: Message, state: FSMContext):
         await message.answer("Произошла ошибка при завершении практики")
 
 
-@dp.message(PracticeState.waiting_for_response, F.voice)
+async def stream_telegram_file(bot: Bot, file_path: str) -> AsyncIterator[bytes]:
+    """Отдает содержимое файла Telegram по частям по мере скачивания, без записи на диск"""
+    if bot.session.api.is_local:
+        downloaded_file = await bot.download_file(file_path)
+        yield downloaded_file.read()
+        return
+
+    url = bot.session.api.file_url(bot.token, file_path)
+    async for chunk in bot.session.stream_content(url=url, raise_for_status=True):
+        yield chunk
+
+
+async def recognize_with_cache(audio_key: str, file_unique_id: str,
+                               recognize: Callable[[], Awaitable[str]]) -> str:
+    """Берет результат распознавания из кэша по хэшу аудио или распознает и сохраняет его под обоими ключами"""
+    recognized_text = await transcript_cache.get(audio_key)
+    if recognized_text is None:
+        with VOICE_STAGE_DURATION.time(stage="recognize"):
+            recognized_text = await recognize()
+    await transcript_cache.put([file_key(file_unique_id), audio_key], recognized_text)
+    return recognized_text
+
+
+async def recognize_pcm(pcm: bytes, file_unique_id: str) -> str:
+    """
+    Отрезает тишину и распознает PCM (с кэшем по хэшу обрезанного звука).
+    Запись без речи в распознавание не передается.
+    """
+    if VAD_ENABLED:
+        with VOICE_STAGE_DURATION.time(stage="vad"):
+            vad_result = trim_silence(pcm)
+        if not vad_result.has_speech:
+            return ""
+        pcm = vad_result.pcm
+    return await recognize_with_cache(content_key(pcm), file_unique_id,
+                                      lambda: recognition_pool.recognize_pcm(pcm))
+
+
+async def recognize_voice_via_files(bot: Bot, file_path: str, file_unique_id: str) -> str:
+    """Распознает голосовое сообщение через временные OGG и WAV файлы (запасной путь)"""
+    with VOICE_STAGE_DURATION.time(stage="download"):
+        downloaded_file = await bot.download_file(file_path)
+
+        with NamedTemporaryFile(delete=False, suffix='.ogg') as tmp_ogg:
+            tmp_ogg.write(downloaded_file.read())
+            ogg_path = tmp_ogg.name
+
+    wav_path = None
+    try:
+        with VOICE_STAGE_DURATION.time(stage="convert"):
+            wav_path = await convert_ogg_to_wav(ogg_path)
+        # WAV содержит тот же PCM, что и потоковый путь (16 бит, моно, AUDIO_SAMPLE_RATE)
+        with wave.open(wav_path, 'rb') as wav_file:
+            pcm = wav_file.readframes(wav_file.getnframes())
+        return await recognize_pcm(pcm, file_unique_id)
+    finally:
+        # Удаляем временные файлы
+        if os.path.exists(ogg_path):
+            os.unlink(ogg_path)
+        if wav_path and os.path.exists(wav_path):
+            os.unlink(wav_path)
+
+
+async def recognize_voice(bot: Bot, file_path: str, file_unique_id: str) -> str:
+    """
+    Распознает голосовое сообщение: OGG передается в ffmpeg потоком, PCM остается в памяти.
+    При ошибке потокового пути используется путь через временные файлы.
+    Одинаковый звук (повторная отправка с другим file_unique_id) берется из кэша по хэшу PCM.
+    """
+    if AUDIO_PIPELINE == "stream":
+        try:
+            # Скачивание и конвертация идут одновременно и замеряются вместе
+            with VOICE_STAGE_DURATION.time(stage="download_convert"):
+                pcm = await convert_ogg_stream_to_pcm(stream_telegram_file(bot, file_path))
+        except Exception as e:
+            logger.warning(f"Streaming audio pipeline failed, falling back to temp files: {e}")
+        else:
+            return await recognize_pcm(pcm, file_unique_id)
+
+    return await recognize_voice_via_files(bot, file_path, file_unique_id)
+
+
+@router.message(PracticeState.waiting_for_response, F.voice)
 async def handle_voice_response(message: Message, state: FSMContext):
     """Обработчик голосовых сообщений с ответами пользователя"""
     voice = message.voice
-    file_info = await bot.get_file(voice.file_id)
-    downloaded_file = await bot.download_file(file_info.file_path)
-
-    with NamedTemporaryFile(delete=False, suffix='.ogg') as tmp_ogg:
-        tmp_ogg.write(downloaded_file.read())
-        ogg_path = tmp_ogg.name
+    # Пересланное или повторно доставленное сообщение не скачивается и не распознается заново
+    cached_text = await transcript_cache.get(file_key(voice.file_unique_id))
+    admitted = False
+    if cached_text is None:
+        # При перегрузке ответ отклоняется сразу, не дожидаясь ffmpeg и распознавания
+        try:
+            await voice_admission.acquire(message.from_user.id)
+            admitted = True
+        except AdmissionRejected as e:
+            VOICE_ANSWERS.inc(result="rejected")
+            await message.answer(BUSY_REPLIES.get(e.reason, BUSY_REPLIES[AdmissionRejected.OVERLOADED]))
+            return
 
-    wav_path = None
     recognized_text = ""
     try:
         data = await state.get_data()
@@ -221,14 +332,18 @@ async def handle_voice_response(message: Message, state: FSMContext):
         await log_message(db, message.from_user.id, session_id, "incoming", "Голосовое сообщение")
 
         try:
-            wav_path = await convert_ogg_to_wav(ogg_path)
+            if cached_text is not None:
+                recognized_text = cached_text
+            else:
+                with VOICE_STAGE_DURATION.time(stage="get_file"):
+                    file_info = await message.bot.get_file(voice.file_id)
+                recognized_text = await recognize_voice(message.bot, file_info.file_path, voice.file_unique_id)
         except Exception as e:
+            VOICE_ANSWERS.inc(result="error")
             await message.answer("Ошибка конвертации аудио. Попробуйте еще раз.")
             await log_error(db, "AudioConversionError", f"Error converting audio: {e}", user_id=message.from_user.id)
             return
 
-        recognized_text = recognize_speech_from_file(wav_path)
-
         # Записываем распознанный текст в историю диалогов
         if recognized_text:
             await log_message(db, message.from_user.id, session_id, "incoming", f"Распознанный текст: {recognized_text}")
@@ -236,20 +351,24 @@ async def handle_voice_response(message: Message, state: FSMContext):
             await log_message(db, message.from_user.id, session_id, "incoming", "Речь не распознана")
 
         if not recognized_text:
+            VOICE_ANSWERS.inc(result="unrecognized")
             await message.answer("Не удалось распознать речь. Попробуйте еще раз.")
             return
 
         phrase_id = data.get('current_phrase_id')
         phrase_text = data.get('current_phrase_text')
 
-        success, explanation = await check_answer(db, phrase_id, recognized_text)
+        with VOICE_STAGE_DURATION.time(stage="check_answer"):
+            success, explanation = await check_answer(db, phrase_id, recognized_text)
+        VOICE_ANSWERS.inc(result="correct" if success else "incorrect")
 
         phrases_practiced = data.get('phrases_practiced', 0) + 1
         correct_answers = data.get('correct_answers', 0)
         if success:
             correct_answers += 1
 
-        await state.update_data(phrases_practiced=phrases_practiced, correct_answers=correct_answers)
+        with VOICE_STAGE_DURATION.time(stage="state_update"):
+            await state.update_data(phrases_practiced=phrases_practiced, correct_answers=correct_answers)
 
         if success:
             await message.answer(f"✅ Отлично! \n\nВопрос: {phrase_text} \n\nВаш ответ: <i>{recognized_text}</i>\n\n{explanation}")
@@ -266,14 +385,11 @@ async def handle_voice_response(message: Message, state: FSMContext):
         await log_error(db, "VoiceProcessingError", f"Error processing voice: {e}", user_id=message.from_user.id)
         await message.answer("Произошла ошибка при обработке аудио")
     finally:
-        # Удаляем временные файлы
-        if os.path.exists(ogg_path):
-            os.unlink(ogg_path)
-        if wav_path and os.path.exists(wav_path):
-            os.unlink(wav_path)
+        if admitted:
+            voice_admission.release()
 
 
-@dp.message(PracticeState.waiting_for_response, F.text)
+@router.message(PracticeState.waiting_for_response, F.text)
 async def handle_text_in_voice_mode(message: Message, state: FSMContext):
     """Обработчик текстовых сообщений в режиме ожидания голосового ответа"""
     await message.answer("Пожалуйста, отправьте голосовое сообщение для ответа на фразу. "
@@ -281,8 +397,8 @@ async def handle_text_in_voice_mode(message: Message, state: FSMContext):
 
 
 # Обработчики поддержки и статистики
-@dp.message(Command("support"))
-@dp.message(F.text == "❓ Поддержка")
+@router.message(Command("support"))
+@router.message(F.text == "❓ Поддержка")
 async def cmd_support(message: Message, state: FSMContext):
     """Обработчик команды поддержки"""
     await state.set_state(SupportState.waiting_question)
@@ -292,7 +408,7 @@ async def cmd_support(message: Message, state: FSMContext):
     )
 
 
-@dp.message(F.text == "❓ Частые вопросы")
+@router.message(F.text == "❓ Частые вопросы")
 async def show_faq(message: Message):
     """Показывает частые вопросы"""
     faq_items = await db.get_all_faq()
@@ -307,7 +423,7 @@ async def show_faq(message: Message):
     await message.answer(response)
 
 
-@dp.message(F.text == "👨‍💻 Оператор")
+@router.message(F.text == "👨‍💻 Оператор")
 async def request_operator(message: Message, state: FSMContext):
     """Запрос связи с оператором"""
     if OPERATOR_ID:
@@ -318,7 +434,7 @@ async def request_operator(message: Message, state: FSMContext):
                                 f"{message.from_user.last_name or ''}\n\n"
                                 f"Последнее сообщение: {message.text}")
 
-            await bot.send_message(OPERATOR_ID, operator_message)
+            await message.bot.send_message(OPERATOR_ID, operator_message)
             await message.answer("✅ Ваш запрос передан оператору. Ожидайте ответа.")
             await log_message(db, message.from_user.id, None, "outgoing",
                               "Запрос передан оператору")
@@ -334,14 +450,14 @@ async def request_operator(message: Message, state: FSMContext):
     await message.answer("Чем еще могу помочь?", reply_markup=main_keyboard)
 
 
-@dp.message(SupportState.waiting_question, F.text == "🔙 Назад")
+@router.message(SupportState.waiting_question, F.text == "🔙 Назад")
 async def support_back(message: Message, state: FSMContext):
     """Обработчик кнопки назад в режиме поддержки"""
     await state.clear()
     await message.answer("Главное меню", reply_markup=main_keyboard)
 
 
-@dp.message(SupportState.waiting_question)
+@router.message(SupportState.waiting_question)
 async def handle_support_question(message: Message, state: FSMContext):
     """Обработчик вопросов в поддержку"""
     if not message.text:
@@ -359,8 +475,8 @@ async def handle_support_question(message: Message, state: FSMContext):
         await message.answer("Чем еще могу помочь?", reply_markup=main_keyboard)
 
 
-@dp.message(Command("stats"))
-@dp.message(F.text == "📊 Статистика")
+@router.message(Command("stats"))
+@router.message(F.text == "📊 Статистика")
 async def show_stats(message: Message):
     """Показывает статистику пользователя"""
     try:
@@ -379,7 +495,7 @@ async def show_stats(message: Message):
         await message.answer("Произошла ошибка при получении статистики")
 
 
-@dp.message(F.text == "🔙 Назад")
+@router.message(F.text == "🔙 Назад")
 async def back_to_main(message: Message, state: FSMContext):
     """Возврат в главное меню"""
     await state.clear()
@@ -387,25 +503,143 @@ async def back_to_main(message: Message, state: FSMContext):
 
 
 # Обработчик любых других сообщений
-@dp.message()
+@router.message()
 async def handle_other_messages(message: Message):
     """Обработчик прочих сообщений"""
     await message.answer("Используйте кнопки меню для навигации", reply_markup=main_keyboard)
 
 
 # Запуск бота
+async def health(request: web.Request) -> web.Response:
+    """Проверка готовности экземпляра для балансировщика нагрузки."""
+    return web.Response(text="ok")
+
+
+class BotApp:
+    """
+    Экземпляр бота в процессе: Bot, Dispatcher с обработчиками router, хранилище FSM
+    и фоновые задачи. Создается фабрикой create_app() - при запуске main.py
+    или в каждом процессе-воркере (workers.py).
+    """
+
+    def __init__(self, token: str = BOT_TOKEN):
+        if not token:
+            raise ValueError("Не задан TELEGRAM_BOT_TOKEN")
+        self.bot = Bot(token=token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        # Состояния FSM хранятся в БД, чтобы сессии практики переживали перезапуск
+        self.fsm_storage = SQLiteStorage(db) if FSM_STORAGE == "sqlite" else MemoryStorage()
+        self.dp = Dispatcher(storage=self.fsm_storage)
+        self.dp.update.middleware(user_activity_middleware)
+        if registry.enabled:
+            self.dp.message.middleware(handler_timing_middleware)
+        self.dp.include_router(router)
+        self.maintenance_job = DialogHistoryMaintenance(db)
+
+    def create_webhook_app(self) -> web.Application:
+        """Создает приложение aiohttp, принимающее обновления Telegram по WEBHOOK_PATH."""
+        app = web.Application()
+        SimpleRequestHandler(
+            dispatcher=self.dp,
+            bot=self.bot,
+            secret_token=WEBHOOK_SECRET or None,
+        ).register(app, path=WEBHOOK_PATH)
+        app.router.add_get("/health", health)
+        setup_application(app, self.dp, bot=self.bot)
+        return app
+
+    async def run_webhook(self):
+        """Запускает HTTP-сервер вебхука и работает до остановки процесса."""
+        if WEBHOOK_BASE_URL:
+            # Вебхук не удаляется при остановке: за балансировщиком работают другие экземпляры
+            await self.bot.set_webhook(
+                url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+        runner = web.AppRunner(self.create_webhook_app())
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+            logger.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def start_services(self, primary: bool = True, metrics_port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+        """
+        Готовит БД, каталоги, распознавание и фоновые задачи.
+        Args:
+            primary (bool): Выполнять задачи, общие для всей БД (очистка FSM, обслуживание, прогрев аудио).
+                В режиме нескольких процессов - только в первом воркере
+            metrics_port (int): Порт эндпоинта /metrics, 0 - не запускать
+        Returns:
+            Optional[web.AppRunner]: Сервер метрик для передачи в stop_services()
+        """
+        await db.init_db()
+        await db.phrases.reload()
+        await db.faq_index.reload()
+        init_recognizer_backend()
+        recognition_pool.start()
+        metrics_runner = await start_metrics_server(port=metrics_port)
+        if primary:
+            if isinstance(self.fsm_storage, SQLiteStorage):
+                self.fsm_storage.start()
+            if MAINTENANCE_ENABLED:
+                self.maintenance_job.start()
+            if PHRASE_AUDIO_WARMUP and PHRASE_AUDIO_WARMUP_CHAT_ID:
+                await phrase_audio_cache.warm_up(self.bot, PHRASE_AUDIO_WARMUP_CHAT_ID, await db.phrases.all())
+        return metrics_runner
+
+    async def stop_services(self, metrics_runner: Optional[web.AppRunner] = None):
+        """Останавливает фоновые задачи и закрывает соединения с БД и Bot API."""
+        await recognition_pool.shutdown()
+        await self.maintenance_job.stop()
+        await self.fsm_storage.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        # Закрытие пула соединений с БД
+        await db.close()
+        await self.bot.session.close()
+
+
+# Экземпляр бота процесса: router подключается только к одному Dispatcher,
+# а БД и пул распознавания - глобальные объекты процесса
+_app: Optional[BotApp] = None
+
+
+def create_app() -> BotApp:
+    """
+    Фабрика экземпляра бота. Воркеры получают ее от супервизора и вызывают в своем процессе,
+    поэтому модуль main не импортируется в воркере повторно. Повторный вызов в том же
+    процессе возвращает уже созданный экземпляр.
+    """
+    global _app
+    if _app is None:
+        _app = BotApp()
+    return _app
+
+
 async def main():
     """Основная функция запуска бота"""
+    app = create_app()
+    metrics_runner = None
     try:
-        await db.init_db()
-        await dp.start_polling(bot)
+        metrics_runner = await app.start_services()
+        if BOT_MODE == "webhook":
+            await app.run_webhook()
+        else:
+            await app.dp.start_polling(app.bot)
     except Exception as e:
         logger.error(f"Error in main: {e}")
     finally:
-        # Закрытие соединения с БД
-        # В текущей реализации нет метода close, но можно добавить при необходимости
-        pass
+        await app.stop_services(metrics_runner)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    setup_logging()
+    if BOT_WORKERS > 1:
+        # Обновления принимает супервизор и распределяет их по процессам-воркерам
+        from workers import run_supervisor
+        asyncio.run(run_supervisor(create_app))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,212 @@
+"""
+Обслуживание истории диалогов.
+
+Строки dialog_history старше DIALOG_RETENTION_DAYS дней сворачиваются в сводки
+dialog_daily_summary (количество сообщений пользователя по дням и типам),
+дописываются в сжатый архив ARCHIVE_DIR/dialog_history-<время>.jsonl.gz и
+удаляются небольшими транзакциями с паузами, чтобы не задерживать запись бота.
+В конце освобожденные страницы возвращаются системе через incremental_vacuum.
+
+Запуск:
+    python maintenance.py                               # один проход
+    python maintenance.py --retention-days 30
+    python maintenance.py --enable-incremental-vacuum   # однократный перевод БД в auto_vacuum=INCREMENTAL
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from config import (MAINTENANCE_INTERVAL, DIALOG_RETENTION_DAYS, MAINTENANCE_CHUNK_SIZE,
+                    MAINTENANCE_CHUNK_PAUSE, MAINTENANCE_VACUUM_PAGES, ARCHIVE_DIR)
+from logger import setup_logging, shutdown_logging
+from metrics import registry
+
+# Настройка логирования для maintenance модуля
+logger = logging.getLogger(__name__)
+
+ROWS_ARCHIVED = registry.counter("maintenance_rows_archived_total", "dialog_history rows archived and deleted")
+
+# Значение PRAGMA auto_vacuum для режима INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+ROLLUP_CHUNK = '''
+    INSERT INTO dialog_daily_summary (user_id, day, message_type, messages, first_at, last_at)
+    SELECT user_id, date(timestamp), message_type, COUNT(*), MIN(timestamp), MAX(timestamp)
+    FROM dialog_history
+    WHERE id BETWEEN ? AND ? AND timestamp < ?
+    GROUP BY user_id, date(timestamp), message_type
+    ON CONFLICT(user_id, day, message_type) DO UPDATE SET
+        messages = messages + excluded.messages,
+        first_at = MIN(first_at, excluded.first_at),
+        last_at = MAX(last_at, excluded.last_at)
+'''
+
+DELETE_CHUNK = 'DELETE FROM dialog_history WHERE id BETWEEN ? AND ? AND timestamp < ?'
+
+
+class DialogHistoryMaintenance:
+    """
+    Периодическая очистка dialog_history: сводки по дням, архив и удаление по частям.
+    Архив дописывается до удаления строк: при сбое часть строк может попасть
+    в архив дважды, но не потеряется.
+    """
+
+    def __init__(self, db, retention_days: int = DIALOG_RETENTION_DAYS, interval: float = MAINTENANCE_INTERVAL,
+                 chunk_size: int = MAINTENANCE_CHUNK_SIZE, chunk_pause: float = MAINTENANCE_CHUNK_PAUSE,
+                 vacuum_pages: int = MAINTENANCE_VACUUM_PAGES, archive_dir: str = ARCHIVE_DIR):
+        """Инициализирует задачу. Периодический запуск - методом start()."""
+        self.db = db
+        self.retention_days = retention_days
+        self.interval = interval
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_pause = chunk_pause
+        self.vacuum_pages = vacuum_pages
+        self.archive_dir = archive_dir
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        """Запущен ли периодический запуск."""
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запускает фоновую задачу обслуживания."""
+        if not self.is_running:
+            self._task = asyncio.create_task(self._run(), name="dialog-history-maintenance")
+
+    async def stop(self):
+        """Останавливает фоновую задачу (текущая транзакция успевает завершиться)."""
+        if self.is_running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def cutoff(self) -> str:
+        """Граница хранения в формате CURRENT_TIMESTAMP: более старые строки архивируются."""
+        moment = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _append_archive(path: str, rows: List[Dict]):
+        """Дописывает строки в архив отдельным gzip-фрагментом (файл остается читаемым gzip.open)."""
+        data = ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as archive:
+                archive.write(data)
+            raw.flush()
+            # Строки удаляются из БД только после того, как архив записан на диск
+            os.fsync(raw.fileno())
+
+    async def archive_old_rows(self) -> int:
+        """
+        Архивирует и удаляет строки старше срока хранения.
+        Returns:
+            int: Количество удаленных строк
+        """
+        cutoff = self.cutoff()
+        archive_path = None
+        total = 0
+        while True:
+            rows = await self.db.fetch_all(
+                '''SELECT id, user_id, session_id, message_type, content, timestamp
+                FROM dialog_history WHERE timestamp < ? ORDER BY id LIMIT ?''',
+                (cutoff, self.chunk_size)
+            )
+            if not rows:
+                break
+            rows = [dict(row) for row in rows]
+            if archive_path is None:
+                os.makedirs(self.archive_dir, exist_ok=True)
+                stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+                archive_path = os.path.join(self.archive_dir, f"dialog_history-{stamp}.jsonl.gz")
+            await asyncio.to_thread(self._append_archive, archive_path, rows)
+
+            # Строки с id из диапазона пачки и старше границы - ровно выбранные выше
+            params = (rows[0]['id'], rows[-1]['id'], cutoff)
+            async with self.db.get_write_connection() as conn:
+                await conn.execute(ROLLUP_CHUNK, params)
+                await conn.execute(DELETE_CHUNK, params)
+                await conn.commit()
+            total += len(rows)
+            ROWS_ARCHIVED.inc(len(rows))
+
+            if len(rows) < self.chunk_size:
+                break
+            await asyncio.sleep(self.chunk_pause)
+
+        if total:
+            logger.info(f"Archived {total} dialog_history rows older than {cutoff} to {archive_path}")
+        return total
+
+    async def incremental_vacuum(self) -> bool:
+        """Возвращает системе свободные страницы, если БД в режиме auto_vacuum=INCREMENTAL."""
+        # Режим читается через соединение записи: соединения чтения помнят значение на момент открытия
+        async with self.db.get_write_connection() as conn:
+            cursor = await conn.execute('PRAGMA auto_vacuum')
+            if (await cursor.fetchone())[0] != AUTO_VACUUM_INCREMENTAL:
+                logger.info("auto_vacuum is not INCREMENTAL, skipping incremental vacuum")
+                return False
+            # Каждый шаг PRAGMA освобождает одну страницу, а execute() модуля sqlite3 выполняет
+            # только первый шаг запроса без колонок; executescript выполняет его до конца
+            await conn.executescript(f'PRAGMA incremental_vacuum({self.vacuum_pages})')
+        return True
+
+    async def run_once(self) -> int:
+        """Один проход обслуживания: архив и удаление старых строк, затем incremental_vacuum."""
+        archived = await self.archive_old_rows()
+        if archived:
+            await self.incremental_vacuum()
+        return archived
+
+    async def _run(self):
+        """Фоновый цикл обслуживания."""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Dialog history maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+async def enable_incremental_vacuum(db):
+    """Переводит существующую БД в режим auto_vacuum=INCREMENTAL (требует полного VACUUM)."""
+    async with db.get_write_connection() as conn:
+        await conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        await conn.execute('VACUUM')
+
+
+async def run(retention_days: int, enable_vacuum: bool):
+    """Выполняет один проход обслуживания из командной строки."""
+    from database import db
+
+    await db.init_db()
+    if enable_vacuum:
+        await enable_incremental_vacuum(db)
+        print("auto_vacuum set to INCREMENTAL")
+    archived = await DialogHistoryMaintenance(db, retention_days=retention_days).run_once()
+    print(f"Archived {archived} dialog_history rows")
+    await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание истории диалогов")
+    parser.add_argument("--retention-days", type=int, default=DIALOG_RETENTION_DAYS)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Перевести БД в режим auto_vacuum=INCREMENTAL (однократно, выполняет VACUUM)")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(run(args.retention_days, args.enable_incremental_vacuum))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Все, кроме букв, цифр и пробелов, заменяется пробелом (поддержка кириллицы и латиницы)
+_NON_WORD_RE = re.compile(r"[^\w\sа-яА-ЯёЁ]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Приводит текст к нижнему регистру и разбивает на слова, удаляя лишние символы."""
+    return _NON_WORD_RE.sub(" ", text.lower()).split()
+
+
+class KeywordMatcher:
+    """
+    Набор ключевых слов, скомпилированный для поиска за один проход по словам ответа.
+    Однословные ключи ищутся по словарю, многословные ("thank you") - по первому слову
+    с проверкой продолжения. Каждое ключевое слово засчитывается не более одного раза.
+    """
+    __slots__ = ('keywords', '_single', '_multi')
+
+    def __init__(self, keywords: Iterable[str]):
+        """Компилирует ключевые слова; пустые и повторяющиеся после нормализации отбрасываются."""
+        self.keywords: Tuple[str, ...] = ()
+        self._single: Dict[str, int] = {}
+        self._multi: Dict[str, List[Tuple[Tuple[str, ...], int]]] = {}
+
+        compiled = []
+        seen = set()
+        for keyword in keywords:
+            tokens = tuple(tokenize(keyword))
+            if not tokens or tokens in seen:
+                continue
+            seen.add(tokens)
+            index = len(compiled)
+            compiled.append(keyword.strip())
+            if len(tokens) == 1:
+                self._single[tokens[0]] = index
+            else:
+                self._multi.setdefault(tokens[0], []).append((tokens, index))
+        self.keywords = tuple(compiled)
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def find(self, words: Sequence[str]) -> List[str]:
+        """Возвращает найденные в словах ответа ключевые слова в порядке их объявления."""
+        present = set(words)
+        single = self._single
+        found = {single[word] for word in single.keys() & present}
+        multi = self._multi
+        # Проход по позициям нужен, только если в ответе есть первое слово многословного ключа
+        if multi and not multi.keys().isdisjoint(present):
+            for position, word in enumerate(words):
+                candidates = multi.get(word)
+                if candidates:
+                    for tokens, index in candidates:
+                        if tuple(words[position:position + len(tokens)]) == tokens:
+                            found.add(index)
+        return [self.keywords[index] for index in sorted(found)]
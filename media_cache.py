@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, Iterable, Tuple, Union
+from aiogram import Bot
+from aiogram.types import FSInputFile, Message
+from database import db
+from models import Phrase
+
+# Настройка логирования для media_cache модуля
+logger = logging.getLogger(__name__)
+
+
+def file_content_hash(path: str, chunk_size: int = 65536) -> str:
+    """Вычисляет SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PhraseAudioCache:
+    """
+    Кэш Telegram file_id для аудио фраз.
+    Файл загружается в Telegram только при первой отправке или после изменения его содержимого
+    (определяется по хэшу), в остальных случаях отправляется сохраненный file_id.
+    """
+
+    def __init__(self, db):
+        """Инициализирует кэш. Сохраненные file_id загружаются из БД при первом обращении."""
+        self.db = db
+        self._file_ids: Dict[int, Tuple[str, str]] = {}
+        self._hashes: Dict[str, Tuple[float, int, str]] = {}
+        self._loaded = False
+
+    async def _ensure_loaded(self):
+        """Загружает сохраненные file_id из БД."""
+        if self._loaded:
+            return
+        for row in await self.db.get_phrase_audio_file_ids():
+            self._file_ids[row['phrase_id']] = (row['content_hash'], row['file_id'])
+        self._loaded = True
+
+    async def content_hash(self, path: str) -> str:
+        """Возвращает хэш файла; файл перечитывается только при изменении его размера или времени изменения."""
+        stat = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+        content_hash = await asyncio.to_thread(file_content_hash, path)
+        self._hashes[path] = (stat.st_mtime, stat.st_size, content_hash)
+        return content_hash
+
+    async def get_voice(self, phrase: Phrase) -> Union[str, FSInputFile]:
+        """Возвращает file_id, если файл не менялся с последней загрузки, иначе файл для загрузки."""
+        await self._ensure_loaded()
+        cached = self._file_ids.get(phrase.id)
+        if cached and cached[0] == await self.content_hash(phrase.audio_path):
+            return cached[1]
+        return FSInputFile(path=phrase.audio_path, filename=os.path.basename(phrase.audio_path))
+
+    async def remember(self, phrase: Phrase, sent_message: Message):
+        """Сохраняет file_id из сообщения, которым аудио фразы было загружено в Telegram."""
+        media = sent_message.voice or sent_message.audio or sent_message.document
+        if media is None:
+            return
+        content_hash = await self.content_hash(phrase.audio_path)
+        self._file_ids[phrase.id] = (content_hash, media.file_id)
+        await self.db.save_phrase_audio_file_id(phrase.id, content_hash, media.file_id)
+
+    async def forget(self, phrase_id: int):
+        """Удаляет file_id фразы (например, если Telegram его больше не принимает)."""
+        self._file_ids.pop(phrase_id, None)
+        await self.db.delete_phrase_audio_file_id(phrase_id)
+
+    async def warm_up(self, bot: Bot, chat_id: Union[int, str], phrases: Iterable[Phrase],
+                      delete_after: bool = True) -> int:
+        """
+        Заранее загружает в Telegram аудио фраз, для которых нет актуального file_id.
+        Args:
+            bot: Экземпляр бота
+            chat_id: Служебный чат (например, оператора), куда отправляются файлы
+            phrases: Фразы каталога
+            delete_after (bool): Удалять ли отправленные служебные сообщения
+        Returns:
+            int: Количество загруженных файлов
+        """
+        uploaded = 0
+        for phrase in phrases:
+            try:
+                voice = await self.get_voice(phrase)
+                if isinstance(voice, str):
+                    continue
+                sent = await bot.send_voice(chat_id, voice=voice, disable_notification=True)
+                await self.remember(phrase, sent)
+                uploaded += 1
+                if delete_after:
+                    await bot.delete_message(chat_id, sent.message_id)
+            except Exception as e:
+                logger.error(f"Failed to warm up audio for phrase {phrase.id}: {e}")
+        logger.info(f"Phrase audio warm-up finished: {uploaded} files uploaded")
+        return uploaded
+
+
+# Глобальный кэш file_id аудио фраз
+phrase_audio_cache = PhraseAudioCache(db)
@@ -0,0 +1,266 @@
+"""
+Метрики бота: счетчики, показатели и гистограммы в памяти процесса,
+отдаваемые HTTP-эндпоинтом /metrics в текстовом формате Prometheus.
+
+При METRICS_ENABLED=0 методы записи метрик ничего не делают, а методы
+Database не оборачиваются замером времени.
+"""
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from aiohttp import web
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+# Настройка логирования для metrics модуля
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки, секунды
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label(value: str) -> str:
+    """Экранирует значение метки: обратная косая черта, кавычка и перевод строки."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    """Форматирует метки в виде {name="value",...}."""
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """Форматирует значение: целые числа без дробной части."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """Базовый класс метрики с именем, описанием и набором меток."""
+    type = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        """Значения меток в порядке labelnames."""
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        """Строки значений метрики в формате Prometheus."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Метрика в текстовом формате Prometheus."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик."""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Увеличивает счетчик."""
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """
+    Текущее значение. Если задан callback, значение читается при каждом
+    запросе /metrics (так измеряются глубины очередей без затрат на горячем пути).
+    """
+    type = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], float]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        """Устанавливает значение."""
+        if self.registry.enabled:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> Iterator[str]:
+        if self.callback is not None:
+            try:
+                yield f"{self.name} {_format_value(self.callback())}"
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} callback failed: {e}")
+            return
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """Гистограмма значений (обычно длительностей в секундах) с фиксированными корзинами."""
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: [количество по корзинам (+Inf последней), сумма, количество]
+        self._values: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        """Добавляет наблюдение."""
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет время выполнения блока with."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса."""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        """Регистрирует метрику; повторная регистрация возвращает существующую."""
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, callback=callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+# Глобальный реестр метрик
+registry = MetricsRegistry()
+
+# Метрики, общие для нескольких модулей
+DB_METHOD_DURATION = registry.histogram(
+    "db_method_duration_seconds", "Duration of Database method calls", ["method"])
+DB_METHOD_ERRORS = registry.counter(
+    "db_method_errors_total", "Database method calls that raised an exception", ["method"])
+VOICE_STAGE_DURATION = registry.histogram(
+    "voice_stage_duration_seconds", "Duration of voice answer processing stages", ["stage"])
+VOICE_ANSWERS = registry.counter(
+    "voice_answers_total", "Processed voice answers by result", ["result"])
+FAQ_LOOKUP_DURATION = registry.histogram(
+    "faq_lookup_duration_seconds", "Duration of FAQ index lookups",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+FAQ_LOOKUPS = registry.counter("faq_lookups_total", "FAQ lookups by result", ["result"])
+HANDLER_DURATION = registry.histogram(
+    "handler_duration_seconds", "Duration of message handlers", ["handler"])
+
+
+def instrument_methods(histogram: Histogram, errors: Counter, exclude: Sequence[str] = ()):
+    """
+    Декоратор класса: оборачивает его публичные async-методы замером длительности
+    (метка method - имя метода) и подсчетом исключений. При выключенных метриках
+    класс не изменяется.
+    """
+    def decorate(cls):
+        if not registry.enabled:
+            return cls
+        for name, method in list(vars(cls).items()):
+            if name.startswith('_') or name in exclude or not inspect.iscoroutinefunction(method):
+                continue
+            setattr(cls, name, _timed(method, name, histogram, errors))
+        return cls
+    return decorate
+
+
+def _timed(method, name: str, histogram: Histogram, errors: Counter):
+    """Оборачивает корутинную функцию замером длительности."""
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            errors.inc(method=name)
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started, method=name)
+    return wrapper
+
+
+async def handler_timing_middleware(handler, event, data):
+    """Внутренняя мидлварь сообщений: длительность каждого обработчика."""
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    finally:
+        HANDLER_DURATION.observe(time.perf_counter() - started, handler=data["handler"].callback.__name__)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Отдает метрики в текстовом формате Prometheus."""
+    return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    """Запускает HTTP-сервер с эндпоинтом /metrics, если метрики включены."""
+    if not registry.enabled or not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint listening on {host}:{port}/metrics")
+    return runner
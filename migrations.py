@@ -0,0 +1,366 @@
+"""
+Версионированные миграции схемы БД.
+
+Примененные миграции записываются в таблицу schema_version; при запуске
+выполняются только миграции с номером больше текущей версии. Чтобы изменить
+схему, добавьте новую Migration в конец списка MIGRATIONS.
+
+Запуск:
+    python migrations.py            # применить миграции
+    python migrations.py --check    # проверить, что горячие запросы используют индексы
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Sequence, Tuple, Union
+import aiosqlite
+from logger import setup_logging, shutdown_logging
+
+# Настройка логирования для migrations модуля
+logger = logging.getLogger(__name__)
+
+# Шаг миграции: SQL-запрос или асинхронная функция, получающая соединение
+MigrationStep = Union[str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Миграция схемы: номер версии, описание и шаги."""
+    version: int
+    description: str
+    steps: Sequence[MigrationStep]
+
+
+async def create_content_version_triggers(conn: aiosqlite.Connection):
+    """Создает триггеры, увеличивающие версию справочных таблиц при любом изменении."""
+    for table in ('phrases', 'faq'):
+        await conn.execute('INSERT OR IGNORE INTO content_versions (name) VALUES (?)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            await conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE content_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            ''')
+
+
+# Пересчет агрегатов user_stats по завершенным сессиям. Точность считается как в прежнем
+# get_user_stats (AVG по сессиям): деление на 0 дает NULL, и такие сессии не учитываются
+REBUILD_USER_STATS = [
+    'DELETE FROM user_stats',
+    '''
+    INSERT INTO user_stats (user_id, total_sessions, total_phrases, total_correct,
+                            accuracy_sum, accuracy_sessions)
+    SELECT user_id,
+           COUNT(*),
+           COALESCE(SUM(phrases_practiced), 0),
+           COALESCE(SUM(correct_answers), 0),
+           COALESCE(SUM(correct_answers * 1.0 / phrases_practiced), 0),
+           COUNT(correct_answers * 1.0 / phrases_practiced)
+    FROM practice_sessions
+    WHERE end_time IS NOT NULL
+    GROUP BY user_id
+    ''',
+]
+
+
+MIGRATIONS: List[Migration] = [
+    # Исходная схема (IF NOT EXISTS - базы, созданные до появления миграций, обновляются без изменений).
+    # Таблицы, добавленные позже, создаются своими миграциями, в том числе в базах версии 1
+    Migration(1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS phrases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL UNIQUE,
+            audio_path TEXT UNIQUE,
+            positive_keywords TEXT NOT NULL,
+            negative_keywords TEXT,
+            required_count INTEGER DEFAULT 2
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS faq (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL UNIQUE,
+            answer TEXT NOT NULL,
+            keywords TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_activity DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS practice_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            end_time DATETIME,
+            phrases_practiced INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS dialog_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            session_id INTEGER,
+            message_type TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (session_id) REFERENCES practice_sessions (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS error_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            error_type TEXT NOT NULL,
+            error_message TEXT NOT NULL,
+            traceback TEXT,
+            user_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+
+    # Индексы для горячих запросов: статистика пользователя и история диалогов
+    Migration(2, "hot path indexes", [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_practice_sessions_user_end
+        ON practice_sessions (user_id, end_time, phrases_practiced, correct_answers)
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_dialog_history_user ON dialog_history (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_dialog_history_session ON dialog_history (session_id)',
+        'CREATE INDEX IF NOT EXISTS idx_error_logs_user ON error_logs (user_id)',
+    ]),
+
+    # Агрегаты статистики пользователя, обновляемые при завершении сессии
+    Migration(3, "user stats aggregates", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_sessions INTEGER NOT NULL DEFAULT 0,
+            total_phrases INTEGER NOT NULL DEFAULT 0,
+            total_correct INTEGER NOT NULL DEFAULT 0,
+            accuracy_sum REAL NOT NULL DEFAULT 0,
+            accuracy_sessions INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        *REBUILD_USER_STATS,
+    ]),
+
+    # Хранилище состояний FSM (fsm_storage.SQLiteStorage)
+    Migration(4, "fsm storage", [
+        '''
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)',
+    ]),
+
+    # Кэш результатов распознавания речи (transcript_cache.TranscriptCache)
+    Migration(5, "transcript cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS transcript_cache (
+            key TEXT PRIMARY KEY,
+            transcript TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_transcript_cache_created ON transcript_cache (created_at)',
+    ]),
+
+    # Сводки истории диалогов по дням (maintenance.DialogHistoryMaintenance)
+    Migration(6, "dialog daily summary", [
+        '''
+        CREATE TABLE IF NOT EXISTS dialog_daily_summary (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            message_type TEXT NOT NULL,
+            messages INTEGER NOT NULL DEFAULT 0,
+            first_at DATETIME,
+            last_at DATETIME,
+            PRIMARY KEY (user_id, day, message_type),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+
+    # Кэш Telegram file_id для аудио фраз (media_cache.PhraseAudioCache)
+    Migration(7, "phrase audio file_id cache", [
+        '''
+        CREATE TABLE IF NOT EXISTS phrase_audio_cache (
+            phrase_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (phrase_id) REFERENCES phrases (id)
+        )
+        ''',
+    ]),
+
+    # Версии справочных таблиц: по ним кэши в памяти (catalog.PhraseCatalog) определяют,
+    # что данные нужно перезагрузить
+    Migration(8, "content versions", [
+        '''
+        CREATE TABLE IF NOT EXISTS content_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        create_content_version_triggers,
+    ]),
+]
+
+# Горячие запросы и индексы, которые они обязаны использовать: (название, запрос, параметры, индекс)
+HOT_QUERIES: List[Tuple[str, str, Tuple, str]] = [
+    (
+        "user stats",
+        'SELECT * FROM user_stats WHERE user_id = ?',
+        (1,),
+        "INTEGER PRIMARY KEY",
+    ),
+    (
+        "user stats rebuild",
+        '''SELECT COUNT(*), SUM(phrases_practiced), SUM(correct_answers)
+        FROM practice_sessions
+        WHERE user_id = ? AND end_time IS NOT NULL''',
+        (1,),
+        "COVERING INDEX idx_practice_sessions_user_end",
+    ),
+    (
+        "dialog history by user",
+        'SELECT * FROM dialog_history WHERE user_id = ? ORDER BY timestamp DESC LIMIT 50',
+        (1,),
+        "INDEX idx_dialog_history_user",
+    ),
+    (
+        "dialog history by session",
+        'SELECT * FROM dialog_history WHERE session_id = ?',
+        (1,),
+        "INDEX idx_dialog_history_session",
+    ),
+    (
+        "fsm state",
+        'SELECT state, data, updated_at FROM fsm_states WHERE key = ?',
+        ('fsm:1:1',),
+        "INDEX sqlite_autoindex_fsm_states_1",
+    ),
+]
+
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    """Возвращает номер последней примененной миграции (0 для новой БД)."""
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor = await conn.execute('SELECT MAX(version) FROM schema_version')
+    row = await cursor.fetchone()
+    return row[0] or 0
+
+
+async def apply_migrations(conn: aiosqlite.Connection, migrations: Sequence[Migration] = MIGRATIONS) -> int:
+    """
+    Применяет недостающие миграции, каждую в своей транзакции.
+    BEGIN IMMEDIATE не дает нескольким процессам применить одну миграцию одновременно.
+    Returns:
+        int: Версия схемы после применения
+    """
+    await conn.commit()
+    version = await get_schema_version(conn)
+    await conn.commit()
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= version:
+            continue
+        await conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Версию перечитываем под блокировкой: миграцию мог применить другой процесс
+            cursor = await conn.execute('SELECT MAX(version) FROM schema_version')
+            if ((await cursor.fetchone())[0] or 0) >= migration.version:
+                await conn.rollback()
+                continue
+            for step in migration.steps:
+                if isinstance(step, str):
+                    await conn.execute(step)
+                else:
+                    await step(conn)
+            await conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (migration.version, migration.description)
+            )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        version = migration.version
+        logger.info(f"Applied migration {migration.version}: {migration.description}")
+    return version
+
+
+async def check_query_plans(conn: aiosqlite.Connection) -> List[str]:
+    """
+    Проверяет через EXPLAIN QUERY PLAN, что горячие запросы используют индексы.
+    Returns:
+        List[str]: Описания проблем (пустой список, если все запросы используют индексы)
+    """
+    problems = []
+    for name, query, params, expected_index in HOT_QUERIES:
+        cursor = await conn.execute(f'EXPLAIN QUERY PLAN {query}', params)
+        plan = ' | '.join(row[3] for row in await cursor.fetchall())
+        if expected_index not in plan:
+            problems.append(f"{name}: expected {expected_index}, got: {plan}")
+    return problems
+
+
+async def run(check: bool) -> int:
+    """Применяет миграции и при необходимости проверяет планы запросов."""
+    from database import db
+
+    await db.init_db()
+    async with db.get_connection() as conn:
+        print(f"Schema version: {await get_schema_version(conn)}")
+        problems = await check_query_plans(conn) if check else []
+    await db.close()
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if check and not problems:
+        print(f"OK: {len(HOT_QUERIES)} hot queries use their indexes")
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--check", action="store_true", help="Проверить планы горячих запросов")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        sys.exit(asyncio.run(run(args.check)))
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List
+from matcher import KeywordMatcher
 
-@dataclass
+@dataclass(slots=True)
 class Phrase:
     """Класс для представления фразы."""
     id: int
@@ -10,6 +11,15 @@ class Phrase:
     positive_keywords: List[str]
     negative_keywords: List[str]
     required_count: int
+    positive_matcher: KeywordMatcher = field(default=None, repr=False, compare=False)
+    negative_matcher: KeywordMatcher = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        """Компилирует ключевые слова один раз при создании фразы."""
+        if self.positive_matcher is None:
+            self.positive_matcher = KeywordMatcher(self.positive_keywords)
+        if self.negative_matcher is None:
+            self.negative_matcher = KeywordMatcher(self.negative_keywords)
 
     @classmethod
     def from_db_row(cls, row):
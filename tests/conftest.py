@@ -0,0 +1,46 @@
+"""
+Общие настройки тестов.
+Модули бота читают config.py при импорте, поэтому окружение задается до импорта:
+временная БД, без файла логов и без HTTP-сервера метрик.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+_TEMP_DIR = tempfile.mkdtemp(prefix="speech-trainer-tests-")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:TEST")
+os.environ["DB_PATH"] = os.path.join(_TEMP_DIR, "global.db")
+os.environ["LOG_FILE"] = ""
+os.environ["METRICS_PORT"] = "0"
+
+import pytest  # noqa: E402
+from database import Database  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Путь к отдельной БД теста."""
+    return str(tmp_path / "test.db")
+
+
+@pytest.fixture
+def run_db(db_path):
+    """
+    Запускает сценарий async def scenario(db) на инициализированной БД.
+    Открытие, сценарий и закрытие выполняются в одном цикле событий:
+    фоновые задачи БД (буфер записи, трекер активности) живут в цикле, где были запущены.
+    """
+    def run(scenario, seed: bool = True, **options):
+        async def wrapper():
+            db = Database(db_path, **options)
+            try:
+                await db.init_db(seed=seed)
+                return await scenario(db)
+            finally:
+                await db.close()
+        return asyncio.run(wrapper())
+    return run
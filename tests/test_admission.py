@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from admission import AdmissionController, AdmissionRejected
+
+
+async def rejection(controller, user_id):
+    with pytest.raises(AdmissionRejected) as error:
+        await controller.acquire(user_id)
+    return error.value.reason
+
+
+def test_rate_limit_per_user():
+    async def scenario():
+        controller = AdmissionController(max_active=10, user_rate=0.001, user_burst=2)
+        for _ in range(2):
+            await controller.acquire(1)
+            controller.release()
+        reason = await rejection(controller, 1)
+        # Другой пользователь не ограничен
+        await controller.acquire(2)
+        controller.release()
+        return reason, controller.stats()
+
+    reason, stats = asyncio.run(scenario())
+    assert reason == AdmissionRejected.RATE_LIMITED
+    assert stats['admitted'] == 3 and stats['rejected'] == {AdmissionRejected.RATE_LIMITED: 1}
+
+
+def test_overload_does_not_spend_user_tokens():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=0, user_rate=0.001, user_burst=1)
+        await controller.acquire(1)
+        reason = await rejection(controller, 2)
+        controller.release()
+        # Единственный токен пользователя 2 не был потрачен на отказ
+        await controller.acquire(2)
+        controller.release()
+        return reason
+
+    assert asyncio.run(scenario()) == AdmissionRejected.OVERLOADED
+
+
+def test_queue_timeout_refunds_token_and_keeps_capacity():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queue=5, queue_timeout=0.01,
+                                         user_rate=0.001, user_burst=1)
+        await controller.acquire(1)
+        reason = await rejection(controller, 2)
+        controller.release()
+        await controller.acquire(2)
+        controller.release()
+        return reason, controller.stats()
+
+    reason, stats = asyncio.run(scenario())
+    assert reason == AdmissionRejected.QUEUE_TIMEOUT
+    assert stats['active'] == 0 and stats['waiting'] == 0
+
+
+def test_waiters_admitted_in_turn_without_leaking_slots():
+    async def scenario():
+        controller = AdmissionController(max_active=2, max_queue=100, queue_timeout=0.02, user_rate=0)
+        outcomes = []
+
+        async def answer(user_id):
+            try:
+                await controller.acquire(user_id)
+            except AdmissionRejected as e:
+                outcomes.append(e.reason)
+                return
+            try:
+                await asyncio.sleep(0.005)
+                outcomes.append("ok")
+            finally:
+                controller.release()
+
+        await asyncio.gather(*(answer(user_id) for user_id in range(40)))
+        # Все места свободны: ни одно не потеряно на гонке освобождения и таймаута
+        for user_id in range(2):
+            await controller.acquire(user_id)
+        free = not controller._semaphore.locked()
+        return outcomes, controller.stats(), free
+
+    outcomes, stats, free = asyncio.run(scenario())
+    assert len(outcomes) == 40 and "ok" in outcomes and AdmissionRejected.QUEUE_TIMEOUT in outcomes
+    assert stats['active'] == 2 and stats['waiting'] == 0 and not free
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import stat
+import assets
+from database import Database
+
+
+def fake_ffmpeg(tmp_path):
+    """Заглушка ffmpeg: копирует исходник в выходной файл и записывает вызов в журнал."""
+    script = tmp_path / "ffmpeg"
+    calls = tmp_path / "calls.log"
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$5\" >> {calls}\n"
+        "for last; do :; done\n"
+        "cp \"$5\" \"$last\"\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script), calls
+
+
+def test_identical_sources_are_encoded_once(tmp_path, db_path, monkeypatch):
+    ffmpeg, calls = fake_ffmpeg(tmp_path)
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    (sources / "a.wav").write_bytes(b"RIFF-same")
+    (sources / "a-copy.wav").write_bytes(b"RIFF-same")
+    (sources / "b.wav").write_bytes(b"RIFF-other")
+
+    db = Database(db_path)
+    monkeypatch.setattr(assets, "db", db)
+    monkeypatch.setattr(assets, "FFMPEG_PATH", ffmpeg)
+    monkeypatch.setattr(assets, "ASSETS_DIR", str(tmp_path / "encoded"))
+
+    async def scenario():
+        await db.init_db()
+        await db.execute_query('UPDATE phrases SET audio_path = NULL')
+        for phrase_id, name in ((1, "a.wav"), (2, "a-copy.wav"), (3, "b.wav")):
+            await db.execute_query('UPDATE phrases SET text = ?, audio_path = ? WHERE id = ?',
+                                   (f"phrase {name}", str(sources / name), phrase_id))
+        first = await assets.build_assets(workers=4)
+        second = await assets.build_assets(workers=4)
+        rows = await db.fetch_all('SELECT id, audio_path FROM phrases WHERE id IN (1, 2, 3) ORDER BY id')
+        await db.close()
+        return first, second, [row['audio_path'] for row in rows]
+
+    first, second, paths = asyncio.run(scenario())
+    assert first == {'encoded': 2, 'up_to_date': 0, 'updated': 2, 'conflicts': 1, 'failed': 0}
+    # Собранные фразы без исходника в PHRASES_DATA пропускаются, а файл копии уже занят фразой 1
+    assert second == {'encoded': 0, 'up_to_date': 1, 'updated': 0, 'conflicts': 1, 'failed': 0}
+    assert len(calls.read_text().splitlines()) == 2
+    assert paths[1] == str(sources / "a-copy.wav")
+    assert paths[0].endswith(".ogg") and paths[2].endswith(".ogg") and paths[0] != paths[2]
+    assert sorted(os.listdir(tmp_path / "encoded")) == sorted(os.path.basename(path) for path in (paths[0], paths[2]))
+
+
+def test_failed_encoding_is_reported_and_db_closed(tmp_path, db_path, monkeypatch):
+    source = tmp_path / "a.wav"
+    source.write_bytes(b"RIFF")
+    db = Database(db_path)
+    monkeypatch.setattr(assets, "db", db)
+    monkeypatch.setattr(assets, "FFMPEG_PATH", "false")
+    monkeypatch.setattr(assets, "ASSETS_DIR", str(tmp_path / "encoded"))
+
+    async def scenario():
+        await db.init_db()
+        await db.execute_query('UPDATE phrases SET audio_path = NULL')
+        await db.update_phrase_audio_path(1, str(source))
+        await db.close()
+        return await assets.build_assets(workers=1)
+
+    counts = asyncio.run(scenario())
+    assert counts['failed'] == 1 and counts['updated'] == 0
+    assert not db.pool.is_open
+    assert os.listdir(tmp_path / "encoded") == []
@@ -0,0 +1,26 @@
+from catalog import PhraseCatalog
+
+
+def test_phrase_catalog_follows_content_version(run_db):
+    async def scenario(db):
+        catalog = PhraseCatalog(db, ttl=3600, check_interval=0)
+        before = (await catalog.get(1)).text
+        await db.execute_query("UPDATE phrases SET text = 'changed' WHERE id = 1")
+        return before, (await catalog.get(1)).text, len(await catalog.all()), await catalog.get(-1)
+
+    before, after, count, missing = run_db(scenario)
+    assert before != "changed" and after == "changed"
+    assert count > 0 and missing is None
+
+
+def test_phrase_catalog_skips_version_check_within_interval(run_db):
+    async def scenario(db):
+        catalog = PhraseCatalog(db, ttl=3600, check_interval=3600)
+        before = (await catalog.get(1)).text
+        await db.execute_query("UPDATE phrases SET text = 'changed' WHERE id = 1")
+        cached = (await catalog.get(1)).text
+        catalog.invalidate()
+        return before, cached, (await catalog.get(1)).text
+
+    before, cached, reloaded = run_db(scenario)
+    assert cached == before and reloaded == "changed"
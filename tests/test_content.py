@@ -0,0 +1,48 @@
+import io
+import json
+import sqlite3
+
+from content import MAX_SQL_VARIABLES, TABLES, ImportOptions, export_content, import_content
+
+FAQ = TABLES['faq']
+
+
+def faq_lines(count: int, answer: str = "answer") -> str:
+    return ''.join(json.dumps({"question": f"question {n}?", "answer": answer, "keywords": [f"key{n}"]}) + '\n'
+                   for n in range(count))
+
+
+async def limit_variables(db, limit: int):
+    """Ограничивает число параметров запроса на всех соединениях пула, как в старых сборках SQLite."""
+    for conn in [db.pool._writer, *db.pool._all_readers]:
+        await conn._execute(conn._conn.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+
+
+def test_import_chunks_stay_within_sqlite_variable_limit(run_db):
+    count = MAX_SQL_VARIABLES + 200
+
+    async def scenario(db):
+        await limit_variables(db, MAX_SQL_VARIABLES)
+        options = ImportOptions(chunk_size=5000)
+        first = await import_content(db, FAQ, io.StringIO(faq_lines(count)), 'jsonl', options)
+        second = await import_content(db, FAQ, io.StringIO(faq_lines(count, "changed")), 'jsonl', options)
+        return first, second
+
+    first, second = run_db(scenario, seed=False)
+    assert (first.added, first.invalid) == (count, 0)
+    assert (second.updated, second.added, second.invalid) == (count, 0, 0)
+
+
+def test_export_then_import_is_unchanged(run_db):
+    async def scenario(db):
+        await import_content(db, FAQ, io.StringIO(faq_lines(3)), 'jsonl', ImportOptions())
+        reports = {}
+        for file_format in ('jsonl', 'csv'):
+            target = io.StringIO()
+            assert await export_content(db, FAQ, target, file_format) == 3
+            reports[file_format] = await import_content(
+                db, FAQ, io.StringIO(target.getvalue()), file_format, ImportOptions())
+        return reports
+
+    for report in run_db(scenario, seed=False).values():
+        assert (report.unchanged, report.added, report.updated, report.invalid) == (3, 0, 0, 0)
@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+from config import FAQ_DATA
+from database import ConnectionPool, Database, pragma_statements
+
+def test_pool_readers_see_writes(db_path):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=2, checkpoint_interval=0)
+        await pool.open()
+        try:
+            async with pool.writer() as conn:
+                await conn.execute('CREATE TABLE items (value INTEGER)')
+                await conn.executemany('INSERT INTO items VALUES (?)', [(1,), (2,), (3,)])
+                await conn.commit()
+
+            async def count():
+                async with pool.reader() as conn:
+                    cursor = await conn.execute('SELECT COUNT(*) FROM items')
+                    return (await cursor.fetchone())[0]
+
+            return await asyncio.gather(*(count() for _ in range(5)))
+        finally:
+            await pool.close()
+
+    assert asyncio.run(scenario()) == [3] * 5
+
+
+def test_pool_writer_rolls_back_on_error(db_path):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=1, checkpoint_interval=0)
+        await pool.open()
+        try:
+            async with pool.writer() as conn:
+                await conn.execute('CREATE TABLE items (value INTEGER)')
+                await conn.commit()
+            with pytest.raises(RuntimeError):
+                async with pool.writer() as conn:
+                    await conn.execute('INSERT INTO items VALUES (1)')
+                    raise RuntimeError("boom")
+            async with pool.reader() as conn:
+                cursor = await conn.execute('SELECT COUNT(*) FROM items')
+                return (await cursor.fetchone())[0]
+        finally:
+            await pool.close()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_pool_replaces_broken_idle_reader(db_path):
+    async def scenario():
+        pool = ConnectionPool(db_path, size=1, health_check_interval=0, checkpoint_interval=0)
+        await pool.open()
+        try:
+            async with pool.reader() as conn:
+                broken = conn
+            await broken.close()
+            async with pool.reader() as conn:
+                cursor = await conn.execute('SELECT 1')
+                return conn is not broken, (await cursor.fetchone())[0]
+        finally:
+            await pool.close()
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+def test_content_version_bumped_by_triggers(run_db):
+    async def scenario(db):
+        before = await db.get_content_version('phrases')
+        await db.execute_query("UPDATE phrases SET text = text || '!' WHERE id = 1")
+        return before, await db.get_content_version('phrases')
+
+    before, after = run_db(scenario)
+    assert after > before
+
+
+def test_user_stats_aggregates_sessions(run_db):
+    async def scenario(db):
+        await db.add_user(1, "user", "First", None)
+        first = await db.start_practice_session(1)
+        await db.end_practice_session(first, 4, 3)
+        # Повторное завершение не учитывается дважды
+        await db.end_practice_session(first, 4, 3)
+        second = await db.start_practice_session(1)
+        await db.end_practice_session(second, 2, 2)
+        stats = await db.get_user_stats(1)
+        await db.rebuild_user_stats()
+        return stats, await db.get_user_stats(1)
+
+    stats, rebuilt = run_db(scenario)
+    assert stats == {'total_sessions': 2, 'total_phrases': 6, 'total_correct': 5, 'accuracy': 87.5}
+    assert rebuilt == stats
+
+
+def test_pragma_statements_accept_profile_values():
+    assert pragma_statements({"journal_mode": "wal", "cache_size": -2000}) == [
+        "PRAGMA journal_mode = WAL", "PRAGMA cache_size = -2000"]
+
+
+@pytest.mark.parametrize("pragmas", [
+    {"journal_mode": "WAL; DROP TABLE users"},
+    {"cache_size": "-2000"},
+    {"busy_timeout": True},
+    {"key": "secret"},
+])
+def test_pragma_statements_reject_unknown_names_and_values(pragmas):
+    with pytest.raises(ValueError):
+        pragma_statements(pragmas)
+
+
+def test_concurrent_init_seeds_once(db_path):
+    async def delay_after_count(db):
+        """Задерживает процесс после проверки пустых таблиц, чтобы остальные успели проверить их же."""
+        await db.open()
+        conn = db.pool._writer
+        execute = conn.execute
+
+        async def delayed(sql, *args):
+            cursor = await execute(sql, *args)
+            if 'COUNT(*)' in sql:
+                await asyncio.sleep(0.05)
+            return cursor
+
+        conn.execute = delayed
+
+    async def scenario():
+        instances = [Database(db_path) for _ in range(3)]
+        try:
+            for db in instances:
+                await delay_after_count(db)
+            await asyncio.gather(*(db.init_db() for db in instances))
+            return (await instances[0].fetch_one('SELECT COUNT(*) AS count FROM faq'))['count']
+        finally:
+            for db in instances:
+                await db.close()
+
+    assert asyncio.run(scenario()) == len(FAQ_DATA)
@@ -0,0 +1,44 @@
+import asyncio
+from faq_index import FAQSearchIndex, TextAnalyzer
+
+FAQ = [
+    (1, "Как работает бот?", "answer-how", "как работает,бот,работа"),
+    (2, "Как отправить голосовое сообщение?", "answer-voice", "голос,голосовое сообщение,микрофон"),
+    (3, "Какие фразы есть?", "answer-phrases", "фразы,список фраз"),
+]
+
+
+def make_index():
+    index = FAQSearchIndex(db=None, analyzer=TextAnalyzer(stemming=False))
+    index.build(FAQ)
+    return index
+
+
+def test_search_ranks_best_match_first():
+    index = make_index()
+    ranked = index.search("как отправить голосовое сообщение", limit=3)
+    assert ranked[0][1] == 1
+    assert [score for score, _ in ranked] == sorted((score for score, _ in ranked), reverse=True)
+
+
+def test_prefix_of_question_word_matches_keyword():
+    # Ключ "голос" находится по слову "голосовой"
+    assert make_index().search("голосовой")[0][1] == 1
+
+
+def test_no_match_returns_empty():
+    assert make_index().search("погода завтра") == []
+
+
+def test_answer_reloads_from_db(run_db):
+    async def scenario(db):
+        index = FAQSearchIndex(db, analyzer=TextAnalyzer(stemming=False))
+        await db.execute_query('DELETE FROM faq')
+        await db.execute_query('INSERT INTO faq (question, answer, keywords) VALUES (?, ?, ?)',
+                               ("Q", "первый ответ", "тест"))
+        first = await index.answer("тест")
+        await db.execute_query("UPDATE faq SET answer = 'второй ответ'")
+        index.invalidate()
+        return first, await index.answer("тест"), await index.answer("другое")
+
+    assert run_db(scenario) == ("первый ответ", "второй ответ", None)
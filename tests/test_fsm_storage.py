@@ -0,0 +1,33 @@
+import time
+from aiogram.fsm.storage.base import StorageKey
+from fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+def test_fsm_storage_persists_between_instances(run_db):
+    async def scenario(db):
+        storage = SQLiteStorage(db, cache_size=10)
+        await storage.set_state(KEY, "Practice:waiting")
+        await storage.set_data(KEY, {"phrase_id": 3})
+        await storage.close()
+
+        fresh = SQLiteStorage(db, cache_size=10)
+        state, data = await fresh.get_state(KEY), await fresh.get_data(KEY)
+        await fresh.set_state(KEY, None)
+        await fresh.set_data(KEY, {})
+        rows = await db.fetch_all('SELECT key FROM fsm_states')
+        return state, data, len(rows)
+
+    assert run_db(scenario) == ("Practice:waiting", {"phrase_id": 3}, 0)
+
+
+def test_fsm_storage_expires_stale_state(run_db):
+    async def scenario(db):
+        storage = SQLiteStorage(db, ttl=60, cache_size=10)
+        await storage.set_state(KEY, "Practice:waiting")
+        await db.execute_query('UPDATE fsm_states SET updated_at = ?', (time.time() - 120,))
+        storage._cache.clear()
+        return await storage.get_state(KEY), await storage.purge_expired()
+
+    assert run_db(scenario) == (None, 1)
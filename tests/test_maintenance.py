@@ -0,0 +1,28 @@
+import gzip
+import json
+from maintenance import DialogHistoryMaintenance
+
+
+def test_old_dialog_rows_are_archived_and_deleted(run_db, tmp_path):
+    archive_dir = tmp_path / "archive"
+
+    async def scenario(db):
+        await db.add_user(1, "user", None, None)
+        async with db.get_write_connection() as conn:
+            await conn.executemany(
+                '''INSERT INTO dialog_history (user_id, message_type, content, timestamp)
+                VALUES (1, 'user', ?, ?)''',
+                [(f"old {i}", '2000-01-01 00:00:00') for i in range(5)] + [("new", '2999-01-01 00:00:00')]
+            )
+            await conn.commit()
+        job = DialogHistoryMaintenance(db, retention_days=30, chunk_size=2, chunk_pause=0,
+                                       archive_dir=str(archive_dir))
+        archived = await job.run_once()
+        remaining = await db.fetch_all('SELECT content FROM dialog_history')
+        return archived, [row['content'] for row in remaining]
+
+    archived, remaining = run_db(scenario)
+    assert archived == 5 and remaining == ["new"]
+    (archive,) = archive_dir.iterdir()
+    with gzip.open(archive, 'rt', encoding='utf-8') as lines:
+        assert [json.loads(line)['content'] for line in lines] == [f"old {i}" for i in range(5)]
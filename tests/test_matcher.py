@@ -0,0 +1,27 @@
+from matcher import KeywordMatcher, tokenize
+
+
+def test_tokenize_strips_punctuation_and_case():
+    assert tokenize("Hello, World! Привет-мир") == ["hello", "world", "привет", "мир"]
+
+
+def test_single_and_multi_word_keywords():
+    matcher = KeywordMatcher(["hello", "thank you", "bye"])
+    assert matcher.find(tokenize("Thank you and hello")) == ["hello", "thank you"]
+    # Слова многословного ключа должны идти подряд
+    assert matcher.find(tokenize("thank the you")) == []
+
+
+def test_duplicates_and_empty_keywords_are_dropped():
+    matcher = KeywordMatcher(["Hello", "hello!", " ", "good morning", "Good  Morning"])
+    assert matcher.keywords == ("Hello", "good morning")
+    assert len(matcher) == 2
+
+
+def test_keyword_counted_once():
+    matcher = KeywordMatcher(["yes"])
+    assert matcher.find(tokenize("yes yes yes")) == ["yes"]
+
+
+def test_empty_matcher_is_falsy():
+    assert not KeywordMatcher([])
@@ -0,0 +1,17 @@
+from metrics import MetricsRegistry
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry(enabled=True)
+    errors = registry.counter("errors_total", "Errors by message", ["message"])
+    errors.inc(message='bad "path" C:\\tmp\nnext')
+    assert 'errors_total{message="bad \\"path\\" C:\\\\tmp\\nnext"} 1' in registry.render().splitlines()
+
+
+def test_histogram_keeps_le_label_after_escaped_labels():
+    registry = MetricsRegistry(enabled=True)
+    latency = registry.histogram("latency_seconds", "Latency", ["handler"], buckets=(0.1,))
+    latency.observe(0.05, handler='a"b')
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{handler="a\\"b",le="0.1"} 1' in lines
+    assert 'latency_seconds_count{handler="a\\"b"} 1' in lines
@@ -0,0 +1,73 @@
+import asyncio
+import aiosqlite
+from migrations import MIGRATIONS, HOT_QUERIES, apply_migrations, check_query_plans, get_schema_version
+
+
+async def open_connection(path):
+    conn = await aiosqlite.connect(path)
+    conn.row_factory = aiosqlite.Row
+    return conn
+
+
+def test_hot_queries_use_indexes(db_path):
+    async def scenario():
+        conn = await open_connection(db_path)
+        try:
+            version = await apply_migrations(conn)
+            return version, await check_query_plans(conn)
+        finally:
+            await conn.close()
+
+    version, problems = asyncio.run(scenario())
+    assert version == max(migration.version for migration in MIGRATIONS)
+    assert problems == []
+    assert HOT_QUERIES
+
+
+def test_migrations_upgrade_old_schema_and_are_idempotent(db_path):
+    async def scenario():
+        conn = await open_connection(db_path)
+        try:
+            first = await apply_migrations(conn, MIGRATIONS[:1])
+            latest = await apply_migrations(conn)
+            again = await apply_migrations(conn)
+            cursor = await conn.execute('SELECT COUNT(*) FROM schema_version')
+            applied = (await cursor.fetchone())[0]
+            return first, latest, again, applied, await get_schema_version(conn), await check_query_plans(conn)
+        finally:
+            await conn.close()
+
+    first, latest, again, applied, version, problems = asyncio.run(scenario())
+    assert first == 1
+    assert latest == again == version == applied == len(MIGRATIONS)
+    assert problems == []
+
+
+def test_seeded_database_query_plans(run_db):
+    async def scenario(db):
+        async with db.get_connection() as conn:
+            return await check_query_plans(conn)
+
+    assert run_db(scenario) == []
+
+
+async def schema_objects(conn):
+    cursor = await conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+def test_upgrade_from_first_version_adds_later_tables_and_triggers(db_path):
+    async def scenario():
+        conn = await open_connection(db_path)
+        try:
+            await apply_migrations(conn, MIGRATIONS[:1])
+            before = await schema_objects(conn)
+            await apply_migrations(conn)
+            return before, await schema_objects(conn)
+        finally:
+            await conn.close()
+
+    before, after = asyncio.run(scenario())
+    added = {'phrase_audio_cache', 'content_versions', 'phrases_version_update', 'faq_version_insert'}
+    assert not added & before
+    assert added <= after
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import threading
+import pytest
+import speech_recognition as sr
+import evaluation
+from config import MEDIA_DIR
+from evaluation import (RecognitionPool, SphinxRecognizerBackend, init_recognizer_process,
+                        recognize_speech_from_file)
+
+SAMPLE = os.path.join(MEDIA_DIR, "What is your name.wav")
+
+
+class EnglishSphinx(SphinxRecognizerBackend):
+    def __init__(self, **options):
+        super().__init__(language="en-US", **options)
+
+
+@pytest.fixture
+def backend_slot(monkeypatch):
+    """Восстанавливает глобальный движок распознавания после теста."""
+    monkeypatch.setattr(evaluation, "_recognizer_backend", None)
+
+
+def test_sphinx_fails_fast_without_model_for_language():
+    backend = SphinxRecognizerBackend(language="ru-RU", decoders=1)
+    with pytest.raises(ValueError, match="ru-RU"):
+        backend.load()
+
+
+def test_sphinx_rejects_other_language_per_request():
+    backend = SphinxRecognizerBackend(language="en-US", decoders=1)
+    with pytest.raises(sr.RequestError):
+        backend.recognize(sr.AudioData(b"\0\0" * 1600, 16000, 2), language="ru-RU")
+    assert backend.supports("en_us")
+
+
+def test_process_pool_worker_loads_one_decoder(monkeypatch, backend_slot):
+    monkeypatch.setitem(evaluation.RECOGNIZER_BACKENDS, "sphinx", EnglishSphinx)
+    backend = init_recognizer_process("sphinx")
+    assert backend.decoders == 1 and backend._pool.qsize() == 1
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE), reason="no sample phrase in media/")
+def test_sphinx_recognizes_english_phrase(backend_slot):
+    evaluation.init_recognizer_backend("sphinx", language="en-US", decoders=1)
+    assert recognize_speech_from_file(SAMPLE) == "what is your name"
+    # Для языка без модели распознавание не выполняется
+    assert recognize_speech_from_file(SAMPLE, "ru-RU") == ""
+
+
+def test_pool_holds_slot_until_timed_out_job_finishes():
+    release = threading.Event()
+    started = []
+
+    def job(name):
+        started.append(name)
+        if name == "slow":
+            release.wait(5)
+        return name
+
+    async def scenario():
+        pool = RecognitionPool("thread", workers=2, max_concurrent=1, timeout=0.05)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.run(job, "slow")
+            pool.timeout = 5
+            waiting = asyncio.create_task(pool.run(job, "next"))
+            await asyncio.sleep(0.1)
+            # Медленная задача все еще выполняется и занимает единственное место
+            blocked = (list(started), pool.stats())
+            release.set()
+            return blocked, await waiting, pool.stats()
+        finally:
+            release.set()
+            await pool.shutdown()
+
+    (blocked_started, blocked_stats), result, stats = asyncio.run(scenario())
+    assert blocked_started == ["slow"]
+    assert blocked_stats['queued'] == 1 and blocked_stats['active'] == 1 and blocked_stats['timeouts'] == 1
+    assert result == "next"
+    assert stats['active'] == 0 and stats['completed'] == 1
+
+
+def test_pool_counts_failures_and_frees_slot():
+    def broken():
+        raise RuntimeError("boom")
+
+    async def scenario():
+        pool = RecognitionPool("thread", workers=1, max_concurrent=1, timeout=5)
+        try:
+            with pytest.raises(RuntimeError):
+                await pool.run(broken)
+            return await pool.run(str, 42), pool.stats()
+        finally:
+            await pool.shutdown()
+
+    result, stats = asyncio.run(scenario())
+    assert result == "42" and stats['failed'] == 1 and stats['active'] == 0
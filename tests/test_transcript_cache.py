@@ -0,0 +1,44 @@
+import time
+from transcript_cache import TranscriptCache, content_key, file_key
+
+
+def test_transcript_cache_memory_and_db(run_db):
+    async def scenario(db):
+        cache = TranscriptCache(db, max_size=10, ttl=3600, persist=True)
+        keys = [file_key("abc"), content_key(b"pcm")]
+        await cache.put(keys, "hello")
+        await cache.put([file_key("empty")], "")
+        await db.write_buffer.flush()
+
+        restarted = TranscriptCache(db, max_size=10, ttl=3600, persist=True)
+        return (await cache.get(keys[0]), await restarted.get(keys[1]),
+                await restarted.get(file_key("empty")), cache.stats(), restarted.stats())
+
+    memory, persisted, empty, stats, restarted = run_db(scenario)
+    assert memory == persisted == "hello" and empty is None
+    assert stats['hits'] == 1 and restarted['db_hits'] == 1 and restarted['misses'] == 1
+
+
+def test_transcript_cache_evicts_least_recently_used(run_db):
+    async def scenario(db):
+        cache = TranscriptCache(db, max_size=2, ttl=3600, persist=False)
+        await cache.put(["a"], "1")
+        await cache.put(["b"], "2")
+        await cache.get("a")
+        await cache.put(["c"], "3")
+        return [await cache.get(key) for key in "abc"]
+
+    assert run_db(scenario) == ["1", None, "3"]
+
+
+def test_transcript_cache_keeps_stored_age_on_db_hit(run_db):
+    created_at = time.time() - 3500
+
+    async def scenario(db):
+        await db.save_transcript("old", "hello", created_at)
+        await db.write_buffer.flush()
+        cache = TranscriptCache(db, max_size=10, ttl=3600, persist=True)
+        return await cache.get("old"), cache._entries["old"]
+
+    # Почти истекшая запись не получает в памяти новый срок жизни
+    assert run_db(scenario) == ("hello", ("hello", created_at))
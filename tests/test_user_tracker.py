@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from user_tracker import UserActivityTracker
+
+
+def test_user_tracker_writes_profile_only_on_change(run_db):
+    async def scenario(db):
+        calls = []
+        add_user = db.add_user
+
+        async def counting_add_user(*args):
+            calls.append(args)
+            await add_user(*args)
+
+        db.add_user = counting_add_user
+        tracker = UserActivityTracker(db, max_cached=10)
+        await tracker.touch(1, "user", "First", None)
+        await tracker.touch(1, "user", "First", None)
+        await tracker.touch(1, "renamed", "First", None)
+        row = await db.fetch_one('SELECT username, last_activity FROM users WHERE id = 1')
+        return len(calls), row['username'], row['last_activity']
+
+    writes, username, last_activity = run_db(scenario)
+    assert writes == 2 and username == "renamed" and last_activity
+
+
+def test_user_tracker_batches_activity_until_flush(run_db):
+    async def scenario(db):
+        tracker = UserActivityTracker(db, flush_interval=3600)
+        await tracker.touch(1, "user", None, None)
+        tracker.start()
+        await db.execute_query("UPDATE users SET last_activity = '2000-01-01 00:00:00' WHERE id = 1")
+        await tracker.touch(1, "user", None, None)
+        pending = (await db.fetch_one('SELECT last_activity FROM users WHERE id = 1'))['last_activity']
+        await tracker.stop()
+        flushed = (await db.fetch_one('SELECT last_activity FROM users WHERE id = 1'))['last_activity']
+        return pending, flushed
+
+    pending, flushed = run_db(scenario)
+    assert pending == '2000-01-01 00:00:00'
+    assert flushed > pending
+
+
+def test_user_tracker_shares_profile_write_between_concurrent_messages(run_db):
+    async def scenario(db):
+        calls = []
+        add_user = db.add_user
+
+        async def slow_add_user(*args):
+            calls.append(args)
+            await asyncio.sleep(0.01)
+            await add_user(*args)
+
+        db.add_user = slow_add_user
+        tracker = UserActivityTracker(db, max_cached=10)
+        await asyncio.gather(*(tracker.touch(1, "user", "First", None) for _ in range(5)))
+        row = await db.fetch_one('SELECT username FROM users WHERE id = 1')
+        return len(calls), row['username']
+
+    assert run_db(scenario) == (1, "user")
+
+
+def test_user_tracker_retries_profile_after_failed_write(run_db):
+    async def scenario(db):
+        add_user = db.add_user
+        failures = [RuntimeError("database is locked")]
+
+        async def flaky_add_user(*args):
+            if failures:
+                raise failures.pop()
+            await add_user(*args)
+
+        db.add_user = flaky_add_user
+        tracker = UserActivityTracker(db, max_cached=10)
+        with pytest.raises(RuntimeError):
+            await tracker.touch(1, "user", "First", None)
+        await tracker.touch(1, "user", "First", None)
+        return await db.fetch_one('SELECT username FROM users WHERE id = 1')
+
+    assert run_db(scenario)['username'] == "user"
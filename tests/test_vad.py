@@ -0,0 +1,66 @@
+import numpy as np
+from vad import speech_frames, trim_silence
+
+RATE = 16000
+
+
+def tone(seconds: float, amplitude: float = 8000, frequency: float = 220) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return amplitude * np.sin(2 * np.pi * frequency * t)
+
+
+def noise(seconds: float, amplitude: float, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(0, amplitude, int(seconds * RATE))
+
+
+def pcm(*parts: np.ndarray) -> bytes:
+    return np.clip(np.concatenate(parts), -32768, 32767).astype('<i2').tobytes()
+
+
+def test_silence_around_speech_is_trimmed():
+    result = trim_silence(pcm(noise(1.0, 20), tone(1.0), noise(2.0, 20, seed=1)), padding_ms=100)
+    assert result.has_speech and not result.truncated
+    assert result.input_seconds == 4.0
+    assert 1.0 <= result.output_seconds <= 1.3
+
+
+def test_quiet_clip_has_no_speech():
+    result = trim_silence(pcm(noise(3.0, 50)))
+    assert not result.has_speech and result.pcm == b"" and result.output_seconds == 0.0
+
+
+def test_speech_without_pauses_is_kept_whole():
+    # Ровная громкая запись без тишины: относительный порог выше любого кадра
+    for samples in (tone(2.0), noise(2.0, 3000)):
+        result = trim_silence(pcm(samples))
+        assert result.has_speech and result.output_seconds == result.input_seconds
+
+
+def test_mostly_loud_clip_with_short_pause_is_kept():
+    result = trim_silence(pcm(tone(1.9), np.zeros(int(0.1 * RATE))), padding_ms=0)
+    assert result.has_speech and result.output_seconds >= 1.9
+
+
+def test_short_click_is_rejected():
+    result = trim_silence(pcm(noise(1.0, 20), tone(0.06), noise(1.0, 20, seed=1)), min_speech_ms=200)
+    assert not result.has_speech
+
+
+def test_long_speech_is_truncated():
+    result = trim_silence(pcm(noise(0.5, 20), tone(5.0), noise(0.5, 20, seed=1)), max_speech_seconds=2.0)
+    assert result.truncated and result.output_seconds == 2.0
+    assert len(result.pcm) == 2 * RATE * 2
+
+
+def test_unvoiced_frames_detected_by_zero_crossings():
+    frame = 480
+    hiss = noise(0.3, 200, seed=2)  # Тише порога, но с частыми пересечениями нуля
+    samples = np.concatenate([noise(1.0, 20), hiss, tone(0.5), noise(1.0, 20, seed=1)]).astype(np.int16)
+    speech = speech_frames(samples, frame, energy_ratio=3, min_energy=300, zcr_threshold=0.25)
+    first = int(np.flatnonzero(speech)[0])
+    assert first * frame <= RATE * 1.05
+
+
+def test_odd_length_and_empty_input():
+    assert trim_silence(pcm(tone(1.0)) + b"\x01").has_speech
+    assert not trim_silence(b"").has_speech
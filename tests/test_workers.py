@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from workers import WorkerSupervisor, poll_updates, user_id_of
+
+
+def test_user_id_of_message_and_callback():
+    assert user_id_of({"update_id": 1, "message": {"from": {"id": 42}, "chat": {"id": 7}}}) == 42
+    assert user_id_of({"update_id": 2, "callback_query": {"from": {"id": 5}}}) == 5
+    assert user_id_of({"update_id": 3, "my_chat_member": {"chat": {"id": 9}}}) == 9
+    assert user_id_of({"update_id": 4}) is None
+
+
+def test_updates_of_one_user_go_to_one_worker():
+    supervisor = WorkerSupervisor(app_factory=None, workers=3)
+    routes = {supervisor.route({"update_id": n, "message": {"from": {"id": 100}}}) for n in range(10)}
+    assert routes == {100 % 3}
+    assert supervisor.route({"update_id": 7}) == 7 % 3
+
+
+def test_app_factory_builds_one_bot_per_process():
+    import main
+
+    app = main.create_app()
+    assert main.create_app() is app
+    assert main.router.parent_router is app.dp
+
+
+def test_polling_requests_only_used_update_types():
+    import main
+
+    class FakeBot:
+        async def get_updates(self, **kwargs):
+            requested.append(kwargs["allowed_updates"])
+            raise asyncio.CancelledError
+
+    requested = []
+    allowed = main.create_app().dp.resolve_used_update_types()
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(poll_updates(FakeBot(), WorkerSupervisor(app_factory=None), allowed))
+    assert requested == [allowed] and "message" in allowed
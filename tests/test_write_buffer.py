@@ -0,0 +1,112 @@
+import asyncio
+import sqlite3
+from contextlib import asynccontextmanager
+import pytest
+from write_buffer import WriteBehindBuffer, POLICY_DROP_NEW, POLICY_DROP_OLD
+
+INSERT_STATE = 'INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)'
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def executemany(self, query, rows):
+        self.rows.extend(rows)
+
+    async def commit(self):
+        pass
+
+
+class FlakyDB:
+    """БД, соединение записи которой первые failures раз занято."""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.rows = []
+
+    @asynccontextmanager
+    async def get_write_connection(self):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        yield FakeConnection(self.rows)
+
+    async def execute_query(self, query, params):
+        self.rows.append(params)
+
+
+async def buffered(buffer, rows):
+    buffer.start()
+    for row in rows:
+        await buffer.put("INSERT", row)
+    await buffer.stop()
+    return buffer.stats()
+
+
+def test_rows_flushed_in_batches():
+    db = FlakyDB(failures=0)
+    stats = asyncio.run(buffered(WriteBehindBuffer(db, batch_size=10, flush_interval_ms=10),
+                                 [(i,) for i in range(25)]))
+    assert db.rows == [(i,) for i in range(25)]
+    assert stats['flushed'] == 25 and stats['failed'] == 0 and stats['pending'] == 0
+
+
+def test_locked_database_is_retried():
+    db = FlakyDB(failures=2)
+    buffer = WriteBehindBuffer(db, batch_size=100, flush_interval_ms=10, max_retries=3, retry_delay_ms=1)
+    stats = asyncio.run(buffered(buffer, [(i,) for i in range(5)]))
+    assert db.rows == [(i,) for i in range(5)]
+    assert stats['retries'] == 2 and stats['failed'] == 0
+
+
+def test_rows_written_one_by_one_after_retries_run_out():
+    db = FlakyDB(failures=2)
+    buffer = WriteBehindBuffer(db, batch_size=100, flush_interval_ms=10, max_retries=1, retry_delay_ms=1)
+    stats = asyncio.run(buffered(buffer, [(i,) for i in range(3)]))
+    assert db.rows == [(i,) for i in range(3)]
+    assert stats['flushed'] == 3 and stats['failed'] == 0
+
+
+def test_only_bad_rows_are_lost(run_db, caplog):
+    async def scenario(db):
+        buffer = WriteBehindBuffer(db, batch_size=100, flush_interval_ms=10, retry_delay_ms=1)
+        buffer.start()
+        for key in ("a", "b", "a", "c"):
+            await buffer.put(INSERT_STATE, (key, None, "{}", 0.0))
+        await buffer.stop()
+        rows = await db.fetch_all('SELECT key FROM fsm_states ORDER BY key')
+        return buffer.stats(), [row['key'] for row in rows]
+
+    stats, keys = run_db(scenario)
+    assert keys == ["a", "b", "c"]
+    assert stats['flushed'] == 3 and stats['failed'] == 1 and stats['retries'] == 0
+    assert "Write-behind row lost" in caplog.text and "'a'" in caplog.text
+
+
+@pytest.mark.parametrize("policy, kept", [(POLICY_DROP_NEW, [0, 1]), (POLICY_DROP_OLD, [2, 3])])
+def test_overflow_policies(policy, kept):
+    async def scenario():
+        db = FlakyDB(failures=0)
+        buffer = WriteBehindBuffer(db, batch_size=2, flush_interval_ms=60000, max_pending=2, policy=policy)
+        buffer.start()
+        # put не уступает управление, поэтому фоновый сброс не успевает освободить место
+        for i in range(4):
+            await buffer.put("INSERT", (i,))
+        dropped = buffer.dropped
+        await buffer.stop()
+        return dropped, [row[0] for row in db.rows]
+
+    assert asyncio.run(scenario()) == (2, kept)
+
+
+def test_dialog_history_goes_through_buffer(run_db):
+    async def scenario(db):
+        await db.add_user(1, "user", None, None)
+        await db.add_dialog_message(1, None, "user", "hello")
+        pending = len(db.write_buffer)
+        await db.write_buffer.flush()
+        rows = await db.fetch_all('SELECT content FROM dialog_history')
+        return pending, [row['content'] for row in rows]
+
+    assert run_db(scenario) == (1, ["hello"])
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from config import TRANSCRIPT_CACHE_SIZE, TRANSCRIPT_CACHE_TTL, TRANSCRIPT_CACHE_PERSIST
+from database import db
+from metrics import registry
+
+# Настройка логирования для transcript_cache модуля
+logger = logging.getLogger(__name__)
+
+# Просроченные записи удаляются из БД после каждых N сохранений
+PURGE_EVERY = 1000
+
+TRANSCRIPT_CACHE_LOOKUPS = registry.counter(
+    "transcript_cache_lookups_total", "Transcript cache lookups by result", ["result"])
+
+
+def file_key(file_unique_id: str) -> str:
+    """Ключ по file_unique_id голосового сообщения (одинаков для пересланных копий)."""
+    return f"file:{file_unique_id}"
+
+
+def content_key(data: bytes, kind: str = "pcm") -> str:
+    """Ключ по хэшу аудиоданных (PCM, из которого отрезана тишина)."""
+    return f"{kind}:{hashlib.sha256(data).hexdigest()}"
+
+
+class TranscriptCache:
+    """
+    Кэш результатов распознавания: LRU в памяти процесса с TTL и, по желанию,
+    копией в таблице transcript_cache. Повторно присланное или переданное
+    заново голосовое сообщение не скачивается, не конвертируется и не
+    распознается еще раз. Пустые результаты (речь не распознана, таймаут) не кэшируются.
+    """
+
+    def __init__(self, db, max_size: int = TRANSCRIPT_CACHE_SIZE, ttl: float = TRANSCRIPT_CACHE_TTL,
+                 persist: bool = TRANSCRIPT_CACHE_PERSIST):
+        """Инициализирует кэш."""
+        self.db = db
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.persist = persist
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._puts = 0
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, transcript: str, created_at: float):
+        """Кладет запись в LRU, вытесняя самые старые."""
+        self._entries[key] = (transcript, created_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Возвращает сохраненный результат распознавания или None."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                TRANSCRIPT_CACHE_LOOKUPS.inc(result="hit")
+                return entry[0]
+            del self._entries[key]
+
+        if self.persist:
+            try:
+                stored = await self.db.get_transcript(key, now - self.ttl)
+            except Exception as e:
+                logger.warning(f"Transcript cache lookup failed: {e}")
+                stored = None
+            if stored is not None:
+                # Запись в памяти истекает вместе с записью в БД, а не получает новый срок
+                transcript, created_at = stored
+                self._remember(key, transcript, created_at)
+                self.db_hits += 1
+                TRANSCRIPT_CACHE_LOOKUPS.inc(result="db_hit")
+                return transcript
+
+        self.misses += 1
+        TRANSCRIPT_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def put(self, keys: Iterable[str], transcript: str):
+        """Сохраняет результат распознавания под всеми переданными ключами."""
+        if not transcript:
+            return
+        now = time.time()
+        for key in keys:
+            self._remember(key, transcript, now)
+            if self.persist:
+                await self.db.save_transcript(key, transcript, now)
+                self._puts += 1
+        if self.persist and self._puts >= PURGE_EVERY:
+            self._puts = 0
+            try:
+                await self.db.purge_transcripts(now - self.ttl)
+            except Exception as e:
+                logger.warning(f"Failed to purge expired transcripts: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики кэша."""
+        return {'cached': len(self._entries), 'hits': self.hits, 'db_hits': self.db_hits, 'misses': self.misses}
+
+
+# Глобальный кэш результатов распознавания
+transcript_cache = TranscriptCache(db)
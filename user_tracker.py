@@ -0,0 +1,100 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import USER_ACTIVITY_FLUSH_INTERVAL, USER_CACHE_SIZE
+
+# Настройка логирования для user_tracker модуля
+logger = logging.getLogger(__name__)
+
+
+class UserActivityTracker:
+    """
+    Кэш известных пользователей для мидлвари активности.
+    Профиль записывается в БД только при изменении username/имени/фамилии,
+    а обновления last_activity копятся и сбрасываются одним UPDATE раз в flush_interval секунд.
+    """
+
+    def __init__(self, db, flush_interval: float = USER_ACTIVITY_FLUSH_INTERVAL,
+                 max_cached: int = USER_CACHE_SIZE):
+        """Инициализирует трекер. Периодический сброс запускается методом start()."""
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_cached = max(1, max_cached)
+        self._profiles: "OrderedDict[int, Tuple]" = OrderedDict()
+        self._activity: Dict[int, float] = {}
+        # Выполняющиеся записи профилей: одновременные сообщения пользователя ждут одну запись
+        self._writes: Dict[int, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        """Запущен ли периодический сброс."""
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запускает фоновую задачу сброса last_activity."""
+        if not self.is_running:
+            self._task = asyncio.create_task(self._run(), name="user-activity-flusher")
+
+    async def stop(self):
+        """Останавливает фоновую задачу и сбрасывает накопленные обновления."""
+        if self.is_running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def touch(self, user_id: int, username: Optional[str],
+                    first_name: Optional[str], last_name: Optional[str]):
+        """Отмечает активность пользователя, записывая профиль только при его изменении."""
+        profile = (username, first_name, last_name)
+        write = self._writes.get(user_id)
+        if self._profiles.get(user_id) != profile:
+            # Профиль попадает в кэш до записи, чтобы следующее сообщение не запустило вторую
+            write = self._writes[user_id] = asyncio.ensure_future(
+                self.db.add_user(user_id, username, first_name, last_name))
+            write.add_done_callback(functools.partial(self._write_done, user_id, profile))
+            self._profiles[user_id] = profile
+            self._activity.pop(user_id, None)
+        elif write is None:
+            self._activity[user_id] = time.time()
+        self._profiles.move_to_end(user_id)
+        if len(self._profiles) > self.max_cached:
+            self._profiles.popitem(last=False)
+
+        if write is not None:
+            # shield: отмена одного обработчика не прерывает запись, которую ждут другие
+            await asyncio.shield(write)
+        if not self.is_running:
+            await self.flush()
+
+    def _write_done(self, user_id: int, profile: Tuple, write: asyncio.Future):
+        """Завершение записи профиля: при ошибке профиль убирается из кэша и будет записан снова."""
+        if self._writes.get(user_id) is write:
+            del self._writes[user_id]
+        if (write.cancelled() or write.exception() is not None) and self._profiles.get(user_id) == profile:
+            del self._profiles[user_id]
+
+    async def flush(self):
+        """Записывает накопленные значения last_activity одним пакетным UPDATE."""
+        if not self._activity:
+            return
+        pending, self._activity = self._activity, {}
+        try:
+            await self.db.update_users_activity([(ts, user_id) for user_id, ts in pending.items()])
+        except Exception as e:
+            logger.error(f"Failed to flush activity of {len(pending)} users: {e}")
+            for user_id, ts in pending.items():
+                self._activity.setdefault(user_id, ts)
+
+    async def _run(self):
+        """Фоновый цикл периодического сброса."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
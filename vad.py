@@ -0,0 +1,109 @@
+"""
+Определение речи (VAD) в PCM перед распознаванием.
+
+Аудио делится на кадры по VAD_FRAME_MS; кадр считается речью, если его
+RMS-энергия выше порога, либо энергия немного ниже порога, но велика доля
+пересечений нуля (глухие согласные). Порог - шумовой фон записи (10-й
+процентиль энергии кадров), умноженный на VAD_ENERGY_RATIO, но не ниже
+VAD_MIN_ENERGY. Если громче VAD_MIN_ENERGY не меньше VAD_LOUD_FRACTION кадров,
+тишины в записи нет и шумовой фон по ней не оценить - запись сохраняется целиком.
+Тишина до первого и после последнего кадра речи отрезается (с запасом
+VAD_PADDING_MS), запись без речи в распознавание не передается.
+"""
+import logging
+from dataclasses import dataclass
+import numpy as np
+from config import (AUDIO_SAMPLE_RATE, VAD_FRAME_MS, VAD_ENERGY_RATIO, VAD_MIN_ENERGY, VAD_LOUD_FRACTION,
+                    VAD_ZCR_THRESHOLD, VAD_MIN_SPEECH_MS, VAD_PADDING_MS, VAD_MAX_SPEECH_SECONDS)
+from metrics import registry
+
+# Настройка логирования для vad модуля
+logger = logging.getLogger(__name__)
+
+# Байт на отсчет PCM s16le
+SAMPLE_WIDTH = 2
+
+VAD_INPUT_SECONDS = registry.counter(
+    "vad_input_audio_seconds_total", "Audio passed to voice activity detection, seconds")
+VAD_REMOVED_SECONDS = registry.counter(
+    "vad_removed_audio_seconds_total", "Audio removed by voice activity detection before recognition, seconds")
+VAD_CLIPS = registry.counter("vad_clips_total", "Voice messages by voice activity detection result", ["result"])
+
+
+@dataclass(slots=True)
+class VADResult:
+    """Результат обработки записи."""
+    pcm: bytes              # Обрезанный PCM (пустой, если речи нет)
+    input_seconds: float    # Длительность исходной записи
+    output_seconds: float   # Длительность обрезанной записи
+    truncated: bool = False  # Обрезана ли речь до VAD_MAX_SPEECH_SECONDS
+
+    @property
+    def has_speech(self) -> bool:
+        return bool(self.pcm)
+
+
+def speech_frames(samples: np.ndarray, frame_length: int, energy_ratio: float = VAD_ENERGY_RATIO,
+                  min_energy: float = VAD_MIN_ENERGY, zcr_threshold: float = VAD_ZCR_THRESHOLD,
+                  loud_fraction: float = VAD_LOUD_FRACTION) -> np.ndarray:
+    """
+    Отмечает кадры с речью.
+    Args:
+        samples: Отсчеты int16
+        frame_length (int): Отсчетов в кадре; неполный последний кадр не учитывается
+    Returns:
+        np.ndarray: Массив bool по кадрам
+    """
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length).astype(np.float32)
+
+    energy = np.sqrt(np.mean(frames * frames, axis=1))
+    if np.count_nonzero(energy > min_energy) >= loud_fraction * frame_count:
+        # Речь без пауз: 10-й процентиль - это уже речь, и относительный порог отбросил бы ее
+        return np.ones(frame_count, dtype=bool)
+
+    # Доля соседних отсчетов с разным знаком
+    zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+
+    threshold = max(min_energy, float(np.percentile(energy, 10)) * energy_ratio)
+    return (energy > threshold) | ((energy > threshold / 2) & (zcr > zcr_threshold))
+
+
+def trim_silence(pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS,
+                 min_speech_ms: int = VAD_MIN_SPEECH_MS, padding_ms: int = VAD_PADDING_MS,
+                 max_speech_seconds: float = VAD_MAX_SPEECH_SECONDS) -> VADResult:
+    """
+    Отрезает тишину в начале и в конце записи и ограничивает ее длительность.
+    Args:
+        pcm (bytes): PCM s16le, моно
+    Returns:
+        VADResult: Обрезанный PCM; пустой, если речи меньше min_speech_ms
+    """
+    samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH], dtype='<i2')
+    input_seconds = len(samples) / sample_rate
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    speech = speech_frames(samples, frame_length)
+    speech_seconds = int(np.count_nonzero(speech)) * frame_length / sample_rate
+
+    VAD_INPUT_SECONDS.inc(input_seconds)
+    if speech_seconds * 1000 < min_speech_ms:
+        VAD_REMOVED_SECONDS.inc(input_seconds)
+        VAD_CLIPS.inc(result="no_speech")
+        return VADResult(b"", input_seconds, 0.0)
+
+    indexes = np.flatnonzero(speech)
+    padding = sample_rate * padding_ms // 1000
+    start = max(0, int(indexes[0]) * frame_length - padding)
+    end = min(len(samples), (int(indexes[-1]) + 1) * frame_length + padding)
+
+    truncated = end - start > max_speech_seconds * sample_rate
+    if truncated:
+        end = start + int(max_speech_seconds * sample_rate)
+        logger.info(f"Voice message truncated to {max_speech_seconds} s of speech")
+
+    output_seconds = (end - start) / sample_rate
+    VAD_REMOVED_SECONDS.inc(input_seconds - output_seconds)
+    VAD_CLIPS.inc(result="truncated" if truncated else "speech")
+    return VADResult(samples[start:end].tobytes(), input_seconds, output_seconds, truncated)
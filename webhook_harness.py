@@ -0,0 +1,87 @@
+"""
+Локальная проверка режима webhook: отправляет поддельные обновления Telegram
+на сервер бота (BOT_MODE=webhook) и выводит статусы ответов и задержку.
+
+Запуск:
+    BOT_MODE=webhook python main.py
+    python webhook_harness.py [--url URL] [--updates N] [--concurrency C] [--users U]
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+
+import aiohttp
+
+from benchmark import percentile
+from config import WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+
+# Тексты сообщений, которые отправляют поддельные пользователи
+MESSAGE_TEXTS = ["/start", "/help", "📊 Статистика", "ℹ️ Помощь", "❓ Поддержка", "🔙 Назад"]
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    """Создает обновление Telegram с текстовым сообщением от пользователя."""
+    user = {"id": user_id, "is_bot": False, "first_name": "Test", "username": f"user{user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Test"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+async def run(url: str, secret: str, updates: int, concurrency: int, users: int, seed: int = 42):
+    """Отправляет updates обновлений с заданной конкурентностью."""
+    rng = random.Random(seed)
+    update_ids = itertools.count(1)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    statuses = Counter()
+    latencies = []
+
+    async def worker(session: aiohttp.ClientSession, count: int):
+        for _ in range(count):
+            update = make_update(next(update_ids), rng.randint(1, users), rng.choice(MESSAGE_TEXTS))
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    per_worker = [updates // concurrency + (1 if i < updates % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(worker(session, count) for count in per_worker))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{updates} updates in {elapsed:.3f} s ({updates / elapsed:.1f} updates/s)")
+    print(f"statuses: {dict(statuses)}")
+    if latencies:
+        print(f"latency p50 {percentile(latencies, 0.5) * 1e3:.2f} ms"
+              f"  p95 {percentile(latencies, 0.95) * 1e3:.2f} ms"
+              f"  p99 {percentile(latencies, 0.99) * 1e3:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка поддельных обновлений на вебхук бота")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.secret, args.updates, max(1, args.concurrency), args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Режим нескольких процессов-воркеров.
+
+Супервизор получает обновления (long polling или вебхук) и, не разбирая их,
+передает в очередь воркера по user_id: состояние FSM, кэши пользователя и
+порядок его сообщений остаются в одном процессе. Каждый воркер - отдельный
+процесс со своим Dispatcher и пулом соединений к общей БД; экземпляр бота воркер
+создает фабрикой, переданной супервизору (main.create_app). Сообщения одного
+пользователя воркер обрабатывает строго по очереди, разных - параллельно.
+
+Запуск: BOT_WORKERS=4 python main.py
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from aiohttp import web
+from config import (BOT_MODE, BOT_WORKERS, WORKER_QUEUE_SIZE, WORKER_START_TIMEOUT,
+                    WORKER_STOP_TIMEOUT, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    WEBHOOK_BASE_URL, METRICS_PORT, LOG_FILE)
+
+# Настройка логирования для workers модуля
+logger = logging.getLogger(__name__)
+
+# Таймаут long polling супервизора, секунды
+POLLING_TIMEOUT = 30
+# Пауза после ошибки получения обновлений, секунды
+POLLING_RETRY_DELAY = 5
+# Период проверки, что процессы воркеров живы, секунды
+MONITOR_INTERVAL = 1.0
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def user_id_of(update: Dict[str, Any]) -> Optional[int]:
+    """Возвращает id пользователя (или чата) из необработанного обновления Telegram."""
+    for event in update.values():
+        if isinstance(event, dict):
+            sender = event.get("from") or event.get("user") or event.get("chat")
+            if isinstance(sender, dict) and "id" in sender:
+                return sender["id"]
+    return None
+
+
+def worker_log_file(index: int) -> str:
+    """Отдельный файл журнала воркера: ротацию одного файла несколько процессов не разделяют."""
+    if not LOG_FILE:
+        return ""
+    root, ext = os.path.splitext(LOG_FILE)
+    return f"{root}-worker{index}{ext}"
+
+
+class WorkerSupervisor:
+    """
+    Запускает процессы-воркеры и распределяет по ним обновления.
+    Упавший воркер перезапускается; его очередь сохраняется.
+    """
+
+    def __init__(self, app_factory: Callable[[], Any], workers: int = BOT_WORKERS,
+                 queue_size: int = WORKER_QUEUE_SIZE,
+                 prepare: Optional[Callable[[Any], Awaitable[None]]] = None,
+                 log_options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            app_factory: Функция уровня модуля, создающая экземпляр бота (main.BotApp) в процессе воркера
+            workers (int): Количество процессов
+            queue_size (int): Обновлений в очереди одного воркера; при заполнении dispatch() ждет
+            prepare: Корутинная функция уровня модуля prepare(app), вызываемая в воркере после запуска сервисов
+            log_options (dict): Параметры setup_logging() воркеров (по умолчанию - свой файл журнала)
+        """
+        self.app_factory = app_factory
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.prepare = prepare
+        self.log_options = log_options
+        self._context = multiprocessing.get_context("spawn")
+        self._queues: List[multiprocessing.Queue] = []
+        self._ready: List[Any] = []
+        self._processes: List[multiprocessing.Process] = []
+        self._monitor: Optional[asyncio.Task] = None
+        self.dispatched = 0
+        self.restarts = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Запущены ли воркеры."""
+        return bool(self._processes)
+
+    def _spawn(self, index: int) -> multiprocessing.Process:
+        """Запускает процесс воркера с номером index."""
+        log_options = self.log_options
+        if log_options is None:
+            log_options = {"log_file": worker_log_file(index)}
+        process = self._context.Process(
+            target=worker_main, name=f"bot-worker-{index}",
+            args=(index, self._queues[index], self._ready[index], self.app_factory, self.prepare, log_options),
+        )
+        process.start()
+        return process
+
+    def start(self):
+        """Запускает процессы воркеров."""
+        if self.is_running:
+            return
+        for index in range(self.workers):
+            self._queues.append(self._context.Queue(self.queue_size))
+            self._ready.append(self._context.Event())
+        self._processes = [self._spawn(index) for index in range(self.workers)]
+        self._monitor = asyncio.create_task(self._watch(), name="worker-monitor")
+        logger.info(f"Started {self.workers} worker processes")
+
+    async def wait_ready(self, timeout: float = WORKER_START_TIMEOUT):
+        """
+        Ждет, пока все воркеры подготовят сервисы.
+        Raises:
+            asyncio.TimeoutError: Если воркеры не готовы за timeout секунд
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        for event in self._ready:
+            remaining = max(0.0, deadline - loop.time())
+            if not await asyncio.to_thread(event.wait, remaining):
+                raise asyncio.TimeoutError("Worker processes are not ready")
+
+    async def _watch(self):
+        """Перезапускает воркеры, завершившиеся без команды на остановку."""
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    self._ready[index].clear()
+                    self._processes[index] = self._spawn(index)
+                    self.restarts += 1
+
+    def route(self, update: Dict[str, Any]) -> int:
+        """Номер воркера для обновления: по user_id, без пользователя - по update_id."""
+        key = user_id_of(update)
+        if key is None:
+            key = update.get("update_id", 0)
+        return key % self.workers
+
+    async def dispatch(self, update: Dict[str, Any]):
+        """Передает необработанное обновление воркеру; при заполненной очереди ждет места."""
+        updates = self._queues[self.route(update)]
+        try:
+            updates.put_nowait(update)
+        except queue.Full:
+            await asyncio.to_thread(updates.put, update)
+        self.dispatched += 1
+
+    async def stop(self, timeout: float = WORKER_STOP_TIMEOUT):
+        """
+        Останавливает воркеры: каждый дорабатывает свою очередь и закрывает сервисы.
+        Не завершившиеся за timeout секунд процессы прерываются.
+        """
+        if not self.is_running:
+            return
+        self._monitor.cancel()
+        try:
+            await self._monitor
+        except asyncio.CancelledError:
+            pass
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        for updates in self._queues:
+            try:
+                await asyncio.to_thread(updates.put, None, True, max(0.0, deadline - loop.time()))
+            except queue.Full:
+                pass
+        for index, process in enumerate(self._processes):
+            await asyncio.to_thread(process.join, max(0.0, deadline - loop.time()))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in {timeout} s, terminating")
+                # SIGTERM воркеры игнорируют
+                process.kill()
+                process.join()
+        for updates in self._queues:
+            updates.close()
+            updates.join_thread()
+
+        self._processes, self._queues, self._ready = [], [], []
+        logger.info("Worker processes stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики супервизора и примерная длина очередей воркеров."""
+        try:
+            queued = [updates.qsize() for updates in self._queues]
+        except NotImplementedError:
+            # qsize() не поддерживается на macOS
+            queued = []
+        return {'workers': self.workers, 'dispatched': self.dispatched, 'restarts': self.restarts, 'queued': queued}
+
+
+def _read_updates(updates: multiprocessing.Queue, loop: asyncio.AbstractEventLoop, inbox: asyncio.Queue):
+    """Поток воркера: переносит обновления из межпроцессной очереди в очередь event loop."""
+    parent = os.getppid()
+    while True:
+        try:
+            update = updates.get(timeout=MONITOR_INTERVAL)
+        except queue.Empty:
+            # Супервизор завершился аварийно: воркер останавливается сам
+            if os.getppid() == parent:
+                continue
+            logger.error("Supervisor process is gone, stopping worker")
+            update = None
+        loop.call_soon_threadsafe(inbox.put_nowait, update)
+        if update is None:
+            return
+
+
+async def _serve(index: int, updates: multiprocessing.Queue, ready, app_factory, prepare):
+    """Event loop воркера: запуск сервисов бота и обработка обновлений из очереди."""
+    # Функция-фабрика передается по имени: при spawn модуль, запустивший супервизор, уже загружен
+    # в воркере как __mp_main__, и повторный import main создал бы второй экземпляр бота и БД
+    app = app_factory()
+
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+    # Последняя задача каждого пользователя: следующая ждет ее завершения
+    last_tasks: Dict[Any, asyncio.Task] = {}
+
+    async def process(update: Dict[str, Any], previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await app.dp.feed_raw_update(app.bot, update)
+        except Exception as e:
+            logger.error(f"Worker {index} failed to process update {update.get('update_id')}: {e}")
+
+    def forget(key, task: asyncio.Task):
+        if last_tasks.get(key) is task:
+            del last_tasks[key]
+
+    metrics_runner = None
+    try:
+        metrics_runner = await app.start_services(
+            primary=index == 0, metrics_port=METRICS_PORT + index if METRICS_PORT else 0)
+        if prepare is not None:
+            await prepare(app)
+        threading.Thread(target=_read_updates, args=(updates, loop, inbox),
+                         name="worker-updates", daemon=True).start()
+        ready.set()
+        logger.info(f"Worker {index} is ready (pid {os.getpid()})")
+
+        while (update := await inbox.get()) is not None:
+            key = user_id_of(update)
+            if key is None:
+                key = ("update", update.get("update_id"))
+            task = asyncio.create_task(process(update, last_tasks.get(key)))
+            task.add_done_callback(lambda done, key=key: forget(key, done))
+            last_tasks[key] = task
+
+        if last_tasks:
+            await asyncio.wait(list(last_tasks.values()))
+    finally:
+        await app.stop_services(metrics_runner)
+        logger.info(f"Worker {index} stopped")
+
+
+def worker_main(index: int, updates: multiprocessing.Queue, ready, app_factory, prepare,
+                log_options: Dict[str, Any]):
+    """Точка входа процесса воркера."""
+    # Сигналы остановки получает вся группа процессов; воркеры останавливает супервизор,
+    # дав им доработать очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    from logger import setup_logging
+    setup_logging(**log_options)
+    asyncio.run(_serve(index, updates, ready, app_factory, prepare))
+
+
+async def poll_updates(bot, supervisor: WorkerSupervisor, allowed_updates: Optional[List[str]] = None):
+    """Long polling в супервизоре: обновления передаются воркерам без обработки."""
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates)
+        except Exception as e:
+            logger.error(f"Failed to get updates: {e}")
+            await asyncio.sleep(POLLING_RETRY_DELAY)
+            continue
+        for update in updates:
+            await supervisor.dispatch(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+def create_supervisor_app(supervisor: WorkerSupervisor) -> web.Application:
+    """Приложение aiohttp супервизора: принимает вебхук и передает обновления воркерам."""
+
+    async def receive(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != WEBHOOK_SECRET:
+            return web.Response(status=401, text="Unauthorized")
+        await supervisor.dispatch(await request.json())
+        return web.json_response({})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    app.router.add_get("/health", health)
+    return app
+
+
+async def run_supervisor(app_factory: Callable[[], Any], workers: int = BOT_WORKERS):
+    """Запускает воркеры и принимает обновления до остановки процесса."""
+    # Экземпляр бота супервизора не обрабатывает обновления: его Dispatcher определяет,
+    # какие типы обновлений запрашивать у Telegram, а Bot принимает их
+    app = app_factory()
+    bot = app.bot
+    allowed_updates = app.dp.resolve_used_update_types()
+    supervisor = WorkerSupervisor(app_factory, workers)
+    runner = None
+    # SIGTERM останавливает супервизор так же, как Ctrl+C: с завершением воркеров
+    main_task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
+    try:
+        supervisor.start()
+        await supervisor.wait_ready()
+        if BOT_MODE == "webhook":
+            if WEBHOOK_BASE_URL:
+                await bot.set_webhook(url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+                                      secret_token=WEBHOOK_SECRET or None,
+                                      allowed_updates=allowed_updates)
+            runner = web.AppRunner(create_supervisor_app(supervisor))
+            await runner.setup()
+            await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+            logger.info(f"Supervisor webhook listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+            await asyncio.Event().wait()
+        else:
+            await poll_updates(bot, supervisor, allowed_updates)
+    except Exception as e:
+        logger.error(f"Error in supervisor: {e}")
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        await supervisor.stop()
+        await bot.session.close()
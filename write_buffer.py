@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import sqlite3
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+from config import (WRITE_BUFFER_BATCH_SIZE, WRITE_BUFFER_FLUSH_INTERVAL_MS,
+                    WRITE_BUFFER_MAX_PENDING, WRITE_BUFFER_POLICY, WRITE_BUFFER_MAX_RETRIES,
+                    WRITE_BUFFER_RETRY_DELAY_MS)
+
+# Настройка логирования для write_buffer модуля
+logger = logging.getLogger(__name__)
+
+# Политики поведения при переполнении буфера
+POLICY_BLOCK = "block"        # Ждать, пока фоновый сброс освободит место
+POLICY_DROP_NEW = "drop_new"  # Отбрасывать новую строку
+POLICY_DROP_OLD = "drop_old"  # Вытеснять самую старую строку
+POLICIES = (POLICY_BLOCK, POLICY_DROP_NEW, POLICY_DROP_OLD)
+
+# Длина параметров потерянной строки в журнале
+LOST_ROW_LOG_LENGTH = 200
+
+
+class WriteBehindBuffer:
+    """
+    Буфер отложенной записи для некритичных INSERT (история диалогов, журнал ошибок).
+    Строки копятся в памяти и сбрасываются одной транзакцией через executemany,
+    когда набирается batch_size строк или проходит flush_interval_ms миллисекунд.
+    Пачка, не записанная из-за блокировки БД, повторяется до max_retries раз с
+    удваивающейся паузой; если и это не помогло (или ошибка в самих данных),
+    строки пишутся по одной, и теряются только те, что не записались сами по себе.
+    """
+
+    def __init__(self, db, batch_size: int = WRITE_BUFFER_BATCH_SIZE,
+                 flush_interval_ms: int = WRITE_BUFFER_FLUSH_INTERVAL_MS,
+                 max_pending: int = WRITE_BUFFER_MAX_PENDING,
+                 policy: str = WRITE_BUFFER_POLICY,
+                 max_retries: int = WRITE_BUFFER_MAX_RETRIES,
+                 retry_delay_ms: int = WRITE_BUFFER_RETRY_DELAY_MS):
+        """Инициализирует буфер. Фоновый сброс запускается методом start()."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown write buffer policy: {policy}")
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max(self.batch_size, max_pending)
+        self.policy = policy
+        self.max_retries = max(0, max_retries)
+        self.retry_delay = retry_delay_ms / 1000
+        self._pending: Deque[Tuple[str, Tuple]] = deque()
+        self._task = None
+        self._wakeup = None
+        self._space = None
+        self._closing = False
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.batches = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Запущен ли фоновый сброс."""
+        return self._task is not None and not self._task.done()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self):
+        """Запускает фоновую задачу сброса буфера."""
+        if self.is_running:
+            return
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="write-behind-flusher")
+
+    async def stop(self):
+        """Останавливает фоновый сброс, предварительно записав все накопленные строки."""
+        if not self.is_running:
+            return
+        self._closing = True
+        self._wakeup.set()
+        self._space.set()
+        await self._task
+        self._task = None
+
+    async def put(self, query: str, params: Tuple) -> bool:
+        """
+        Ставит строку в очередь на запись.
+        Returns:
+            bool: False, если строка была отброшена политикой переполнения
+        """
+        if not self.is_running or self._closing:
+            # Буфер не запущен (например, в утилитах командной строки) - пишем сразу
+            await self.db.execute_query(query, params)
+            return True
+
+        while len(self._pending) >= self.max_pending:
+            if self.policy == POLICY_DROP_NEW:
+                self.dropped += 1
+                return False
+            if self.policy == POLICY_DROP_OLD:
+                self._pending.popleft()
+                self.dropped += 1
+                break
+            self._wakeup.set()
+            self._space.clear()
+            await self._space.wait()
+            if self._closing:
+                await self.db.execute_query(query, params)
+                return True
+
+        self._pending.append((query, params))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает счетчики работы буфера."""
+        return {
+            'pending': len(self._pending),
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'retries': self.retries,
+            'batches': self.batches,
+        }
+
+    async def _run(self):
+        """Фоновый цикл: ждет заполнения пачки или истечения интервала и сбрасывает буфер."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                await self.flush()
+                if not self._closing and len(self._pending) < self.batch_size:
+                    break
+            if self._closing and not self._pending:
+                return
+
+    async def _write(self, grouped: Dict[str, List[Tuple]]):
+        """Записывает строки, сгруппированные по тексту запроса, одной транзакцией."""
+        async with self.db.get_write_connection() as conn:
+            for query, rows in grouped.items():
+                await conn.executemany(query, rows)
+            await conn.commit()
+
+    async def _write_rows(self, batch: List[Tuple[str, Tuple]]):
+        """Записывает строки по одной, чтобы ошибка одной строки не отменяла остальные."""
+        for query, params in batch:
+            try:
+                await self._write({query: [params]})
+                self.flushed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Write-behind row lost: {e}; query: {' '.join(query.split())[:80]}; "
+                             f"params: {repr(params)[:LOST_ROW_LOG_LENGTH]}")
+
+    async def flush(self):
+        """Записывает накопленные строки одной транзакцией, группируя их по тексту запроса."""
+        if not self._pending:
+            return
+        batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_pending))]
+        self._space.set()
+
+        grouped: Dict[str, List[Tuple]] = {}
+        for query, params in batch:
+            grouped.setdefault(query, []).append(params)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._write(grouped)
+                self.flushed += len(batch)
+                self.batches += 1
+                return
+            except sqlite3.OperationalError as e:
+                # Блокировка или занятость БД - пачку имеет смысл повторить
+                if attempt == self.max_retries:
+                    error = e
+                    break
+                self.retries += 1
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f"Write-behind flush of {len(batch)} rows failed: {e}, retrying in {delay:.2f} s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                error = e
+                break
+
+        logger.error(f"Write-behind flush of {len(batch)} rows failed: {error}, writing rows one by one")
+        await self._write_rows(batch)